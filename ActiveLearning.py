@@ -0,0 +1,163 @@
+import heapq
+import threading
+
+import numpy as np
+
+
+def entropy_scores(probabilities):
+    """
+    Predictive entropy per row of an (n, classes) probability array; higher means less certain.
+    """
+    probabilities = np.clip(np.asarray(probabilities, dtype=np.float64), 1e-12, 1.0)
+    return -(probabilities * np.log(probabilities)).sum(axis=1)
+
+
+def margin_scores(probabilities):
+    """
+    One minus the gap between the two most likely classes; higher means less certain.
+    """
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    if probabilities.shape[1] < 2:
+        return np.zeros(len(probabilities))
+    top_two = np.partition(probabilities, -2, axis=1)[:, -2:]
+    return 1.0 - (top_two[:, 1] - top_two[:, 0])
+
+
+def k_center_greedy(candidate_embeddings, center_embeddings, k):
+    """
+    Picks k rows of candidate_embeddings that are farthest from the centers and from each other
+    (greedy k-center). Distances are kept as one vector and updated per pick, so the cost is O(k * n).
+
+    :return: Indices into candidate_embeddings, in the order they were picked.
+    """
+    candidates = np.asarray(candidate_embeddings, dtype=np.float32)
+    if len(candidates) == 0 or k <= 0:
+        return []
+    if center_embeddings is not None and len(center_embeddings):
+        centers = np.asarray(center_embeddings, dtype=np.float32)
+        # ||a - b||^2 = ||a||^2 - 2ab + ||b||^2, computed in chunks of centers to bound memory
+        candidate_norms = (candidates ** 2).sum(axis=1)
+        min_distances = np.full(len(candidates), np.inf, dtype=np.float32)
+        for start in range(0, len(centers), 4096):
+            chunk = centers[start:start + 4096]
+            distances = candidate_norms[:, None] - 2 * candidates @ chunk.T + (chunk ** 2).sum(axis=1)[None, :]
+            min_distances = np.minimum(min_distances, distances.min(axis=1))
+    else:
+        min_distances = np.full(len(candidates), np.inf, dtype=np.float32)
+        # Without centers every distance is inf and argmax returns the first (most uncertain) candidate
+
+    picked = []
+    for _ in range(min(k, len(candidates))):
+        index = int(np.argmax(min_distances))
+        picked.append(index)
+        distances = ((candidates - candidates[index]) ** 2).sum(axis=1)
+        min_distances = np.minimum(min_distances, distances)
+        min_distances[index] = -np.inf
+    return picked
+
+
+class ActiveLearningQueue:
+    """
+    ActiveLearningQueue Class Description:
+
+    Keeps the unlabeled pool of a task in a priority queue ordered by uncertainty, so the annotation GUIs can
+    ask for the next samples to label instead of scrolling through the data in order.
+
+    Scores are computed in vectorized batches from model probabilities (entropy or margin). The queue is a
+    heap with lazy invalidation: rescoring a sample pushes a new entry and the old one is skipped when it
+    reaches the top, and labelled samples are simply dropped from the score table. Selecting the next 100
+    samples from 500k unlabeled rows therefore pops a few hundred heap entries instead of rescoring the pool.
+    With diversity enabled, the top uncertain candidates are re-ranked with greedy k-center over the
+    cached embeddings, measured against the samples that are already labelled.
+
+    Attributes:
+    - strategy (str): "entropy" or "margin".
+    - scores (dict): Maps unlabeled sample id to (score, version).
+    - labeled (set): Sample ids that have been labelled.
+
+    Methods:
+    - add_unscored(): Adds samples to the pool before any model has scored them.
+    - update_scores(): Scores a batch of samples from their probabilities.
+    - mark_labeled(): Removes labelled samples from the pool.
+    - next_batch(): Returns the sample ids to label next.
+    """
+
+    STRATEGIES = {"entropy": entropy_scores, "margin": margin_scores}
+
+    def __init__(self, strategy="entropy"):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown active learning strategy: {strategy}")
+        self.strategy = strategy
+        self.scores = {}
+        self.labeled = set()
+        self._heap = []
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.scores)
+
+    def _push(self, sample_id, score):
+        self._version += 1
+        self.scores[sample_id] = (score, self._version)
+        heapq.heappush(self._heap, (-score, self._version, sample_id))
+
+    def add_unscored(self, sample_ids, default_score=0.0):
+        with self._lock:
+            for sample_id in sample_ids:
+                if sample_id not in self.labeled and sample_id not in self.scores:
+                    self._push(sample_id, default_score)
+
+    def update_scores(self, sample_ids, probabilities):
+        """
+        Scores a batch of samples in one vectorized call. Labelled samples in the batch are ignored.
+        """
+        batch_scores = self.STRATEGIES[self.strategy](probabilities)
+        with self._lock:
+            for sample_id, score in zip(sample_ids, batch_scores.tolist()):
+                if sample_id not in self.labeled:
+                    self._push(sample_id, score)
+            self._compact()
+
+    def mark_labeled(self, sample_ids):
+        with self._lock:
+            for sample_id in sample_ids:
+                self.labeled.add(sample_id)
+                self.scores.pop(sample_id, None)
+            self._compact()
+
+    def _compact(self):
+        # Rebuild the heap once stale entries outnumber live ones, to keep it from growing without bound
+        if len(self._heap) > 2 * len(self.scores) + 1024:
+            self._heap = [(-score, version, sample_id) for sample_id, (score, version) in self.scores.items()]
+            heapq.heapify(self._heap)
+
+    def _top(self, count):
+        top = []
+        while self._heap and len(top) < count:
+            entry = heapq.heappop(self._heap)
+            _, version, sample_id = entry
+            current = self.scores.get(sample_id)
+            if current is not None and current[1] == version:
+                top.append(entry)
+        for entry in top:
+            heapq.heappush(self._heap, entry)
+        return [sample_id for _, _, sample_id in top]
+
+    def next_batch(self, count=100, embedding_lookup=None, candidate_factor=10, max_centers=20000):
+        """
+        Returns up to count unlabeled sample ids, most uncertain first. When embedding_lookup (a function
+        mapping a list of sample ids to an (n, dim) array) is given, the count * candidate_factor most
+        uncertain samples are re-ranked with k-center so the batch is also diverse.
+        """
+        with self._lock:
+            if embedding_lookup is None:
+                return self._top(count)
+            candidates = self._top(count * candidate_factor)
+            labeled = list(self.labeled)
+        if len(labeled) > max_centers:
+            labeled = [labeled[index] for index in np.random.default_rng(0).choice(len(labeled), max_centers,
+                                                                                   replace=False)]
+        centers = embedding_lookup(labeled) if labeled else None
+        picked = k_center_greedy(embedding_lookup(candidates), centers, count)
+        return [candidates[index] for index in picked]
@@ -0,0 +1,170 @@
+import uuid
+import logging
+import threading
+import traceback
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from PerformanceMonitor import span
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function by JobContext.check_cancelled() to stop work early."""
+
+
+class JobContext:
+    """
+    Handed to job functions submitted with with_context=True so they can report progress
+    and stop cooperatively when the job is cancelled.
+    """
+
+    def __init__(self, job_id, manager):
+        self.job_id = job_id
+        self.cancel_event = threading.Event()
+        self._manager = manager
+
+    def report_progress(self, percent, message=""):
+        self._manager.job_progress.emit(self.job_id, int(percent), message)
+
+    def is_cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled(self.job_id)
+
+
+class BackgroundJob(QRunnable):
+    """
+    A QRunnable wrapping a single function call. Results, errors and cancellation are reported
+    through the signals of the BackgroundJobManager that created it.
+    """
+
+    def __init__(self, manager, context, function, args, kwargs, with_context):
+        super().__init__()
+        self.manager = manager
+        self.context = context
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.with_context = with_context
+        self.setAutoDelete(False)
+
+    def run(self):
+        job_id = self.context.job_id
+        if self.context.is_cancelled():
+            self.manager.finish_job(job_id)
+            self.manager.job_cancelled.emit(job_id)
+            return
+        self.manager.job_started.emit(job_id)
+        try:
+            with span(self.manager.job_name(job_id) or "job", "job"):
+                if self.with_context:
+                    result = self.function(self.context, *self.args, **self.kwargs)
+                else:
+                    result = self.function(*self.args, **self.kwargs)
+        except JobCancelled:
+            self.manager.finish_job(job_id)
+            self.manager.job_cancelled.emit(job_id)
+        except Exception as e:
+            logging.error("Background job %s failed: %s", job_id, str(e), exc_info=True)
+            self.manager.finish_job(job_id)
+            self.manager.job_failed.emit(job_id, str(e), traceback.format_exc())
+        else:
+            self.manager.finish_job(job_id)
+            if self.context.is_cancelled():
+                self.manager.job_cancelled.emit(job_id)
+            else:
+                self.manager.job_finished.emit(job_id, result)
+
+
+class BackgroundJobManager(QObject):
+    """
+    BackgroundJobManager Class Description:
+
+    Runs model loads, tokenization and Hugging Face dataset fetches on a QThreadPool so the Qt event loop
+    never blocks on them. Main owns one instance and hands it to every task singleton as `background_jobs`.
+    Independent jobs run in parallel up to max_workers. The signals are emitted from worker threads and
+    delivered to slots on the GUI thread through queued connections.
+
+    Attributes:
+    - thread_pool (QThreadPool): The pool the jobs run on.
+    - jobs (dict): Maps job id to (name, BackgroundJob) for jobs that are queued or running.
+
+    Signals:
+    - job_started(job_id), job_progress(job_id, percent, message)
+    - job_finished(job_id, result), job_failed(job_id, error, traceback), job_cancelled(job_id)
+
+    Methods:
+    - submit(): Queues a function call and returns its job id.
+    - submit_cached_load(): Queues a ResourceCache.get_or_load so a cache hit returns without a reload.
+    - cancel(), cancel_all(): Cancel queued jobs and ask running ones to stop.
+    - wait_for_done(): Blocks until every job has finished, used on shutdown.
+    """
+
+    job_started = pyqtSignal(str)
+    job_progress = pyqtSignal(str, int, str)
+    job_finished = pyqtSignal(str, object)
+    job_failed = pyqtSignal(str, str, str)
+    job_cancelled = pyqtSignal(str)
+
+    def __init__(self, max_workers=None, parent=None):
+        super().__init__(parent)
+        self.thread_pool = QThreadPool()
+        if max_workers:
+            self.thread_pool.setMaxThreadCount(max_workers)
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, function, *args, job_name=None, with_context=False, **kwargs):
+        """
+        Runs function(*args, **kwargs) on the thread pool. With with_context=True the function receives a
+        JobContext as its first argument for progress reporting and cancellation.
+
+        :return: The job id used in every signal about this job.
+        """
+        job_id = uuid.uuid4().hex
+        context = JobContext(job_id, self)
+        job = BackgroundJob(self, context, function, args, kwargs, with_context)
+        with self._lock:
+            self.jobs[job_id] = (job_name or getattr(function, "__name__", "job"), job)
+        self.thread_pool.start(job)
+        return job_id
+
+    def submit_cached_load(self, resource_cache, kind, path, loader, job_name=None):
+        return self.submit(resource_cache.get_or_load, kind, path, loader, job_name=job_name or f"load {kind}")
+
+    def job_name(self, job_id):
+        with self._lock:
+            entry = self.jobs.get(job_id)
+        return entry[0] if entry else None
+
+    def finish_job(self, job_id):
+        with self._lock:
+            self.jobs.pop(job_id, None)
+
+    def cancel(self, job_id):
+        with self._lock:
+            entry = self.jobs.get(job_id)
+        if entry is None:
+            return False
+        _, job = entry
+        job.context.cancel_event.set()
+        if self.thread_pool.tryTake(job):
+            # Never started, so run() will not report it
+            self.finish_job(job_id)
+            self.job_cancelled.emit(job_id)
+        return True
+
+    def cancel_all(self):
+        with self._lock:
+            job_ids = list(self.jobs)
+        for job_id in job_ids:
+            self.cancel(job_id)
+
+    def active_jobs(self):
+        with self._lock:
+            return {job_id: name for job_id, (name, _) in self.jobs.items()}
+
+    def wait_for_done(self, timeout_ms=-1):
+        return self.thread_pool.waitForDone(timeout_ms)
@@ -0,0 +1,337 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_HISTORY = os.path.join(BENCHMARK_DIR, "benchmark_history.json")
+# Metrics where a larger value is better; every other metric is a duration or a size
+HIGHER_IS_BETTER = ("format_directory_path_per_second", "headless_img_samples_per_second")
+HEADLESS_IMAGES = 64
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB on Linux
+
+
+class ScenarioSkipped(Exception):
+    """Raised by a scenario whose dependencies are not installed; the reason is recorded in the history."""
+
+
+def measure_gui(format_iterations=20000):
+    """
+    Measures the GUI start-up and tab switches in the current process, which must not have imported Qt or
+    Main yet. The Qt offscreen platform is used, so no display is needed.
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    metrics = {}
+
+    start_time = time.perf_counter()
+    try:
+        import Main
+    except ImportError as e:
+        raise ScenarioSkipped(f"Main cannot be imported: {e}")
+    from PyQt6.QtWidgets import QApplication
+
+    metrics["import_main_seconds"] = time.perf_counter() - start_time
+    app = QApplication(["gantrithor-benchmark"])
+
+    start_time = time.perf_counter()
+    main_app = Main.Main()
+    metrics["main_construction_seconds"] = time.perf_counter() - start_time
+    main_app.prewarm_enabled = False  # Each tab is measured cold first, then warm
+    # Otherwise the first processEvents() builds the NER tab, which would be counted in the time to first
+    # window and leave switch_gui_ner_cold measuring a warm switch
+    main_app.open_task_on_start = False
+
+    main_app.run()
+    app.processEvents()
+    metrics["time_to_first_window_seconds"] = time.perf_counter() - start_time
+
+    for task_name in main_app.TASK_REGISTRY:
+        start_time = time.perf_counter()
+        main_app.switch_gui(task_name)
+        app.processEvents()
+        metrics[f"switch_gui_{task_name}_cold_seconds"] = time.perf_counter() - start_time
+    for task_name in main_app.TASK_REGISTRY:
+        start_time = time.perf_counter()
+        main_app.switch_gui(task_name)
+        app.processEvents()
+        metrics[f"switch_gui_{task_name}_warm_seconds"] = time.perf_counter() - start_time
+    for task_name in main_app.TASK_REGISTRY:
+        start_time = time.perf_counter()
+        getattr(main_app, f"reset_pipeline_{task_name}")()
+        app.processEvents()
+        metrics[f"reset_pipeline_{task_name}_seconds"] = time.perf_counter() - start_time
+
+    path = "Dataset: " + "\\".join(["C:", "Users", "annotator", "Documents", "Gantrithor"] +
+                                    [f"project_folder_{index}" for index in range(12)] + ["train.parquet"])
+    start_time = time.perf_counter()
+    for _ in range(format_iterations):
+        main_app.format_directory_path(path, "Dataset")
+    metrics["format_directory_path_per_second"] = format_iterations / (time.perf_counter() - start_time)
+
+    main_app.shutdown_background_jobs()
+    metrics["peak_rss_mb"] = peak_rss_mb()
+    return metrics
+
+
+def headless_fixtures(folder, image_count=HEADLESS_IMAGES):
+    """
+    Writes a randomly initialised timm resnet18 checkpoint (nothing is downloaded) and image_count JPEGs
+    with a .jsonl listing them into folder.
+
+    :return: (checkpoint folder, input .jsonl path).
+    """
+    import numpy as np
+    import timm
+    from PIL import Image
+
+    from TaskLoaders import save_timm_checkpoint
+
+    model = timm.create_model("resnet18", pretrained=False, num_classes=3)
+    model.pretrained_cfg = dict(model.pretrained_cfg, architecture="resnet18", label_names=["cat", "dog", "cow"])
+    model_path = os.path.join(folder, "resnet18")
+    save_timm_checkpoint(model, model_path)
+
+    generator = np.random.default_rng(0)
+    input_path = os.path.join(folder, "images.jsonl")
+    with open(input_path, "w", encoding="utf-8") as input_file:
+        for index in range(image_count):
+            image_path = os.path.join(folder, f"image_{index}.jpg")
+            Image.fromarray(generator.integers(0, 256, (320, 320, 3), dtype=np.uint8)).save(image_path)
+            input_file.write(json.dumps({"id": index, "image": image_path}) + "\n")
+    return model_path, input_path
+
+
+def measure_headless():
+    """
+    Measures the code paths that need neither a display nor the GANTRITHOR package: the import of the
+    headless inference entry point, loading a timm checkpoint with and without the ResourceCache, and
+    batch inference through `Main.py infer --task img`. Fixtures are written to APPDATA (a temporary folder).
+    """
+    metrics = {}
+
+    start_time = time.perf_counter()
+    import HeadlessInference
+    metrics["import_headless_inference_seconds"] = time.perf_counter() - start_time
+
+    try:
+        model_path, input_path = headless_fixtures(os.environ.get("APPDATA") or tempfile.mkdtemp())
+    except ImportError as e:
+        raise ScenarioSkipped(f"timm, numpy or pillow is missing: {e}")
+
+    from ResourceCache import ResourceCache
+    from TaskLoaders import load_task_model, load_timm_model
+
+    start_time = time.perf_counter()
+    load_timm_model(model_path)
+    metrics["timm_load_seconds"] = time.perf_counter() - start_time
+
+    resource_cache = ResourceCache()
+    start_time = time.perf_counter()
+    load_task_model("img", model_path, resource_cache)
+    metrics["timm_load_cached_cold_seconds"] = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    load_task_model("img", model_path, resource_cache)
+    metrics["timm_load_cached_warm_seconds"] = time.perf_counter() - start_time
+
+    output_path = os.path.join(os.path.dirname(input_path), "predictions.jsonl")
+    stats = HeadlessInference.run_inference(HeadlessInference.default_options(
+        "img", model_path, input=input_path, output=output_path, backend="fp32"))
+    metrics["headless_img_model_load_seconds"] = stats["model_load_seconds"]
+    metrics["headless_img_samples_per_second"] = stats["samples_per_second"]
+    metrics["headless_peak_rss_mb"] = peak_rss_mb()
+    return metrics
+
+
+# Each scenario runs in its own fresh process, so neither pays for or profits from the other's imports
+SCENARIOS = {"gui": measure_gui, "headless": measure_headless}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARK_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(repeat, label=None):
+    """
+    Runs every scenario in repeat fresh interpreter processes, so every sample pays the same cold imports,
+    with APPDATA pointed at an empty temporary folder so user data and caches do not skew the results.
+    Scenarios whose dependencies are missing are recorded under "skipped" with the reason.
+
+    :return: A history entry with the median, min and all samples of each metric.
+    """
+    samples, skipped = [], {}
+    for index in range(repeat):
+        sample = {}
+        for scenario in SCENARIOS:
+            if scenario in skipped:
+                continue
+            with tempfile.TemporaryDirectory() as app_data:
+                output_path = os.path.join(app_data, "metrics.json")
+                environment = dict(os.environ, APPDATA=app_data, QT_QPA_PLATFORM="offscreen", PYTHONHASHSEED="0")
+                completed = subprocess.run([sys.executable, os.path.abspath(__file__), "measure", scenario,
+                                            output_path], cwd=BENCHMARK_DIR, env=environment, capture_output=True,
+                                           text=True)
+                if completed.returncode != 0 or not os.path.exists(output_path):
+                    raise RuntimeError(f"Benchmark run {index + 1} ({scenario}) failed:\n{completed.stderr[-4000:]}")
+                with open(output_path, "r", encoding="utf-8") as output_file:
+                    result = json.load(output_file)
+            if "skipped" in result:
+                skipped[scenario] = result["skipped"]
+                print(f"{scenario} skipped: {result['skipped']}", file=sys.stderr)
+            else:
+                sample.update(result["metrics"])
+        samples.append(sample)
+        print(f"run {index + 1}/{repeat} done", file=sys.stderr)
+
+    metrics = {}
+    for name in samples[0]:
+        values = [sample[name] for sample in samples if sample.get(name) is not None]
+        if values:
+            best = max(values) if name in HIGHER_IS_BETTER else min(values)
+            metrics[name] = {"median": statistics.median(values), "best": best, "samples": values}
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "label": label,
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+        "metrics": metrics,
+        "skipped": skipped,
+    }
+
+
+def load_history(history_path):
+    if not os.path.exists(history_path):
+        return []
+    with open(history_path, "r", encoding="utf-8") as history_file:
+        return json.load(history_file)
+
+
+def save_history(history_path, history):
+    with open(history_path + ".tmp", "w", encoding="utf-8") as history_file:
+        json.dump(history, history_file, indent=2)
+    os.replace(history_path + ".tmp", history_path)
+
+
+def find_entry(history, reference):
+    """
+    Returns the history entry for reference: a negative or positive index, a commit prefix or a label.
+    """
+    try:
+        return history[int(reference)]
+    except ValueError:
+        pass
+    for entry in reversed(history):
+        if (entry.get("commit") or "").startswith(reference) or entry.get("label") == reference:
+            return entry
+    raise ValueError(f"No benchmark run matches '{reference}'")
+
+
+def compare(baseline, current, threshold):
+    """
+    Compares the medians of two runs.
+
+    :return: A list of (metric, baseline, current, relative change, is_regression) rows; a positive change
+             is always worse, whichever direction the metric is measured in.
+    """
+    rows = []
+    for name, values in current["metrics"].items():
+        if name not in baseline["metrics"]:
+            continue
+        old, new = baseline["metrics"][name]["median"], values["median"]
+        if not old:
+            continue
+        change = (old - new) / old if name in HIGHER_IS_BETTER else (new - old) / old
+        rows.append((name, old, new, change, change > threshold))
+    return rows
+
+
+def print_comparison(rows, baseline, current, threshold):
+    print(f"baseline: {baseline.get('commit')} {baseline.get('label') or ''} ({baseline['timestamp']})")
+    print(f"current:  {current.get('commit')} {current.get('label') or ''} ({current['timestamp']})")
+    print(f"{'metric':<42}{'baseline':>14}{'current':>14}{'change':>10}")
+    for name, old, new, change, regression in rows:
+        flag = "  REGRESSION" if regression else ""
+        print(f"{name:<42}{old:>14.4f}{new:>14.4f}{change:>+10.1%}{flag}")
+    regressions = sum(1 for row in rows if row[4])
+    print(f"{regressions} regression(s) beyond {threshold:.0%}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="Benchmark.py", description="Gantrithor start-up and hot-path benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="Measure and append the results to the history")
+    run.add_argument("--repeat", type=int, default=5, help="Fresh processes to measure; medians are recorded")
+    run.add_argument("--label", default=None, help="Name to refer to this run by in compare")
+    run.add_argument("--history", default=DEFAULT_HISTORY)
+    run.add_argument("--threshold", type=float, default=0.10,
+                     help="Also compare against the previous run and flag changes worse than this fraction")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two runs of the history")
+    compare_parser.add_argument("--baseline", default="-2", help="Index, commit prefix or label (default: previous run)")
+    compare_parser.add_argument("--current", default="-1", help="Index, commit prefix or label (default: latest run)")
+    compare_parser.add_argument("--threshold", type=float, default=0.10)
+    compare_parser.add_argument("--history", default=DEFAULT_HISTORY)
+
+    measure_parser = subparsers.add_parser("measure", help=argparse.SUPPRESS)
+    measure_parser.add_argument("scenario", choices=sorted(SCENARIOS))
+    measure_parser.add_argument("output")
+    return parser
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+    if options.command == "measure":
+        try:
+            result = {"metrics": SCENARIOS[options.scenario]()}
+        except ScenarioSkipped as e:
+            result = {"skipped": str(e)}
+        with open(options.output, "w", encoding="utf-8") as output_file:
+            json.dump(result, output_file)
+        os._exit(0)  # Skips Qt and worker teardown, which is not part of what is measured
+
+    history = load_history(options.history)
+    if options.command == "run":
+        entry = run_benchmarks(options.repeat, options.label)
+        history.append(entry)
+        save_history(options.history, history)
+        for name, values in entry["metrics"].items():
+            print(f"{name:<42}{values['median']:>14.4f}")
+        for scenario, reason in entry["skipped"].items():
+            print(f"{scenario} scenario skipped: {reason}")
+        if len(history) < 2:
+            return 0
+        baseline, current = history[-2], history[-1]
+    else:
+        baseline, current = find_entry(history, options.baseline), find_entry(history, options.current)
+
+    rows = compare(baseline, current, options.threshold)
+    print_comparison(rows, baseline, current, options.threshold)
+    return 1 if any(row[4] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
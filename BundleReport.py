@@ -0,0 +1,102 @@
+import os
+import re
+import sys
+import json
+import argparse
+
+# CUDA runtime libraries; in the CPU-only profile none of these should end up in the bundle
+CUDA_LIBRARY_PATTERN = re.compile(r"(cublas|cudnn|cufft|curand|cusolver|cusparse|cudart|nvrtc|nvjitlink|nccl|"
+                                  r"nvtoolsext|caffe2_nvrtc|torch_cuda|c10_cuda|cupti)", re.IGNORECASE)
+
+
+def package_of(relative_path):
+    """
+    Attributes a bundled file to a package: the first folder under _internal, or for loose DLLs and
+    extension modules the name before the first dot or version number (cublasLt64_11.dll -> cublasLt).
+    """
+    parts = relative_path.replace("\\", "/").split("/")
+    if parts[0] == "_internal":
+        parts = parts[1:]
+    if len(parts) > 1:
+        name = parts[0]
+        return name.split("-")[0] if name.endswith((".dist-info", ".egg-info")) else name
+    match = re.match(r"([A-Za-z_]+?)(?:\d|\.|$)", parts[0])
+    return match.group(1) if match else parts[0]
+
+
+def bundle_report(dist_dir):
+    """
+    :return: A dict with the total size, the size and file count per package (largest first) and the
+             CUDA libraries found in the bundle.
+    """
+    packages = {}
+    cuda_libraries = []
+    total = 0
+    for root, _, files in os.walk(dist_dir):
+        for file_name in files:
+            path = os.path.join(root, file_name)
+            size = os.path.getsize(path)
+            relative_path = os.path.relpath(path, dist_dir)
+            entry = packages.setdefault(package_of(relative_path), {"bytes": 0, "files": 0})
+            entry["bytes"] += size
+            entry["files"] += 1
+            total += size
+            if file_name.lower().endswith((".dll", ".so", ".dylib")) and CUDA_LIBRARY_PATTERN.search(file_name):
+                cuda_libraries.append(relative_path)
+    ordered = dict(sorted(packages.items(), key=lambda item: item[1]["bytes"], reverse=True))
+    return {"dist_dir": os.path.abspath(dist_dir), "total_bytes": total, "packages": ordered,
+            "cuda_libraries": sorted(cuda_libraries)}
+
+
+def format_report(report, previous=None, limit=40):
+    lines = [f"Bundle {report['dist_dir']}: {report['total_bytes'] / 1024 ** 2:,.1f} MB"]
+    if previous is not None:
+        change = (report["total_bytes"] - previous["total_bytes"]) / 1024 ** 2
+        lines[0] += f" ({change:+,.1f} MB)"
+    for name, entry in list(report["packages"].items())[:limit]:
+        line = f"  {name:<32}{entry['bytes'] / 1024 ** 2:>10,.1f} MB{entry['files']:>8} files"
+        if previous is not None:
+            old = previous["packages"].get(name, {"bytes": 0})["bytes"]
+            line += f"{(entry['bytes'] - old) / 1024 ** 2:>+10,.1f} MB"
+        lines.append(line)
+    if report["cuda_libraries"]:
+        lines.append(f"  CUDA libraries: {len(report['cuda_libraries'])}")
+    return "\n".join(lines)
+
+
+def write_report(dist_dir, output_path):
+    """
+    Writes the report as JSON next to the bundle and prints it, with the change against the report
+    previously written to output_path.
+    """
+    previous = None
+    if os.path.exists(output_path):
+        with open(output_path, "r", encoding="utf-8") as report_file:
+            previous = json.load(report_file)
+    report = bundle_report(dist_dir)
+    with open(output_path, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2)
+    print(format_report(report, previous))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report the size of a PyInstaller bundle by package")
+    parser.add_argument("dist_dir", help="Bundle folder, e.g. dist/Main")
+    parser.add_argument("--compare", default=None, help="Earlier report (.json) to show the change against")
+    parser.add_argument("--output", default=None, help="Write this report as JSON")
+    options = parser.parse_args(argv)
+    previous = None
+    if options.compare:
+        with open(options.compare, "r", encoding="utf-8") as report_file:
+            previous = json.load(report_file)
+    report = bundle_report(options.dist_dir)
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as report_file:
+            json.dump(report, report_file, indent=2)
+    print(format_report(report, previous))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
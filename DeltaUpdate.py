@@ -0,0 +1,377 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+FORMAT_VERSION = 1
+CHUNK_SIZE = 4 * 1024 * 1024
+MANIFEST_NAME = "gantrithor_manifest.json"
+JOURNAL_NAME = ".update_journal.json"
+STAGING_NAME = ".update_staging"
+BACKUP_NAME = ".update_backup"
+# Update bookkeeping never appears in a manifest
+RESERVED_NAMES = (MANIFEST_NAME, JOURNAL_NAME, STAGING_NAME, BACKUP_NAME)
+
+
+class UpdateError(Exception):
+    """Raised when a patch does not match the installation or a chunk fails verification."""
+
+
+def chunk_hash(data):
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def file_chunks(path, chunk_size=CHUNK_SIZE):
+    hashes = []
+    with open(path, "rb") as chunked_file:
+        for block in iter(lambda: chunked_file.read(chunk_size), b""):
+            hashes.append(chunk_hash(block))
+    return hashes
+
+
+def load_json(path):
+    with open(path, "r", encoding="utf-8") as json_file:
+        return json.load(json_file)
+
+
+def write_json(path, data):
+    # Written next to the target and renamed over it, so readers see the old or the new file, never half of one
+    with open(path + ".tmp", "w", encoding="utf-8") as json_file:
+        json.dump(data, json_file, indent=0, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def build_manifest(root, version, path_map=None, workers=None, chunk_size=CHUNK_SIZE, known_files=None):
+    """
+    Describes a directory tree by content: for every file its size and the blake2b hashes of its
+    fixed-size chunks. Paths are relative and use '/', so manifests built on Windows and Linux compare equal.
+
+    :param path_map: Optional function mapping a relative path of root to its path in the installation
+                     (None leaves the file out), for trees whose layout differs from the installed one.
+    :param known_files: Optional {installed path: {"size", "chunks"}} for files the caller knows are unchanged
+                        since their chunks were computed with this chunk_size; those files are not read again
+                        unless their size differs.
+    """
+    files = {}
+    for folder, directories, file_names in os.walk(root):
+        directories[:] = [name for name in directories if name not in RESERVED_NAMES]
+        for file_name in file_names:
+            relative_path = os.path.relpath(os.path.join(folder, file_name), root).replace(os.sep, "/")
+            if file_name in RESERVED_NAMES or file_name.endswith(".tmp"):
+                continue
+            installed_path = path_map(relative_path) if path_map else relative_path
+            if installed_path is not None:
+                files[installed_path] = os.path.join(folder, file_name)
+    known_files = known_files or {}
+    chunks = {path: known_files[path]["chunks"] for path in files
+              if path in known_files and known_files[path]["size"] == os.path.getsize(files[path])}
+    to_hash = [path for path in files if path not in chunks]
+    with ThreadPoolExecutor(max_workers=workers or min(16, (os.cpu_count() or 4) * 2)) as executor:
+        chunks.update(zip(to_hash, executor.map(lambda path: file_chunks(files[path], chunk_size), to_hash)))
+    return {
+        "format": FORMAT_VERSION,
+        "version": version,
+        "chunk_size": chunk_size,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "files": {path: {"size": os.path.getsize(files[path]), "chunks": chunks[path]} for path in sorted(files)},
+    }
+
+
+def store_path(store_dir, digest):
+    return os.path.join(store_dir, digest[:2], digest)
+
+
+def write_chunk_store(root, manifest, store_dir, path_map=None):
+    """
+    Adds the chunks of a tree to a content-addressed store (<store>/<first two hex digits>/<hash>).
+    Chunks already stored by an earlier build are not read or written again.
+
+    :return: The number of chunks written.
+    """
+    sources = {}
+    for folder, directories, file_names in os.walk(root):
+        directories[:] = [name for name in directories if name not in RESERVED_NAMES]
+        for file_name in file_names:
+            relative_path = os.path.relpath(os.path.join(folder, file_name), root).replace(os.sep, "/")
+            installed_path = path_map(relative_path) if path_map else relative_path
+            if installed_path in manifest["files"]:
+                sources[installed_path] = os.path.join(folder, file_name)
+    written = 0
+    for installed_path, source_path in sources.items():
+        missing = [(number, digest) for number, digest in enumerate(manifest["files"][installed_path]["chunks"])
+                   if not os.path.exists(store_path(store_dir, digest))]
+        if not missing:
+            continue
+        with open(source_path, "rb") as source_file:
+            for number, digest in missing:
+                source_file.seek(number * manifest["chunk_size"])
+                block = source_file.read(manifest["chunk_size"])
+                target = store_path(store_dir, digest)
+                if os.path.exists(target):
+                    continue  # The same chunk appears twice in this tree
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target + ".tmp", "wb") as chunk_file:
+                    chunk_file.write(block)
+                os.replace(target + ".tmp", target)
+                written += 1
+    return written
+
+
+def diff_manifests(old, new):
+    """
+    :return: A dict with the paths to add, change and remove, the number of unchanged files, the chunks the
+             new files need that no file of the old installation contains, and their total size.
+    """
+    if old is not None and old.get("chunk_size") != new["chunk_size"]:
+        old = None  # Chunks of different sizes cannot be reused; everything is shipped
+    old_files = old["files"] if old is not None else {}
+    new_files = new["files"]
+    added = sorted(path for path in new_files if path not in old_files)
+    changed = sorted(path for path in new_files if path in old_files and old_files[path] != new_files[path])
+    removed = sorted(path for path in old_files if path not in new_files)
+    local_chunks = {digest for entry in old_files.values() for digest in entry["chunks"]}
+    needed, size = {}, 0
+    for path in added + changed:
+        entry = new_files[path]
+        for index, digest in enumerate(entry["chunks"]):
+            if digest not in local_chunks and digest not in needed:
+                needed[digest] = True
+                size += min(new["chunk_size"], entry["size"] - index * new["chunk_size"])
+    return {"from_version": old.get("version") if old else None, "to_version": new["version"],
+            "added": added, "changed": changed, "removed": removed,
+            "unchanged": len(new_files) - len(added) - len(changed), "chunks": list(needed), "chunk_bytes": size}
+
+
+def make_patch(old_manifest, new_manifest, store_dir, patch_dir):
+    """
+    Writes a patch folder: the new manifest, the diff, and only the chunks the old installation lacks.
+    """
+    diff = diff_manifests(old_manifest, new_manifest)
+    os.makedirs(os.path.join(patch_dir, "chunks"), exist_ok=True)
+    for digest in diff["chunks"]:
+        target = store_path(os.path.join(patch_dir, "chunks"), digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copy2(store_path(store_dir, digest), target)
+    write_json(os.path.join(patch_dir, "diff.json"), diff)
+    write_json(os.path.join(patch_dir, MANIFEST_NAME), new_manifest)
+    return diff
+
+
+class DeltaUpdater:
+    """
+    DeltaUpdater Class Description:
+
+    Applies a patch made by make_patch to an installation. The new files are first assembled in a staging
+    folder inside the installation, from chunks of the installed files and chunks shipped in the patch, and
+    every chunk is checked against its hash. Only then are files swapped in: each replaced or removed file is
+    moved to a backup folder, the staged one renamed into place, and a journal records progress. If anything
+    fails, the backup is moved back, so the installation is either the old version or the new one. A journal
+    left by an interrupted update is rolled back by recover() before the next update.
+
+    Renames are used instead of copies, so this also works for Gantrithor.exe and DLLs that are in use
+    (Windows allows renaming a running executable, not overwriting it).
+
+    Attributes:
+    - install_dir (str): The installation folder, containing gantrithor_manifest.json.
+    - patch_dir (str): The patch folder with gantrithor_manifest.json, diff.json and chunks/.
+
+    Methods:
+    - installed_manifest(): Returns the manifest of the installation, or None.
+    - verify_installation(): Returns the paths whose size differs from the installed manifest.
+    - apply(): Stages, verifies and swaps in the new files.
+    - recover(): Rolls back an interrupted update.
+    """
+
+    def __init__(self, install_dir, patch_dir=None):
+        self.install_dir = install_dir
+        self.patch_dir = patch_dir
+        self.staging_dir = os.path.join(install_dir, STAGING_NAME)
+        self.backup_dir = os.path.join(install_dir, BACKUP_NAME)
+        self.journal_path = os.path.join(install_dir, JOURNAL_NAME)
+        self.manifest_path = os.path.join(install_dir, MANIFEST_NAME)
+
+    def installed_manifest(self):
+        return load_json(self.manifest_path) if os.path.exists(self.manifest_path) else None
+
+    def local_path(self, relative_path):
+        return os.path.join(self.install_dir, *relative_path.split("/"))
+
+    def verify_installation(self, manifest, paths=None):
+        mismatched = []
+        for path in paths if paths is not None else manifest["files"]:
+            local_path = self.local_path(path)
+            if not os.path.isfile(local_path) or os.path.getsize(local_path) != manifest["files"][path]["size"]:
+                mismatched.append(path)
+        return mismatched
+
+    def _local_chunk_index(self, manifest):
+        index = {}
+        for path, entry in manifest["files"].items():
+            for number, digest in enumerate(entry["chunks"]):
+                index.setdefault(digest, (path, number * manifest["chunk_size"]))
+        return index
+
+    def _read_chunk(self, digest, local_index, chunk_size):
+        patch_chunk = store_path(os.path.join(self.patch_dir, "chunks"), digest)
+        if os.path.exists(patch_chunk):
+            with open(patch_chunk, "rb") as chunk_file:
+                block = chunk_file.read()
+        elif digest in local_index:
+            path, offset = local_index[digest]
+            with open(self.local_path(path), "rb") as local_file:
+                local_file.seek(offset)
+                block = local_file.read(chunk_size)
+        else:
+            raise UpdateError(f"Chunk {digest} is neither in the patch nor in the installation")
+        if chunk_hash(block) != digest:
+            raise UpdateError(f"Chunk {digest} failed verification")
+        return block
+
+    def stage(self, old_manifest, new_manifest, diff):
+        if os.path.exists(self.staging_dir):
+            shutil.rmtree(self.staging_dir)
+        local_index = self._local_chunk_index(old_manifest) if old_manifest else {}
+        for path in diff["added"] + diff["changed"]:
+            entry = new_manifest["files"][path]
+            staged_path = os.path.join(self.staging_dir, *path.split("/"))
+            os.makedirs(os.path.dirname(staged_path), exist_ok=True)
+            with open(staged_path, "wb") as staged_file:
+                for digest in entry["chunks"]:
+                    staged_file.write(self._read_chunk(digest, local_index, new_manifest["chunk_size"]))
+            if os.path.getsize(staged_path) != entry["size"]:
+                raise UpdateError(f"{path} was staged with the wrong size")
+
+    def apply(self):
+        """
+        :return: The diff that was applied.
+        """
+        self.recover()
+        new_manifest = load_json(os.path.join(self.patch_dir, MANIFEST_NAME))
+        diff = load_json(os.path.join(self.patch_dir, "diff.json"))
+        old_manifest = self.installed_manifest()
+        installed_version = old_manifest.get("version") if old_manifest else None
+        if diff["from_version"] is not None and diff["from_version"] != installed_version:
+            raise UpdateError(f"Patch is for version {diff['from_version']}, installed is {installed_version}")
+        if old_manifest is not None:
+            # Files the patch rebuilds from local chunks must be intact
+            mismatched = self.verify_installation(old_manifest, [path for path in old_manifest["files"]
+                                                                 if path not in diff["removed"]])
+            if mismatched:
+                raise UpdateError(f"Installation differs from its manifest: {', '.join(mismatched[:5])}")
+
+        self.stage(old_manifest, new_manifest, diff)
+        try:
+            self._swap(diff)
+            write_json(self.manifest_path, new_manifest)
+        except Exception:
+            self.recover()
+            raise
+        self._finish()
+        return diff
+
+    def _swap(self, diff):
+        # Each step is written to the journal before it is done, so recover() can undo any prefix of them
+        journal = {"replaced": [], "added": [], "removed": []}
+        write_json(self.journal_path, journal)
+        os.makedirs(self.backup_dir, exist_ok=True)
+        if os.path.exists(self.manifest_path):
+            shutil.copy2(self.manifest_path, os.path.join(self.backup_dir, MANIFEST_NAME))
+        for path in diff["added"] + diff["changed"] + diff["removed"]:
+            local_path = self.local_path(path)
+            if os.path.lexists(local_path):
+                # Added paths can collide with stray files, which are kept in the backup as well
+                journal["removed" if path in diff["removed"] else "replaced"].append(path)
+                write_json(self.journal_path, journal)
+                backup_path = os.path.join(self.backup_dir, *path.split("/"))
+                os.makedirs(os.path.dirname(backup_path), exist_ok=True)
+                os.replace(local_path, backup_path)
+            if path not in diff["removed"]:
+                journal["added"].append(path)
+                write_json(self.journal_path, journal)
+                os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                os.replace(os.path.join(self.staging_dir, *path.split("/")), local_path)
+
+    def recover(self):
+        """
+        Undoes a partly applied update recorded in the journal.
+
+        :return: True when an interrupted update was rolled back.
+        """
+        if not os.path.exists(self.journal_path):
+            self._finish()
+            return False
+        journal = load_json(self.journal_path)
+        for path in journal["added"]:
+            if os.path.lexists(self.local_path(path)):
+                os.remove(self.local_path(path))
+        for path in journal["replaced"] + journal["removed"]:
+            backup_path = os.path.join(self.backup_dir, *path.split("/"))
+            if os.path.exists(backup_path):
+                os.makedirs(os.path.dirname(self.local_path(path)), exist_ok=True)
+                os.replace(backup_path, self.local_path(path))
+        backup_manifest = os.path.join(self.backup_dir, MANIFEST_NAME)
+        if os.path.exists(backup_manifest):
+            os.replace(backup_manifest, self.manifest_path)
+        self._finish()
+        return True
+
+    def _finish(self):
+        for path in (self.journal_path, self.journal_path + ".tmp"):
+            if os.path.exists(path):
+                os.remove(path)
+        for folder in (self.staging_dir, self.backup_dir):
+            # Files of a running executable cannot be deleted on Windows; the next update removes them
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Content-addressed manifests and delta updates")
+    commands = parser.add_subparsers(dest="command", required=True)
+    manifest_parser = commands.add_parser("manifest", help="Write the manifest of a directory tree")
+    manifest_parser.add_argument("root")
+    manifest_parser.add_argument("--version", required=True)
+    manifest_parser.add_argument("--output", required=True)
+    manifest_parser.add_argument("--store", default=None, help="Also add the chunks to this chunk store")
+    diff_parser = commands.add_parser("diff", help="Summarize the changes between two manifests")
+    diff_parser.add_argument("old")
+    diff_parser.add_argument("new")
+    patch_parser = commands.add_parser("patch", help="Write a patch from one manifest to another")
+    patch_parser.add_argument("--old", default=None, help="Manifest of the installed version (none: full patch)")
+    patch_parser.add_argument("--new", required=True)
+    patch_parser.add_argument("--store", required=True)
+    patch_parser.add_argument("--output", required=True)
+    apply_parser = commands.add_parser("apply", help="Apply a patch to an installation")
+    apply_parser.add_argument("install_dir")
+    apply_parser.add_argument("patch_dir")
+    options = parser.parse_args(argv)
+
+    if options.command == "manifest":
+        manifest = build_manifest(options.root, options.version)
+        write_json(options.output, manifest)
+        if options.store:
+            print(f"{write_chunk_store(options.root, manifest, options.store)} new chunks stored")
+        print(f"{len(manifest['files'])} files")
+    elif options.command in ("diff", "patch"):
+        old = load_json(options.old) if options.old else None
+        new = load_json(options.new)
+        diff = diff_manifests(old, new) if options.command == "diff" else \
+            make_patch(old, new, options.store, options.output)
+        print(f"{diff['from_version']} -> {diff['to_version']}: {len(diff['added'])} added, "
+              f"{len(diff['changed'])} changed, {len(diff['removed'])} removed, {diff['unchanged']} unchanged, "
+              f"{len(diff['chunks'])} chunks ({diff['chunk_bytes'] / 1024 ** 2:,.1f} MB) to ship")
+    elif options.command == "apply":
+        try:
+            diff = DeltaUpdater(options.install_dir, options.patch_dir).apply()
+        except UpdateError as e:
+            print(f"Update failed, installation left unchanged: {e}", file=sys.stderr)
+            return 1
+        print(f"Updated to {diff['to_version']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
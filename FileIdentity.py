@@ -0,0 +1,44 @@
+import os
+
+WEIGHT_SUFFIXES = (".safetensors", ".bin", ".pt", ".pth", ".ckpt")
+
+
+def weight_files(model_path):
+    """
+    :return: [name, size, mtime_ns] of the weight files and config.json of a local checkpoint folder, sorted
+             by name. Unlike the folder's own mtime, this only changes when the weights do.
+    """
+    entries = []
+    for file_name in sorted(os.listdir(model_path)):
+        if file_name.endswith(WEIGHT_SUFFIXES) or file_name == "config.json":
+            stat = os.stat(os.path.join(model_path, file_name))
+            entries.append([file_name, stat.st_size, stat.st_mtime_ns])
+    return entries
+
+
+def folder_files(path):
+    """
+    :return: weight_files() for a checkpoint folder; [name, size, mtime_ns] of the top-level entries of any
+             other folder (datasets), with size 0 for subfolders.
+    """
+    files = weight_files(path)
+    if files:
+        return files
+    for entry in sorted(os.scandir(path), key=lambda entry: entry.name):
+        stat = entry.stat()
+        files.append([entry.name, stat.st_size if entry.is_file() else 0, stat.st_mtime_ns])
+    return files
+
+
+def path_signature(path):
+    """
+    Changes whenever what is loaded from path changes on disk: the size and mtime of a file, or folder_files()
+    of a folder. None for Hugging Face Hub ids and other paths that do not exist locally.
+    """
+    try:
+        if os.path.isdir(path):
+            return folder_files(path)
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
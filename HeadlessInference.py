@@ -0,0 +1,420 @@
+import os
+import abc
+import sys
+import json
+import time
+import logging
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from ResourceCache import ResourceCache
+from PerformanceMonitor import span
+from TaskLoaders import load_task_model
+
+
+def read_records(input_path, limit=None):
+    """
+    Streams records from a .jsonl or .parquet file without loading the whole file.
+    """
+    count = 0
+    if input_path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(input_path)
+        for record_batch in parquet_file.iter_batches(batch_size=4096):
+            for record in record_batch.to_pylist():
+                if limit is not None and count >= limit:
+                    return
+                count += 1
+                yield record
+    else:
+        with open(input_path, "r", encoding="utf-8") as input_file:
+            for line in input_file:
+                line = line.strip()
+                if not line:
+                    continue
+                if limit is not None and count >= limit:
+                    return
+                count += 1
+                yield json.loads(line)
+
+
+def dynamic_batches(records, cost_function, max_cost, max_batch_size):
+    """
+    Groups records into batches whose summed cost (tokens or pixels) stays under max_cost.
+    A single record over the budget is sent on its own.
+    """
+    batch, batch_cost = [], 0
+    for record in records:
+        cost = cost_function(record)
+        if batch and (batch_cost + cost > max_cost or len(batch) >= max_batch_size):
+            yield batch
+            batch, batch_cost = [], 0
+        batch.append(record)
+        batch_cost += cost
+    if batch:
+        yield batch
+
+
+class TaskRunner(abc.ABC):
+    """
+    Base class for the per-task model runners used by the headless CLI and the inference workers. Models
+    are loaded with TaskLoaders.load_task_model through a ResourceCache, and labels come from the model's
+    id2label map. Subclasses implement cost() and predict().
+    """
+
+    task_name = None
+    batch_budget_option = "max_batch_tokens"
+    # Inference backends (see InferenceBackend) this runner can be switched to after loading
+    supported_backends = ("fp32", "int8")
+
+    def __init__(self, model_path, resource_cache, options, load=True):
+        self.model_path = model_path
+        self.resource_cache = resource_cache
+        self.options = options
+        self.scripted_model = None
+        if load:
+            self.load()
+
+    def load(self):
+        loaded = load_task_model(self.task_name, self.model_path, self.resource_cache)
+        self.model = loaded["model"]
+        self.id2label = loaded["id2label"]
+        return loaded
+
+    @abc.abstractmethod
+    def cost(self, record):
+        """
+        The share of the batch budget (options.<batch_budget_option>) a record takes: tokens or pixels.
+        """
+
+    def prepare(self, records):
+        return records
+
+    @abc.abstractmethod
+    def predict(self, prepared):
+        """
+        :return: One JSON-serialisable prediction per record of the prepared batch.
+        """
+
+    def agreement_key(self, result):
+        """
+        The part of a prediction an optimized backend must reproduce to count as agreeing with fp32.
+        """
+        return result.get("label")
+
+    def text_of(self, record):
+        return str(record[self.options.text_field])
+
+    def word_cost(self, record):
+        # Whitespace words are a cheap upper-bound proxy for sub-word tokens
+        return max(1, int(len(self.text_of(record).split()) * 1.3) + 2)
+
+
+class TracedRunner(TaskRunner):
+    """
+    A classifier whose model takes tensors and returns logits, so it can also run as a TorchScript module.
+    Subclasses implement trace_inputs().
+    """
+
+    supported_backends = ("fp32", "int8", "torchscript", "int8+torchscript", "compile")
+
+    @abc.abstractmethod
+    def trace_inputs(self, prepared):
+        """
+        Returns the input names and tensors a TorchScript backend is traced and called with.
+        """
+
+    def logits(self, prepared):
+        input_names, tensors = self.trace_inputs(prepared)
+        if self.scripted_model is not None:
+            return self.scripted_model(*tensors)
+        outputs = self.model(**dict(zip(input_names, tensors)))
+        return getattr(outputs, "logits", outputs)  # timm models return the logits tensor itself
+
+    def predict(self, prepared):
+        import torch
+
+        with torch.no_grad():
+            probabilities = torch.softmax(self.logits(prepared), dim=-1)
+        scores, indices = probabilities.max(dim=-1)
+        return [{"label": self.id2label[int(index)], "score": float(score)} for score, index in zip(scores, indices)]
+
+
+class ImageRecordsMixin:
+    """Image records are batched by pixel count; the image is read from options.image_field."""
+
+    batch_budget_option = "max_batch_pixels"
+
+    def image_path(self, record):
+        return str(record[self.options.image_field])
+
+    def cost(self, record):
+        from PIL import Image
+
+        # Opening only reads the header, the pixels are decoded in prepare()
+        with Image.open(self.image_path(record)) as image:
+            return image.width * image.height
+
+
+class NERRunner(TaskRunner):
+    task_name = "ner"
+
+    def cost(self, record):
+        return self.word_cost(record)
+
+    def predict(self, prepared):
+        sentences = [self.text_of(record) for record in prepared]
+        predictions = self.model.predict(sentences, batch_size=len(sentences), show_progress_bar=False)
+        return [{"entities": [{key: (float(value) if key == "score" else value) for key, value in entity.items()}
+                              for entity in sentence_entities]}
+                for sentence_entities in predictions]
+
+    def agreement_key(self, result):
+        return sorted((entity.get("char_start_index"), entity.get("char_end_index"), entity.get("label"))
+                      for entity in result["entities"])
+
+
+class TextRunner(TracedRunner):
+    task_name = "text"
+
+    def load(self):
+        self.tokenizer = super().load()["tokenizer"]
+
+    def cost(self, record):
+        return self.word_cost(record)
+
+    def prepare(self, records):
+        return self.tokenizer([self.text_of(record) for record in records], padding=True, truncation=True,
+                              return_tensors="pt")
+
+    def trace_inputs(self, prepared):
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in prepared]
+        return input_names, tuple(prepared[name] for name in input_names)
+
+
+class ImageRunner(ImageRecordsMixin, TracedRunner):
+    task_name = "img"
+
+    def load(self):
+        # timm checkpoints (what the app ships) and transformers classifiers, with the model's own preprocessing
+        loaded = super().load()
+        self.transform, self.input_size = loaded["transform"], loaded["input_size"]
+        self.input_name = "x" if loaded["framework"] == "timm" else "pixel_values"
+
+    def prepare(self, records):
+        import torch
+        from ImagePipeline import ImagePipeline
+
+        images = [ImagePipeline.load_for_model(self.image_path(record), self.input_size) for record in records]
+        return images, {self.input_name: torch.stack([self.transform(image) for image in images])}
+
+    def trace_inputs(self, prepared):
+        _, inputs = prepared
+        return [self.input_name], (inputs[self.input_name],)
+
+
+class ObjectRunner(ImageRecordsMixin, TaskRunner):
+    task_name = "obj"
+    # Detection outputs feed post-processing that needs the full output object, so they are not traced
+    supported_backends = ("fp32", "int8", "compile")
+
+    def load(self):
+        self.processor = super().load()["processor"]
+
+    def prepare(self, records):
+        from PIL import Image
+
+        images = []
+        for record in records:
+            with Image.open(self.image_path(record)) as image:
+                images.append(image.convert("RGB"))
+        return images, self.processor(images=images, return_tensors="pt")
+
+    def agreement_key(self, result):
+        # Boxes are compared on a 8-pixel grid so that tiny coordinate changes still count as agreeing
+        return sorted((detected["label"], tuple(round(value / 8) for value in detected["box"]))
+                      for detected in result["objects"])
+
+    def predict(self, prepared):
+        import torch
+
+        images, inputs = prepared
+        with torch.no_grad():
+            outputs = self.model(**inputs)
+        target_sizes = torch.tensor([[image.height, image.width] for image in images])
+        detections = self.processor.post_process_object_detection(outputs, threshold=self.options.threshold,
+                                                                  target_sizes=target_sizes)
+        return [{"objects": [{"label": self.id2label[int(label)], "score": float(score),
+                              "box": [float(value) for value in box]}
+                             for score, label, box in zip(detection["scores"], detection["labels"], detection["boxes"])]}
+                for detection in detections]
+
+
+TASK_RUNNERS = {"ner": NERRunner, "text": TextRunner, "img": ImageRunner, "obj": ObjectRunner}
+
+
+def run_inference(options):
+    """
+    Runs a headless inference job and writes one JSON line per input record to options.output.
+
+    :return: A dict with the sample count, elapsed seconds and samples per second.
+    """
+    if options.workers > 1:
+        return run_parallel_inference(options)
+
+    if options.threads:
+        import torch
+
+        torch.set_num_threads(options.threads)
+
+    start_time = time.perf_counter()
+    resource_cache = ResourceCache(ram_budget_mb=0)
+    runner = TASK_RUNNERS[options.task](options.model, resource_cache, options)
+    prepare_backend(runner, options)
+    load_seconds = time.perf_counter() - start_time
+
+    records = read_records(options.input, options.limit)
+    max_cost = getattr(options, runner.batch_budget_option)
+    batches = dynamic_batches(records, runner.cost, max_cost, options.max_batch_size)
+
+    processed = 0
+    inference_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options.prepare_workers) as executor, \
+            open(options.output, "w", encoding="utf-8") as output_file:
+        # Tokenization and image decoding for the next batches run on the pool while the model runs
+        pending = deque()
+        for batch in batches:
+            pending.append((batch, executor.submit(runner.prepare, batch)))
+            if len(pending) > options.prefetch:
+                processed += write_batch(runner, *pending.popleft(), output_file, options.id_field)
+        while pending:
+            processed += write_batch(runner, *pending.popleft(), output_file, options.id_field)
+
+    return inference_stats(options.task, processed, load_seconds, time.perf_counter() - inference_start)
+
+
+def run_parallel_inference(options):
+    """
+    Same as run_inference, but shards the batches across options.workers processes through
+    ParallelInferenceEngine. Results still come back and are written in input order.
+    """
+    from InferenceEngine import ParallelInferenceEngine
+
+    if options.backend != "fp32":
+        # The backend is checked once here; the workers then only read the stored decision
+        check_runner = TASK_RUNNERS[options.task](options.model, ResourceCache(ram_budget_mb=0), options)
+        prepare_backend(check_runner, options)
+        del check_runner
+
+    cost_runner = TASK_RUNNERS[options.task](options.model, None, options, load=False)
+    records = read_records(options.input, options.limit)
+    max_cost = getattr(options, cost_runner.batch_budget_option)
+    batches = dynamic_batches(records, cost_runner.cost, max_cost, options.max_batch_size)
+
+    start_time = time.perf_counter()
+    processed = 0
+    with ParallelInferenceEngine(options.task, options.model, workers=options.workers,
+                                 threads_per_worker=options.threads or 1, options=options) as engine, \
+            open(options.output, "w", encoding="utf-8") as output_file:
+        load_seconds = engine.wait_until_ready()
+        inference_start = time.perf_counter()
+        for batch, results in engine.predict_batches(batches):
+            processed += write_results(batch, results, output_file, options.id_field)
+    return inference_stats(options.task, processed, load_seconds, time.perf_counter() - inference_start)
+
+
+def prepare_backend(runner, options, check=True):
+    """
+    Switches runner to options.backend, checking it against fp32 on the first options.check_samples input
+    records when no decision is stored next to the checkpoint yet.
+    """
+    if options.backend == "fp32":
+        return None
+    from InferenceBackend import apply_backend
+
+    check_records = list(read_records(options.input, options.check_samples)) if check and options.input else None
+    return apply_backend(runner, options.backend, check_records, min_agreement=options.min_agreement)
+
+
+def inference_stats(task, processed, load_seconds, elapsed):
+    stats = {
+        "samples": processed,
+        "model_load_seconds": round(load_seconds, 3),
+        "inference_seconds": round(elapsed, 3),
+        "samples_per_second": round(processed / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+    logging.info("Headless %s inference: %s", task, stats)
+    return stats
+
+
+def write_batch(runner, batch, prepared_future, output_file, id_field):
+    prepared = prepared_future.result()
+    with span("predict_batch", "inference", size=len(batch)):
+        results = runner.predict(prepared)
+    return write_results(batch, results, output_file, id_field)
+
+
+def write_results(batch, results, output_file, id_field):
+    for record, result in zip(batch, results):
+        if id_field in record:
+            result = {id_field: record[id_field], **result}
+        output_file.write(json.dumps(result) + "\n")
+    output_file.flush()  # Results are written as they are produced, so a stopped job keeps its output
+    return len(batch)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="gantrithor", description="Gantrithor headless tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    infer = subparsers.add_parser("infer", help="Run batch inference without the GUI")
+    infer.add_argument("--task", choices=sorted(TASK_RUNNERS), required=True)
+    infer.add_argument("--model", required=True, help="Model folder or Hugging Face id")
+    infer.add_argument("--input", required=True, help=".jsonl or .parquet file")
+    infer.add_argument("--output", required=True, help=".jsonl file the predictions are written to")
+    infer.add_argument("--text-field", default="text")
+    infer.add_argument("--image-field", default="image", help="Field holding the image path")
+    infer.add_argument("--id-field", default="id")
+    infer.add_argument("--max-batch-tokens", type=int, default=8192)
+    infer.add_argument("--max-batch-pixels", type=int, default=32 * 224 * 224)
+    infer.add_argument("--max-batch-size", type=int, default=64)
+    infer.add_argument("--threads", type=int, default=0,
+                       help="torch intra-op threads, per worker process when --workers > 1 (0 keeps the default)")
+    infer.add_argument("--workers", type=int, default=1, help="Worker processes, each with its own copy of the model")
+    infer.add_argument("--prepare-workers", type=int, default=max(1, min(4, (os.cpu_count() or 2) // 2)))
+    infer.add_argument("--prefetch", type=int, default=2, help="Batches prepared ahead of the model")
+    infer.add_argument("--threshold", type=float, default=0.5, help="Score threshold for object detection")
+    infer.add_argument("--limit", type=int, default=None)
+    infer.add_argument("--backend", choices=["fp32", "int8", "torchscript", "int8+torchscript", "compile"],
+                       default=os.environ.get("GANTRITHOR_INFERENCE_BACKEND", "fp32"),
+                       help="Optimized CPU backend, used only if it agrees with fp32 on the check slice")
+    infer.add_argument("--check-samples", type=int, default=256,
+                       help="Records compared between fp32 and the backend the first time it is used")
+    infer.add_argument("--min-agreement", type=float, default=0.99)
+    return parser
+
+
+def default_options(task, model_path, **overrides):
+    """
+    Returns the infer options with their defaults, for callers such as the task GUIs that do not parse argv.
+    """
+    options = build_parser().parse_args(["infer", "--task", task, "--model", model_path, "--input", "", "--output", ""])
+    for name, value in overrides.items():
+        setattr(options, name, value)
+    return options
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    options = build_parser().parse_args(argv)
+    if options.command == "infer":
+        stats = run_inference(options)
+        print(f"{stats['samples']} samples in {stats['inference_seconds']} s "
+              f"({stats['samples_per_second']} samples/sec, model load {stats['model_load_seconds']} s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
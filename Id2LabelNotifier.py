@@ -0,0 +1,271 @@
+from contextlib import contextmanager
+
+from PerformanceMonitor import span
+
+
+def normalize_id2label(id2label):
+    """Model configs use int keys and JSON files str keys; both are compared as ints where possible."""
+    normalized = {}
+    for key, label in (id2label or {}).items():
+        try:
+            normalized[int(key)] = label
+        except (TypeError, ValueError):
+            normalized[key] = label
+    return normalized
+
+
+class Id2LabelChangeSet:
+    """
+    The difference between the id2label map a subscriber last received and the current one.
+
+    Attributes:
+    - added (dict): id -> label for ids that are new.
+    - removed (dict): id -> label for ids that are gone.
+    - renamed (dict): id -> (old label, new label).
+    - id2label (dict): The full current map, for subscribers that need it.
+    - calls (int): Notifications coalesced into this change set.
+    """
+
+    def __init__(self, previous, current, calls=1):
+        previous, current = normalize_id2label(previous), normalize_id2label(current)
+        self.added = {key: label for key, label in current.items() if key not in previous}
+        self.removed = {key: label for key, label in previous.items() if key not in current}
+        self.renamed = {key: (previous[key], label) for key, label in current.items()
+                        if key in previous and previous[key] != label}
+        self.id2label = current
+        self.calls = calls
+
+    @property
+    def is_empty(self):
+        return not (self.added or self.removed or self.renamed)
+
+    @property
+    def labels_only(self):
+        """True when only label names changed, so row and column layouts stay as they are."""
+        return bool(self.renamed) and not (self.added or self.removed)
+
+    def touches(self, ids):
+        ids = set(normalize_id2label(dict.fromkeys(ids)))
+        return bool(ids & (set(self.added) | set(self.removed) | set(self.renamed)))
+
+    def __repr__(self):
+        return (f"Id2LabelChangeSet(added={len(self.added)}, removed={len(self.removed)}, "
+                f"renamed={len(self.renamed)}, calls={self.calls})")
+
+
+class Id2LabelSubscriber:
+    """
+    Stands in for a GUI component on an id2label observer. Calls are forwarded to the component as they are
+    made, and the label map (the dict argument) of the last one is recorded. While the notifier is batching
+    (see Id2LabelNotifier.batch()), calls that pass a label map are held back instead, and only the latest
+    one per method is delivered when the batch ends. Reading any other attribute delivers the held-back
+    calls first, so the observer always sees the component's up-to-date state.
+    """
+
+    def __init__(self, notifier, component):
+        self._notifier = notifier
+        self._component = component
+        self._pending = {}  # method name -> (args, kwargs, calls) of the latest held-back call
+        self._delivered = None  # id2label map of the last delivery
+        self._call = None  # (method name, keyword or None) of the last delivery, when the map was its only argument
+
+    @property
+    def component(self):
+        return self._component
+
+    @property
+    def delivered(self):
+        return self._delivered
+
+    @property
+    def call(self):
+        return self._call
+
+    @property
+    def has_pending(self):
+        return bool(self._pending)
+
+    def __getattr__(self, name):
+        value = getattr(self._component, name)
+        if not callable(value):
+            self._notifier.flush_pending()
+            return getattr(self._component, name)
+
+        def call(*args, **kwargs):
+            self._notifier.stats["calls"] += 1
+            if self._notifier.batching and self._id2label_argument(args, kwargs) is not None:
+                calls = self._pending[name][2] + 1 if name in self._pending else 1
+                self._pending[name] = (args, kwargs, calls)
+                return None
+            self._notifier.flush_pending()
+            return self._deliver(name, args, kwargs)
+
+        return call
+
+    def __eq__(self, other):
+        # Observers that check membership before adding a subscriber see the same component as equal
+        if isinstance(other, Id2LabelSubscriber):
+            other = other._component
+        return other is self._component
+
+    def __hash__(self):
+        return hash(self._component)
+
+    @staticmethod
+    def _id2label_argument(args, kwargs):
+        if isinstance(kwargs.get("id2label"), dict):
+            return kwargs["id2label"]
+        for value in list(args) + list(kwargs.values()):
+            if isinstance(value, dict):
+                return value
+        return None
+
+    def _deliver(self, name, args, kwargs, calls=1, skip_unchanged=False):
+        """
+        Runs one call on the component. A component implementing on_id2label_changes(change_set) receives the
+        diff against the last delivered map instead, and nothing when the map did not change.
+
+        :return: (result, delivered), where delivered is False for a skipped call.
+        """
+        id2label = self._id2label_argument(args, kwargs)
+        if id2label is None:
+            return getattr(self._component, name)(*args, **kwargs), True
+        change_set = Id2LabelChangeSet(self._delivered, id2label, calls)
+        unchanged = self._delivered is not None and change_set.is_empty
+        if unchanged and (skip_unchanged or hasattr(self._component, "on_id2label_changes")):
+            return None, False
+        self._delivered = dict(id2label)
+        if len(args) + len(kwargs) == 1:
+            self._call = (name, next(iter(kwargs), None))
+        if hasattr(self._component, "on_id2label_changes"):
+            return self._component.on_id2label_changes(change_set), True
+        return getattr(self._component, name)(*args, **kwargs), True
+
+    def flush(self):
+        """
+        Delivers the held-back calls, skipping those whose label map is the same as at the last delivery.
+        Exceptions raised by the component propagate; calls not delivered yet stay pending.
+
+        :return: (delivered, skipped) counts.
+        """
+        delivered = skipped = 0
+        while self._pending:
+            name = next(iter(self._pending))
+            args, kwargs, calls = self._pending.pop(name)
+            if self._deliver(name, args, kwargs, calls, skip_unchanged=True)[1]:
+                delivered += 1
+            else:
+                skipped += 1
+        return delivered, skipped
+
+
+class Id2LabelNotifier:
+    """
+    Id2LabelNotifier Class Description:
+
+    Sits between a task's id2label observer and the components Main adds to it. Each component is wrapped in
+    an Id2LabelSubscriber, which passes the observer's calls straight through and records the label map the
+    component last received (saved with the session). A component implementing
+    on_id2label_changes(change_set) gets only the added, removed and renamed labels.
+
+    Coalescing is opt-in: code that changes labels many times in a row (a model with hundreds of labels
+    loading, a bulk edit) runs inside `with notifier.batch():`, and each component is updated once, in the
+    order it was added, when the block ends. Components whose label map did not change are skipped.
+    Delivery is synchronous in both cases, so code reading label state after a change sees it.
+
+    Attributes:
+    - task_name (str): Used in performance spans.
+    - subscribers (list): The Id2LabelSubscribers, in registration order.
+    - stats (dict): Counts of received calls, flushes, deliveries and skipped deliveries.
+
+    Methods:
+    - subscribe(): Wraps a component and adds it to an observer.
+    - batch(): Context manager coalescing the label updates made inside it.
+    - publish(): Sends a label map to every component the way the observer last did (session restore).
+    - flush(): Delivers all held-back notifications now.
+    - flush_pending(): Same, only when notifications are held back.
+    """
+
+    def __init__(self, task_name):
+        self.task_name = task_name
+        self.subscribers = []
+        self.stats = {"calls": 0, "flushes": 0, "delivered": 0, "skipped": 0}
+        self._batch_depth = 0
+
+    @property
+    def batching(self):
+        return self._batch_depth > 0
+
+    @property
+    def id2label(self):
+        """The current label map of the task's components, or None before the first delivery."""
+        self.flush_pending()
+        for subscriber in self.subscribers:
+            if subscriber.delivered is not None:
+                return subscriber.delivered
+        return None
+
+    @property
+    def id2label_call(self):
+        """
+        (method name, keyword or None) the observer used to pass the label map, or None when it has not
+        passed one yet or passed other arguments with it.
+        """
+        for subscriber in self.subscribers:
+            if subscriber.call is not None:
+                return subscriber.call
+        return None
+
+    def publish(self, id2label, method, keyword=None):
+        """
+        Sends id2label to every component through method, as the observer would, coalesced into one delivery
+        per component. Keys saved as JSON strings are turned back into ints.
+        """
+        id2label = normalize_id2label(id2label)
+        with self.batch():
+            for subscriber in list(self.subscribers):
+                if keyword is None:
+                    getattr(subscriber, method)(id2label)
+                else:
+                    getattr(subscriber, method)(**{keyword: id2label})
+
+    def subscribe(self, observer, component):
+        """
+        Adds component to observer behind an Id2LabelSubscriber.
+
+        :return: The Id2LabelSubscriber.
+        """
+        subscriber = Id2LabelSubscriber(self, component)
+        self.subscribers.append(subscriber)
+        observer.add_observer(subscriber)
+        return subscriber
+
+    def clear(self):
+        """Forgets the subscribers of a discarded task GUI; held-back notifications are dropped."""
+        self.subscribers = []
+
+    @contextmanager
+    def batch(self):
+        """
+        Holds back the label-map notifications made inside the block and delivers them when the outermost
+        batch ends, also when the block raises.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.flush()
+
+    def flush_pending(self):
+        if any(subscriber.has_pending for subscriber in self.subscribers):
+            self.flush()
+
+    def flush(self):
+        with span("id2label_flush", "gui", task=self.task_name):
+            for subscriber in list(self.subscribers):
+                delivered, skipped = subscriber.flush()
+                self.stats["delivered"] += delivered
+                self.stats["skipped"] += skipped
+        self.stats["flushes"] += 1
@@ -0,0 +1,213 @@
+import io
+import os
+import hashlib
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def resolve_model_transform(model):
+    """
+    Returns (transform, input size) for model, where transform maps an RGB PIL image to the (3, H, W) tensor
+    the model expects. timm models use the eval transform of their pretrained config (resize, center crop,
+    interpolation, mean and std); transformers models use the image processor saved with the checkpoint.
+    """
+    if hasattr(model, "pretrained_cfg") or hasattr(model, "default_cfg"):
+        from timm.data import create_transform, resolve_data_config
+
+        data_config = resolve_data_config({}, model=model)
+        return create_transform(**data_config, is_training=False), tuple(data_config["input_size"][1:])
+    if getattr(model, "name_or_path", None):
+        from transformers import AutoImageProcessor
+
+        processor = AutoImageProcessor.from_pretrained(model.name_or_path)
+        size = getattr(processor, "crop_size", None) or getattr(processor, "size", None) or {}
+        edge = max(size.values()) if isinstance(size, dict) and size else 224
+        return (lambda image: processor(images=image, return_tensors="pt")["pixel_values"][0]), (edge, edge)
+    raise ValueError(f"Cannot resolve the preprocessing of a {type(model).__name__} model; "
+                     f"pass size, mean and std to batch_tensors instead")
+
+
+class ImagePipeline:
+    """
+    ImagePipeline Class Description:
+
+    Decoding, thumbnailing and batching of images for IMGgui and OBJgui, off the GUI thread.
+
+    - Decoding runs on a thread pool (Pillow releases the GIL while decoding).
+    - Thumbnails are stored in a content-hashed disk cache ($APPDATA/Gantrithor/data/thumbnails), so the
+      same JPEG is never decoded twice for display, even across launches or when it is copied elsewhere.
+      Content hashes are remembered per (path, size, mtime) so unchanged files are not re-read to hash them.
+    - prefetch() decodes the next N images in annotation order ahead of the user.
+    - batch_tensors() returns a model-ready (N, 3, H, W) tensor, preprocessed the way the loaded model was
+      trained (timm's data config, or the Hugging Face image processor), with JPEGs decoded at reduced scale
+      through Pillow's draft mode.
+
+    Attributes:
+    - cache_dir (str): Folder holding the cached thumbnails.
+    - executor (ThreadPoolExecutor): Pool used for decoding.
+    - hits, misses (int): Thumbnail disk cache counters.
+
+    Methods:
+    - content_hash(): Returns the content hash of an image file or bytes.
+    - thumbnail(): Returns a thumbnail from the disk cache, decoding and storing it on a miss.
+    - thumbnail_from_value(): Same for dataset cells ({"path", "bytes"}, paths or bytes).
+    - submit_thumbnail(): Decodes a thumbnail on the pool and returns the future.
+    - prefetch(): Queues thumbnails for the next images in annotation order.
+    - load_for_model(): Decodes an image at reduced scale for a model input of a given size.
+    - model_transform(): Returns the eval preprocessing of a timm or transformers model.
+    - batch_tensors(): Decodes and preprocesses a batch into a model-ready tensor.
+    - shutdown(): Stops the pool.
+    """
+
+    IMAGENET_MEAN = (0.485, 0.456, 0.406)
+    IMAGENET_STD = (0.229, 0.224, 0.225)
+
+    def __init__(self, cache_dir, workers=None, thumbnail_size=(256, 256), max_prefetch=64):
+        self.cache_dir = cache_dir
+        self.thumbnail_size = tuple(thumbnail_size)
+        self.max_prefetch = max_prefetch
+        self.executor = ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 2),
+                                           thread_name_prefix="ImagePipeline")
+        self.hits = 0
+        self.misses = 0
+        self._hashes = {}
+        self._prefetched = OrderedDict()
+        self._transforms = weakref.WeakKeyDictionary()  # model -> (transform, draft size)
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # Hashing and the disk cache
+
+    def content_hash(self, source):
+        if isinstance(source, (bytes, bytearray)):
+            return hashlib.blake2b(source, digest_size=16).hexdigest()
+        stat = os.stat(source)
+        file_key = (os.path.abspath(source), stat.st_size, stat.st_mtime)
+        with self._lock:
+            digest = self._hashes.get(file_key)
+        if digest is None:
+            hasher = hashlib.blake2b(digest_size=16)
+            with open(source, "rb") as image_file:
+                for block in iter(lambda: image_file.read(1024 * 1024), b""):
+                    hasher.update(block)
+            digest = hasher.hexdigest()
+            with self._lock:
+                self._hashes[file_key] = digest
+        return digest
+
+    def cache_path(self, digest, size):
+        # Two-level fan-out keeps folders small for large datasets
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}_{size[0]}x{size[1]}.jpg")
+
+    @staticmethod
+    def open_image(source):
+        from PIL import Image
+
+        return Image.open(io.BytesIO(source)) if isinstance(source, (bytes, bytearray)) else Image.open(source)
+
+    def thumbnail(self, source, size=None):
+        """
+        Returns an RGB PIL thumbnail no larger than size for a path or image bytes.
+        """
+        from PIL import Image
+
+        size = tuple(size or self.thumbnail_size)
+        digest = self.content_hash(source)
+        path = self.cache_path(digest, size)
+        if os.path.exists(path):
+            with self._lock:
+                self.hits += 1
+            with Image.open(path) as cached:
+                return cached.convert("RGB")
+
+        with self._lock:
+            self.misses += 1
+        with self.open_image(source) as image:
+            image.draft("RGB", size)  # JPEGs decode at 1/2, 1/4 or 1/8 scale when that is large enough
+            image = image.convert("RGB")
+        image.thumbnail(size)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            image.save(temporary_path, "JPEG", quality=90)
+            os.replace(temporary_path, path)
+        except OSError as e:
+            logging.warning("ImagePipeline: could not cache thumbnail %s: %s", path, str(e))
+        return image
+
+    def thumbnail_from_value(self, value, size=None):
+        if isinstance(value, dict):
+            value = value.get("bytes") or value.get("path")
+        return self.thumbnail(value, size)
+
+    def submit_thumbnail(self, source, size=None):
+        return self.executor.submit(self.thumbnail, source, size)
+
+    def prefetch(self, sources, size=None):
+        """
+        Starts decoding thumbnails for the next images in annotation order. Only the most recent
+        max_prefetch requests are tracked; results land in the disk cache either way.
+        """
+        with self._lock:
+            for source in sources:
+                key = (source if isinstance(source, str) else id(source), tuple(size or self.thumbnail_size))
+                if key in self._prefetched:
+                    continue
+                self._prefetched[key] = self.executor.submit(self.thumbnail, source, size)
+                while len(self._prefetched) > self.max_prefetch:
+                    _, future = self._prefetched.popitem(last=False)
+                    future.cancel()
+
+    # Model input
+
+    @staticmethod
+    def load_for_model(source, size):
+        with ImagePipeline.open_image(source) as image:
+            # Twice the model input, so the resize and crop below still work from a full-detail image
+            image.draft("RGB", (size[0] * 2, size[1] * 2))
+            return image.convert("RGB")
+
+    def model_transform(self, model):
+        """
+        Returns resolve_model_transform(model), resolved once per model.
+        """
+        with self._lock:
+            resolved = self._transforms.get(model)
+        if resolved is not None:
+            return resolved
+        resolved = resolve_model_transform(model)
+        with self._lock:
+            self._transforms[model] = resolved
+        return resolved
+
+    def batch_tensors(self, sources, size=(224, 224), mean=IMAGENET_MEAN, std=IMAGENET_STD, model=None):
+        """
+        Decodes and preprocesses images in parallel and returns a float tensor of shape (N, 3, H, W).
+
+        With model, the images are preprocessed exactly as model_transform(model) describes, which is what
+        predictions should use. Without it they are squashed to size and normalized with mean and std, for
+        models without a timm config or image processor.
+        """
+        import numpy as np
+        import torch
+
+        if model is not None:
+            transform, input_size = self.model_transform(model)
+            return torch.stack(list(self.executor.map(
+                lambda source: transform(self.load_for_model(source, input_size)), sources)))
+
+        size = tuple(size)
+        images = list(self.executor.map(lambda source: self.load_for_model(source, size).resize(size), sources))
+        batch = np.stack([np.asarray(image, dtype=np.float32) for image in images]) / 255.0
+        batch = (batch - np.asarray(mean, dtype=np.float32)) / np.asarray(std, dtype=np.float32)
+        return torch.from_numpy(np.ascontiguousarray(batch.transpose(0, 3, 1, 2)))
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "prefetching": len(self._prefetched)}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
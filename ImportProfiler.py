@@ -0,0 +1,143 @@
+import sys
+import time
+import logging
+import importlib
+from importlib.abc import MetaPathFinder
+
+
+def import_class(module_name, class_name):
+    """
+    Imports module_name on demand and returns class_name from it.
+    Main uses this for the task GUIs and adapters so torch, transformers, timm, spacy, datasets
+    and umap are only imported when the task that needs them is first opened.
+    """
+    module = importlib.import_module(module_name)
+    return getattr(module, class_name)
+
+
+class ImportProfiler(MetaPathFinder):
+    """
+    ImportProfiler Class Description:
+
+    An in-process equivalent of `python -X importtime` that also works inside the PyInstaller build.
+    It sits at the front of sys.meta_path, wraps the exec_module of every loader it sees and records
+    the self and cumulative time spent executing each module.
+
+    Attributes:
+    - records (dict): Maps module name to [self_seconds, cumulative_seconds].
+    - import_order (list): Module names in the order they finished importing.
+    - heavy_modules (tuple): Top-level packages that must not be imported before the main window is up.
+
+    Methods:
+    - start(), stop(): Install or remove the profiler from sys.meta_path.
+    - ranked(): Returns the records sorted by cumulative time.
+    - loaded_heavy_modules(): Lists the heavy packages already present in sys.modules.
+    - write_report(): Writes the ranked import-cost report to a text file.
+
+    Usage:
+    profiler = ImportProfiler()
+    profiler.start()
+    ... imports ...
+    profiler.write_report("import_profile.txt")
+    """
+
+    heavy_modules = ("torch", "transformers", "timm", "spacy", "datasets", "umap", "span_marker",
+                     "sklearn", "pandas", "dash")
+
+    def __init__(self):
+        self.records = {}
+        self.import_order = []
+        self._stack = []
+        self._wrapped_loaders = set()
+        self._finding = set()
+        self.start_time = None
+
+    def start(self):
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+        self.start_time = time.perf_counter()
+
+    def stop(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        # Ask the remaining finders for the spec, then wrap its loader for timing
+        if fullname in self._finding:
+            return None
+        self._finding.add(fullname)
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    self._wrap_loader(spec.loader)
+                    return spec
+            return None
+        finally:
+            self._finding.discard(fullname)
+
+    def _wrap_loader(self, loader):
+        # Builtin and frozen importers are classes shared by every module they load; they are cheap, skip them
+        if loader is None or isinstance(loader, type) or id(loader) in self._wrapped_loaders:
+            return
+        exec_module = getattr(loader, "exec_module", None)
+        if exec_module is None:
+            return
+        self._wrapped_loaders.add(id(loader))
+
+        def timed_exec_module(module):
+            self._stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                cumulative = time.perf_counter() - start
+                children = self._stack.pop()
+                if self._stack:
+                    self._stack[-1] += cumulative
+                self.records[module.__name__] = [cumulative - children, cumulative]
+                self.import_order.append(module.__name__)
+
+        try:
+            loader.exec_module = timed_exec_module
+        except (AttributeError, TypeError):
+            self._wrapped_loaders.discard(id(loader))
+
+    def ranked(self, key="cumulative"):
+        index = 1 if key == "cumulative" else 0
+        return sorted(self.records.items(), key=lambda item: item[1][index], reverse=True)
+
+    def loaded_heavy_modules(self):
+        return [name for name in self.heavy_modules if name in sys.modules]
+
+    def write_report(self, report_path, label="startup", limit=None):
+        """
+        Writes the ranked import-cost report. Heavy packages imported before the report was taken are
+        listed at the top so a new top-level import shows up as a regression straight away.
+
+        :return: The list of heavy packages that were already imported.
+        """
+        heavy = self.loaded_heavy_modules()
+        elapsed = time.perf_counter() - self.start_time if self.start_time else 0.0
+        total = sum(self_time for self_time, _ in self.records.values())
+        ranked = self.ranked()
+        if limit is not None:
+            ranked = ranked[:limit]
+
+        with open(report_path, "w", encoding="utf-8") as report_file:
+            report_file.write(f"Import profile ({label}): {len(self.records)} modules, "
+                              f"{total:.3f} s importing, {elapsed:.3f} s since profiler start\n")
+            if heavy:
+                report_file.write("WARNING: heavy packages imported: " + ", ".join(heavy) + "\n")
+            else:
+                report_file.write("No heavy packages imported.\n")
+            report_file.write("\n  self [us] | cumulative | imported package\n")
+            for name, (self_time, cumulative) in ranked:
+                report_file.write(f"{int(self_time * 1e6):>11} | {int(cumulative * 1e6):>10} | {name}\n")
+
+        if heavy:
+            logging.warning("Import profile (%s): heavy packages imported: %s", label, ", ".join(heavy))
+        logging.info("Import profile (%s) written to %s", label, report_path)
+        return heavy
@@ -0,0 +1,213 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import logging
+
+from FileIdentity import weight_files
+
+BACKENDS = ("fp32", "int8", "torchscript", "int8+torchscript", "compile")
+
+
+def checkpoint_fingerprint(model_path):
+    """
+    Identifies the weights an optimized artifact was built from: name, size and mtime of the weight files
+    of a local checkpoint, or the id of a Hugging Face Hub model.
+    """
+    import torch
+
+    digest = hashlib.sha256(torch.__version__.encode("utf-8"))
+    if os.path.isdir(model_path):
+        for file_name, size, mtime_ns in weight_files(model_path):
+            digest.update(f"{file_name}:{size}:{mtime_ns}".encode("utf-8"))
+    else:
+        digest.update(model_path.encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+def backend_cache_dir(model_path, backend, fingerprint, cache_root=None):
+    """
+    Artifacts are cached under cache_root ($APPDATA/Gantrithor/data/optimized_models by default), in
+    <model path>/<fingerprint>/<backend>, never inside the checkpoint: writing there would change the
+    checkpoint folder and invalidate everything keyed on it. Folders of earlier weights of the same model
+    path are removed when a new fingerprint is first used.
+    """
+    cache_root = cache_root or os.path.join(os.environ.get("APPDATA", os.path.expanduser("~")),
+                                            "Gantrithor", "data", "optimized_models")
+    model_root = os.path.join(cache_root, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_path.strip("/\\")))
+    path = os.path.join(model_root, fingerprint, backend.replace("+", "_"))
+    if not os.path.isdir(path) and os.path.isdir(model_root):
+        for entry in os.scandir(model_root):
+            if entry.is_dir() and entry.name != fingerprint:
+                shutil.rmtree(entry.path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def read_report(cache_dir):
+    path = os.path.join(cache_dir, "report.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as report_file:
+        return json.load(report_file)
+
+
+def write_report(cache_dir, report):
+    path = os.path.join(cache_dir, "report.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+class _LogitsModule:
+    """Builds the torch.nn.Module that is traced: positional tensors in, logits out."""
+
+    @staticmethod
+    def create(model, input_names):
+        import torch
+
+        class LogitsModule(torch.nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.model = model
+
+            def forward(self, *tensors):
+                outputs = self.model(**dict(zip(input_names, tensors)))
+                return getattr(outputs, "logits", outputs)
+
+        return LogitsModule().eval()
+
+
+def build_variant(runner, backend, cache_dir, example_prepared, fingerprint):
+    """
+    Applies backend to runner in place: runner.model becomes the quantized or compiled model, and for
+    TorchScript backends runner.scripted_model is set to the traced module (loaded from cache_dir when
+    it was traced from the same checkpoint before).
+    """
+    import torch
+
+    model = runner.model
+    if backend.startswith("int8"):
+        # Dynamic quantization of the Linear layers: weights in int8, activations quantized per batch
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        runner.model = model
+    if backend.endswith("torchscript"):
+        artifact_path = os.path.join(cache_dir, "model.pt")
+        report = read_report(cache_dir)
+        if os.path.exists(artifact_path) and report is not None and report.get("fingerprint") == fingerprint:
+            runner.scripted_model = torch.jit.load(artifact_path)
+        else:
+            input_names, tensors = runner.trace_inputs(example_prepared)
+            with torch.no_grad():
+                scripted = torch.jit.trace(_LogitsModule.create(model, input_names), tensors, strict=False,
+                                           check_trace=False)
+            runner.scripted_model = torch.jit.freeze(scripted)
+            torch.jit.save(runner.scripted_model, artifact_path)
+    if backend == "compile":
+        import torch._inductor.config
+
+        # Compiled kernels are kept with the other artifacts, so later launches skip most of the compilation
+        os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.join(cache_dir, "inductor"))
+        torch._inductor.config.fx_graph_cache = True
+        runner.model = torch.compile(model, dynamic=True)
+
+
+def timed_predictions(runner, prepared_batches):
+    results = []
+    runner.predict(prepared_batches[0])  # Warm-up (first-call allocation, lazy compilation)
+    start_time = time.perf_counter()
+    for prepared in prepared_batches:
+        results.extend(runner.predict(prepared))
+    return results, time.perf_counter() - start_time
+
+
+def apply_backend(runner, backend, check_records=None, min_agreement=0.99, min_speedup=1.0, cache_root=None,
+                  check_batch_size=16):
+    """
+    Switches a loaded task runner to an optimized backend after checking it against the fp32 model.
+
+    On the first use for a checkpoint, check_records (a held-out slice of the data) are predicted with the
+    fp32 model and with the optimized one. The backend is accepted when the predictions agree on at least
+    min_agreement of the records (same label, same entities, same detected labels) and it is at least
+    min_speedup times faster. The outcome is stored in report.json in the backend's cache folder, so later runs,
+    including inference worker processes, reuse the decision without checking again. A rejected backend
+    leaves the runner on fp32.
+
+    :return: The report: backend, accepted, agreement, speedup and timings.
+    """
+    if backend == "fp32":
+        return {"backend": "fp32", "accepted": True}
+    if backend not in runner.supported_backends:
+        logging.warning("Backend %s is not available for %s models, using fp32", backend, runner.task_name)
+        return {"backend": backend, "accepted": False, "reason": "unsupported"}
+
+    fingerprint = checkpoint_fingerprint(runner.model_path)
+    cache_dir = backend_cache_dir(runner.model_path, backend, fingerprint, cache_root)
+    report = read_report(cache_dir)
+    artifact_missing = backend.endswith("torchscript") and not os.path.exists(os.path.join(cache_dir, "model.pt"))
+    report_usable = report is not None and report.get("fingerprint") == fingerprint
+    if report_usable and not (report["accepted"] and artifact_missing):
+        if report["accepted"]:
+            build_variant(runner, backend, cache_dir, None, fingerprint)
+            logging.info("Using cached %s backend for %s (agreement %.4f, speedup %.2fx)", backend,
+                         runner.model_path, report["agreement"], report["speedup"])
+        else:
+            logging.info("%s backend was rejected for %s earlier (%s), using fp32", backend, runner.model_path,
+                         report.get("reason"))
+        return report
+    if not check_records:
+        logging.warning("No records to check the %s backend of %s against fp32, using fp32", backend,
+                        runner.model_path)
+        return {"backend": backend, "accepted": False, "reason": "not checked"}
+
+    prepared_batches = [runner.prepare(check_records[start:start + check_batch_size])
+                        for start in range(0, len(check_records), check_batch_size)]
+    reference_model = runner.model
+    reference, reference_seconds = timed_predictions(runner, prepared_batches)
+    try:
+        build_variant(runner, backend, cache_dir, prepared_batches[0], fingerprint)
+        candidate, candidate_seconds = timed_predictions(runner, prepared_batches)
+    except Exception as e:
+        logging.warning("Building the %s backend failed: %s", backend, str(e), exc_info=True)
+        candidate, candidate_seconds, error = None, None, str(e)
+    else:
+        error = None
+
+    if candidate is not None:
+        matches = sum(runner.agreement_key(a) == runner.agreement_key(b) for a, b in zip(reference, candidate))
+        agreement = matches / len(reference)
+        speedup = reference_seconds / candidate_seconds if candidate_seconds else 0.0
+    else:
+        agreement, speedup = 0.0, 0.0
+    accepted = error is None and agreement >= min_agreement and speedup >= min_speedup
+    if error is not None:
+        reason = f"failed: {error}"
+    elif agreement < min_agreement:
+        reason = f"agreement {agreement:.4f} below {min_agreement}"
+    elif speedup < min_speedup:
+        reason = f"speedup {speedup:.2f}x below {min_speedup}x"
+    else:
+        reason = None
+    report = {
+        "backend": backend,
+        "fingerprint": fingerprint,
+        "accepted": accepted,
+        "reason": reason,
+        "samples": len(reference),
+        "agreement": round(agreement, 6),
+        "reference_seconds": round(reference_seconds, 4),
+        "candidate_seconds": round(candidate_seconds, 4) if candidate_seconds else None,
+        "speedup": round(speedup, 3),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    write_report(cache_dir, report)
+    if not accepted:
+        runner.model = reference_model
+        runner.scripted_model = None
+        logging.warning("Rejected %s backend for %s: %s", backend, runner.model_path, reason)
+    else:
+        logging.info("Accepted %s backend for %s: agreement %.4f, speedup %.2fx", backend, runner.model_path,
+                     agreement, speedup)
+    return report
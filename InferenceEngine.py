@@ -0,0 +1,190 @@
+import os
+import sys
+import time
+import logging
+import threading
+from collections import deque
+from multiprocessing.context import SpawnContext, SpawnProcess
+from concurrent.futures import ProcessPoolExecutor
+
+from PerformanceMonitor import MONITOR
+
+# The model runner of a worker process, loaded once by _initialize_worker
+_worker_runner = None
+
+
+def _initialize_worker(task, model_path, threads_per_worker, options):
+    global _worker_runner
+    # Set before torch is imported so OpenMP/MKL pools are sized for one worker, not the whole machine
+    os.environ["OMP_NUM_THREADS"] = str(threads_per_worker)
+    os.environ["MKL_NUM_THREADS"] = str(threads_per_worker)
+    import torch
+
+    torch.set_num_threads(threads_per_worker)
+    from HeadlessInference import TASK_RUNNERS, prepare_backend
+    from ResourceCache import ResourceCache
+
+    _worker_runner = TASK_RUNNERS[task](model_path, ResourceCache(ram_budget_mb=0), options)
+    # Workers only use a backend already accepted by check_backend() or the CLI; they never check it themselves
+    prepare_backend(_worker_runner, options, check=False)
+
+
+def _worker_ready():
+    return os.getpid()
+
+
+def _predict_batch(batch):
+    return _worker_runner.predict(_worker_runner.prepare(batch))
+
+
+_spawn_lock = threading.Lock()
+
+
+class _WorkerProcess(SpawnProcess):
+    """
+    A spawned worker whose child runs this module as its main module. A spawned child re-imports the
+    parent's __main__ first (as __mp_main__); for the GUI that is Main.py, which would import PyQt6, the
+    GANTRITHOR package and the services in every worker. Frozen builds do not re-import it, they run the
+    executable, whose entry point calls freeze_support() before those imports.
+    """
+
+    @staticmethod
+    def _Popen(process_obj):
+        with _spawn_lock:
+            main_module = sys.modules["__main__"]
+            sys.modules["__main__"] = sys.modules[__name__]
+            try:
+                return SpawnProcess._Popen(process_obj)
+            finally:
+                sys.modules["__main__"] = main_module
+
+
+class _WorkerContext(SpawnContext):
+    Process = _WorkerProcess
+
+
+class ParallelInferenceEngine:
+    """
+    ParallelInferenceEngine Class Description:
+
+    Data-parallel CPU inference for auto-labelling large NER/TEXT/IMG/OBJ datasets. Batches are sharded
+    across a pool of worker processes; each worker loads the model once (through the same task runners as
+    the headless CLI) and runs with threads_per_worker torch threads, so workers x threads_per_worker can be
+    matched to the core count. timm checkpoints stored as model.safetensors are memory-mapped
+    (TaskLoaders.load_timm_model through ResourceCache.load_safetensors), so the workers share those weights
+    through the OS page cache. transformers and SpanMarker models are loaded with from_pretrained, and each
+    worker holds its own copy. Workers do not import Main or PyQt6 (see _WorkerProcess).
+
+    Results are yielded in input order. At most max_in_flight batches are submitted ahead of the consumer,
+    which keeps memory bounded (backpressure) when the results are written slower than they are produced.
+
+    Attributes:
+    - task (str): One of "ner", "text", "img", "obj".
+    - model_path (str): Model folder or Hugging Face id.
+    - workers (int): Number of worker processes.
+    - threads_per_worker (int): torch intra-op threads per worker.
+    - max_in_flight (int): Batches submitted but not yet consumed.
+
+    Methods:
+    - start(): Creates the process pool.
+    - wait_until_ready(): Blocks until the workers have loaded the model and returns the seconds it took.
+    - predict_batches(): Yields (batch, results) in order for an iterable of batches.
+    - predict(): Yields one result per record for an iterable of records.
+    - shutdown(): Stops the workers.
+
+    Usage:
+    with ParallelInferenceEngine("text", model_path, workers=8, threads_per_worker=4) as engine:
+        for result in engine.predict(records):
+            ...
+    """
+
+    def __init__(self, task, model_path, workers=None, threads_per_worker=1, max_in_flight=None, options=None):
+        from HeadlessInference import default_options
+
+        self.task = task
+        self.model_path = model_path
+        self.threads_per_worker = max(1, threads_per_worker)
+        self.workers = workers or max(1, (os.cpu_count() or 1) // self.threads_per_worker)
+        self.max_in_flight = max_in_flight or self.workers * 2
+        self.options = options if options is not None else default_options(task, model_path)
+        self._executor = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.shutdown(cancel_pending=exc_type is not None)
+
+    def start(self):
+        if self._executor is not None:
+            return
+        # spawn matches Windows and keeps Qt and torch state of the parent out of the workers
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=_WorkerContext(),
+            initializer=_initialize_worker,
+            initargs=(self.task, self.model_path, self.threads_per_worker, self.options),
+        )
+        logging.info("ParallelInferenceEngine: %d workers x %d threads for %s", self.workers,
+                     self.threads_per_worker, self.model_path)
+
+    def check_backend(self, records, resource_cache=None):
+        """
+        Checks options.backend against fp32 on records (a held-out slice) in this process and stores the
+        decision next to the checkpoint for the workers. With the GUI's resource_cache the already loaded
+        fp32 model is reused. Call it before start(), e.g. from a background job.
+
+        :return: The backend report (accepted, agreement, speedup).
+        """
+        from HeadlessInference import TASK_RUNNERS
+        from InferenceBackend import apply_backend
+        from ResourceCache import ResourceCache
+
+        runner = TASK_RUNNERS[self.task](self.model_path, resource_cache or ResourceCache(ram_budget_mb=0),
+                                         self.options)
+        return apply_backend(runner, self.options.backend, list(records), min_agreement=self.options.min_agreement)
+
+    def wait_until_ready(self):
+        self.start()
+        start_time = time.perf_counter()
+        futures = [self._executor.submit(_worker_ready) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+        return time.perf_counter() - start_time
+
+    def predict_batches(self, batches):
+        self.start()
+        in_flight = deque()
+        for batch in batches:
+            in_flight.append((batch, time.perf_counter_ns(), self._executor.submit(_predict_batch, batch)))
+            if len(in_flight) >= self.max_in_flight:
+                yield self._collect(*in_flight.popleft())
+        while in_flight:
+            yield self._collect(*in_flight.popleft())
+
+    def _collect(self, batch, submitted_ns, future):
+        results = future.result()
+        # Spans run from submission to result, so they include the time a batch waited for a worker
+        MONITOR.record("predict_batch", "inference", submitted_ns, time.perf_counter_ns() - submitted_ns,
+                       {"size": len(batch), "workers": self.workers})
+        return batch, results
+
+    def predict(self, records, batch_size=32):
+        def chunks():
+            batch = []
+            for record in records:
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        for _, results in self.predict_batches(chunks()):
+            yield from results
+
+    def shutdown(self, cancel_pending=False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=cancel_pending)
+            self._executor = None
@@ -1,5 +1,5 @@
 import subprocess
-import shutil
+import sys
 import os
 
 # Paths
@@ -8,11 +8,12 @@ dist_source_path = "C:\\Users\\doren\\PycharmProjects\\GANTRITHOR_FINAL_2024\\di
 dist_destination_path = "C:\\Users\\doren\\OneDrive\\Desktop\\GantrithorInstaller"
 nsis_script_path = "C:\\Users\\doren\\OneDrive\\Desktop\\GantrithorInstaller\\script_installer_prep_nsis.py"
 
-# Run PyInstaller with the spec file
-subprocess.run(["pyinstaller", spec_file_path], check=True)
+# Build profile: "gpu" (default) or "cpu", e.g. python Installer_Script.py cpu
+build_profile = sys.argv[1] if len(sys.argv) > 1 else "gpu"
 
-# Copy the dist directory to the desired location
-shutil.copytree(dist_source_path, dist_destination_path, dirs_exist_ok=True)
+# Run PyInstaller with the spec file
+subprocess.run(["pyinstaller", spec_file_path], check=True, env=dict(os.environ, GANTRITHOR_BUILD_PROFILE=build_profile))
 
-# Run the NSIS preparation script
-subprocess.run(["python", nsis_script_path], check=True)
+# Stage the build straight from dist: the preparation script links or copies only the files that changed
+subprocess.run(["python", nsis_script_path, "--base", dist_destination_path,
+                "--dist", os.path.join(dist_source_path, "Main")], check=True)
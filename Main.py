@@ -2,31 +2,63 @@
 import os
 import re
 import sys
+import time
 import logging
-import traceback
+import multiprocessing
+
+
+def run_headless_command(argv):
+    """
+    Runs the commands that need no GUI and returns their exit code, or None for a normal launch. Called before
+    the imports below, so none of them pays for PyQt6, the GANTRITHOR package or the Main services.
+    """
+    if len(argv) > 1 and argv[1] == "infer":
+        # Headless batch inference: no QApplication, splash screen or task GUIs
+        from HeadlessInference import main as headless_main
+        return headless_main(argv[1:])
+    if len(argv) > 1 and argv[1] == "train":
+        # Training worker started by the TrainingScheduler
+        from TrainingWorker import main as training_main
+        return training_main(argv[1:])
+    if len(argv) > 1 and argv[1] == "update":
+        # Delta patch installer: Gantrithor.exe update <patch folder> updates the installation it runs from
+        from DeltaUpdate import main as update_main
+        install_dir = os.path.dirname(sys.executable) if getattr(sys, "frozen", False) else os.getcwd()
+        return update_main(["apply", install_dir] + argv[2:])
+    return None
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()  # Inference worker processes re-run this entry point in the frozen build
+    HEADLESS_EXIT_CODE = run_headless_command(sys.argv)
+    if HEADLESS_EXIT_CODE is not None:
+        sys.exit(HEADLESS_EXIT_CODE)
+
+from ImportProfiler import ImportProfiler, import_class
+
+# Started before every other project import (several of them import PyQt6) so the report covers the whole start-up
+IMPORT_PROFILER = None
+if "--profile-imports" in sys.argv:
+    IMPORT_PROFILER = ImportProfiler()
+    IMPORT_PROFILER.start()
 
-import requests
 from PyQt6.QtNetwork import QNetworkProxy
 
-from PyQt6.QtCore import pyqtSignal, QObject, Qt
-from PyQt6.QtGui import QPixmap
+from PyQt6.QtCore import pyqtSignal, QObject, Qt, QTimer
+from PyQt6.QtGui import QKeySequence, QPixmap, QShortcut
 from PyQt6.QtWidgets import QApplication, QDialog, QVBoxLayout, QLabel, QPushButton, QSplashScreen
 from PyQt6.QtWidgets import QMessageBox
 
 from GANTRITHOR.MIXINS.PathsAndDirectoriesMixin import PathsAndDirectoriesMixin
 from GANTRITHOR.FACTORY_GUI.FactoryGuiSkeleton import FactoryGuiSkeleton
-
-from GANTRITHOR.IMG_ADAPTER.IMGId2LabelObserver import IMGId2LabelObserver
-from GANTRITHOR.IMG_GUI.IMGgui import IMGgui
-from GANTRITHOR.NER_ADAPTER.id2labelObserver import Id2LabelObserver
-from GANTRITHOR.NER_GUI.NERgui import NERgui
-from GANTRITHOR.OBJ_ADAPTER.OBJId2LabelObserver import OBJId2LabelObserver
-from GANTRITHOR.OBJ_GUI.OBJ_GUI import OBJgui
-from GANTRITHOR.SETTINGS.SettingsGui import SettingsGui
-from GANTRITHOR.TEXT_ADAPTER.TEXTid2labelObserver import TEXTId2LabelObserver
-from GANTRITHOR.TEXT_GUI.TEXTgui import TEXTgui
 from GANTRITHOR.MIXINS.LicenseManager import LicenseManager
 
+# The task GUIs, adapters and settings pull in torch, transformers, timm, spacy, datasets and umap.
+# They are imported through import_class when first needed, and Main's own services (background jobs, training
+# scheduler, session snapshot, label notifiers, performance spans) by local imports where they are first used.
+# Keep new imports out of this block.
+SETTINGS_GUI_CLASS = ("GANTRITHOR.SETTINGS.SettingsGui", "SettingsGui")
+
 
 class Main(QObject, PathsAndDirectoriesMixin):
     """
@@ -45,6 +77,7 @@ class Main(QObject, PathsAndDirectoriesMixin):
     - settings_gui (SettingsGui): A GUI for application settings.
     - settings_button, activate_button: Buttons for accessing settings and activating the product.
     - directory_labels (dict): Stores directory path labels for display.
+    - background_jobs, training_scheduler, saved_session: Services created (or read) on first use.
 
     Methods:
     - __init__(): Initializes the class attributes, sets up GUI components, connects signals and slots.
@@ -52,17 +85,23 @@ class Main(QObject, PathsAndDirectoriesMixin):
     - create_main_window(): Creates and configures the main window of the application.
     - add_directory_path_gui(): Adds a GUI component to display directory paths.
     - on_model_loaded(), on_dataset_loaded(): Callbacks for model and dataset loading events.
+    - on_job_progress(), on_job_finished(), on_job_failed(), on_job_cancelled(): Callbacks for background load jobs.
     - format_directory_path(): Formats directory paths for display.
     - open_settings(): Displays the settings GUI.
     - switch_gui(): Switches between NER and TEXT GUIs based on user interaction.
+    - get_task_gui(), build_task_gui(): Build a task GUI from TASK_REGISTRY the first time it is needed.
+    - prewarm_next_task(): Imports the modules of the next likely tab on the job pool (GANTRITHOR_PREWARM=1).
+    - report_startup_timing(): Logs the time until the first tab is shown (compare against a run with --eager-gui).
     - open_activation_dialog(): Opens a dialog for license activation.
     - activate_license(): Activates the license based on the user-provided key.
     - show_message_dialog(), show_popup_message(): Utility methods to show message dialogs.
     - add_to_observer(), add_to_observer_text(): Adds GUI components to respective observers for updates.
-    - reset_pipeline(): Resets the application pipeline, clearing and reinitializing GUI components.
+    - reset_task_pipeline(): Resets a task pipeline, discarding and rebuilding its GUI component.
     - clearBottomLayout(), clearLayout(): Utility methods to clear layouts.
     - clear_central_layout(): Clears the central layout of the main window.
     - delete_database(): Deletes the SQL database file.
+    - save_session(), restore_task_session(): Save the session on quit and restore it per task on the next launch.
+    - restore_view_states(): Restores a task's table positions once its saved dataset is loaded again.
     - run(): Shows the main window and starts the application.
 
     The Main class is designed to provide a seamless user experience,
@@ -83,7 +122,46 @@ class Main(QObject, PathsAndDirectoriesMixin):
     reset_pipeline_signal_img = pyqtSignal()
     reset_pipeline_signal_obj = pyqtSignal()
 
-    def __init__(self):
+    # Each task GUI is created the first time switch_gui asks for it
+    TASK_REGISTRY = {
+        "ner": {
+            "gui_class": ("GANTRITHOR.NER_GUI.NERgui", "NERgui"),
+            "observer_class": ("GANTRITHOR.NER_ADAPTER.id2labelObserver", "Id2LabelObserver"),
+            "reset_requested": "reset_pipeline_requested_ner",
+            "reset_signal": "reset_pipeline_signal",
+            "singleton": "ner_singleton",
+            "observer": "add_to_observer",
+        },
+        "text": {
+            "gui_class": ("GANTRITHOR.TEXT_GUI.TEXTgui", "TEXTgui"),
+            "observer_class": ("GANTRITHOR.TEXT_ADAPTER.TEXTid2labelObserver", "TEXTId2LabelObserver"),
+            "reset_requested": "reset_pipeline_requested_text",
+            "reset_signal": "reset_pipeline_signal_text",
+            "singleton": "text_singleton",
+            "observer": "add_to_observer_text",
+        },
+        "img": {
+            "gui_class": ("GANTRITHOR.IMG_GUI.IMGgui", "IMGgui"),
+            "observer_class": ("GANTRITHOR.IMG_ADAPTER.IMGId2LabelObserver", "IMGId2LabelObserver"),
+            "reset_requested": "reset_pipeline_requested_img",
+            "reset_signal": "reset_pipeline_signal_img",
+            "singleton": "img_singleton",
+            "observer": "add_to_observer_img",
+        },
+        "obj": {
+            "gui_class": ("GANTRITHOR.OBJ_GUI.OBJ_GUI", "OBJgui"),
+            "observer_class": ("GANTRITHOR.OBJ_ADAPTER.OBJId2LabelObserver", "OBJId2LabelObserver"),
+            "reset_requested": "reset_pipeline_requested",
+            "reset_signal": "reset_pipeline_signal_obj",
+            "singleton": "obj_singleton",
+            "observer": "add_to_observer_obj",
+        },
+    }
+    # The tab most likely to be opened next, whose modules are imported in the background once the window is up
+    PREWARM_ORDER = {"ner": "text", "text": "img", "img": "ner", "obj": None}
+    PREWARM_DELAY_MS = 1500
+
+    def __init__(self, eager_gui=False):
         super().__init__()
         self.version = "Free"
         self.initialize_paths_and_directories()
@@ -110,33 +188,39 @@ class Main(QObject, PathsAndDirectoriesMixin):
         self.img_button, _ = self.factory.create_control_button("IMAGE", width=100, height=24, font_size=12, toggle_option=True)
         # self.obj_button, _ = self.factory.create_control_button("OBJECT", width=100, height=24, font_size=12, toggle_option=True)
 
-        # Connect to slot
-        self.ner_gui = NERgui(self.factory)
-        self.ner_gui.reset_pipeline_requested_ner.connect(self.reset_pipeline_signal.emit)
+        self.task_buttons = {"ner": self.ner_button, "text": self.text_button, "img": self.img_button}
+        self.task_guis = {}  # Task GUIs are built on first use by get_task_gui
+        self.task_build_times = {}
+        # Prewarming imports torch and the next tab's modules while the user works, so it is opt-in
+        self.prewarm_enabled = os.environ.get("GANTRITHOR_PREWARM", "0") == "1"
+        self.prewarm_jobs = set()
+        self.prewarmed_tasks = set()
+        self.open_task_on_start = True  # run() opens the last active (or NER) tab once the window is up
         self.reset_pipeline_signal.connect(self.reset_pipeline_ner)
-        self.ner_button.setChecked(True)  # Mark the button as checked
-
-        self.text_gui = TEXTgui(self.factory)  # Assuming similar structure for TEXTgui
-        self.text_gui.reset_pipeline_requested_text.connect(self.reset_pipeline_signal_text.emit)
         self.reset_pipeline_signal_text.connect(self.reset_pipeline_text)
-        # self.text_gui.setup_logging()
-
-        self.img_gui = IMGgui(self.factory)
-        self.img_gui.reset_pipeline_requested_img.connect(self.reset_pipeline_signal_img.emit)
         self.reset_pipeline_signal_img.connect(self.reset_pipeline_img)
-
-        self.obj_gui = OBJgui(self.factory)
-        self.obj_gui.reset_pipeline_requested.connect(self.reset_pipeline_signal_obj.emit)
         self.reset_pipeline_signal_obj.connect(self.reset_pipeline_obj)
-
-        self.add_to_observer()  # Add NERgui to the observer
-        self.add_to_observer_text()
-        self.add_to_observer_img()
-        self.add_to_observer_obj()
-
-
-        self.central_layout.addWidget(self.ner_gui)
-        # self.central_layout.addWidget()
+        self.directory_labels = {}
+        self._background_jobs = None  # Created by the background_jobs property on first use
+        self._training_scheduler = None  # Created by the training_scheduler property on first use
+        self.id2label_notifiers = {}  # task name -> Id2LabelNotifier between the task's observer and its components
+        self.loaded_paths = {task_name: {"model": None, "dataset": None} for task_name in self.TASK_REGISTRY}
+        self.trace_on_exit = False  # --trace writes a Chrome trace of the session on quit
+        # The previous session is read on first use (saved_session) and restored per task when its GUI is first
+        # built; set GANTRITHOR_RESTORE_SESSION=0 to start fresh
+        self._session_snapshot = None
+        self._saved_session = None
+        self.pending_session_tasks = {}
+        self.pending_view_states = {}  # task name -> (dataset path, saved view states) until that dataset is loaded
+        self.active_task = None
+
+        self.eager_gui = eager_gui
+        if eager_gui:
+            # Previous start-up behaviour, kept so the timing report can compare both modes
+            for task_name in self.TASK_REGISTRY:
+                self.get_task_gui(task_name)
+
+        # The NER GUI is added by run() once the window is up, so its imports do not delay the first paint
 
         # Connect buttons to switch GUI
         self.ner_button.clicked.connect(lambda: self.switch_gui("ner"))
@@ -152,8 +236,7 @@ class Main(QObject, PathsAndDirectoriesMixin):
 
         self.factory.top_layout.addStretch(1)  # Add stretch after the buttons
 
-        self.settings_gui = SettingsGui(self.factory)
-        self.settings_gui.hide()
+        self.settings_gui = None  # Built the first time the settings button is clicked
 
         # Create the third button with an icon
         self.settings_icon_path = os.path.join(self.icons_path, "icon_settings")
@@ -179,17 +262,6 @@ class Main(QObject, PathsAndDirectoriesMixin):
 
         self.is_commercial_version()
 
-        self.directory_labels = {}
-
-        self.ner_gui.load_model_gui.load_model_signal.connect(self.on_model_loaded)
-        self.ner_gui.load_dataset_gui.load_dataset_signal.connect(self.on_dataset_loaded)
-        self.text_gui.load_model_gui.load_model_signal.connect(self.on_model_loaded)
-        self.text_gui.load_dataset_gui.load_dataset_signal.connect(self.on_dataset_loaded)
-        self.img_gui.load_model_gui.load_model_signal.connect(self.on_model_loaded)
-        self.img_gui.load_dataset_gui.load_dataset_signal.connect(self.on_dataset_loaded)
-        self.obj_gui.load_model_gui.load_model_signal.connect(self.on_model_loaded)
-        self.obj_gui.load_dataset_gui.load_dataset_signal.connect(self.on_dataset_loaded)
-
         # self.divide_zero_error = 5 / 0
         # Add the third button to the top_frame layout
         self.factory.top_layout.addWidget(self.settings_button)
@@ -201,10 +273,171 @@ class Main(QObject, PathsAndDirectoriesMixin):
         self.version_label.setText(f"Version: {self.version}")  # Update the version label text
         if license_status == "commercial":
             self.version_label.setStyleSheet("font-weight: bold; color: green;")
-        self.ner_gui.ner_singleton.license_status = self.license_status
-        self.text_gui.text_singleton.license_status = self.license_status
-        self.img_gui.img_singleton.license_status = self.license_status
-        self.obj_gui.obj_singleton.license_status = self.license_status
+        for task_name in self.task_guis:
+            self.apply_license_status(task_name)
+
+    def apply_license_status(self, task_name):
+        """
+        Passes the current license status to the singleton of a task GUI that has already been built.
+        """
+        if not hasattr(self, 'license_status'):
+            return
+        entry = self.TASK_REGISTRY[task_name]
+        singleton = getattr(self.task_guis[task_name], entry["singleton"])
+        singleton.license_status = self.license_status
+
+    @property
+    def ner_gui(self):
+        return self.get_task_gui("ner")
+
+    @property
+    def text_gui(self):
+        return self.get_task_gui("text")
+
+    @property
+    def img_gui(self):
+        return self.get_task_gui("img")
+
+    @property
+    def obj_gui(self):
+        return self.get_task_gui("obj")
+
+    @property
+    def background_jobs(self):
+        """
+        The job pool prewarm imports run on instead of the GUI thread, created on first use.
+        """
+        if self._background_jobs is None:
+            from BackgroundJobs import BackgroundJobManager
+
+            self._background_jobs = BackgroundJobManager(
+                max_workers=int(os.environ.get("GANTRITHOR_LOAD_WORKERS", 0)))
+            self._background_jobs.job_progress.connect(self.on_job_progress)
+            self._background_jobs.job_finished.connect(self.on_job_finished)
+            self._background_jobs.job_failed.connect(self.on_job_failed)
+            self._background_jobs.job_cancelled.connect(self.on_job_cancelled)
+        return self._background_jobs
+
+    @property
+    def training_scheduler(self):
+        """
+        Runs fine-tuning in worker processes that outlive pipeline resets and crashes of the GUI, created on
+        first use. NER jobs reuse tokenized datasets across runs on the same data and model (PreprocessCache).
+        """
+        if self._training_scheduler is None:
+            from TrainingScheduler import TrainingScheduler
+
+            self._training_scheduler = TrainingScheduler(self.app_data_path("training"), task_options={
+                "ner": {"preprocess_cache_dir": self.app_data_path("preprocess_cache")}})
+            self._training_scheduler.job_state_changed.connect(self.on_training_state_changed)
+        return self._training_scheduler
+
+    @property
+    def saved_session(self):
+        """
+        The session saved on the last quit, read on first use; None if there is none or restoring is disabled.
+        """
+        if self._session_snapshot is None:
+            from SessionSnapshot import SessionSnapshot
+
+            self._session_snapshot = SessionSnapshot(self.app_data_path("session"))
+            self._saved_session = self._session_snapshot.load() \
+                if os.environ.get("GANTRITHOR_RESTORE_SESSION", "1") != "0" else None
+            self.pending_session_tasks = dict(self._saved_session["tasks"]) if self._saved_session else {}
+        return self._saved_session
+
+    def get_task_gui(self, task_name):
+        """
+        Returns the GUI for the given task, building it and wiring its signals and observers
+        the first time it is asked for.
+        """
+        if task_name not in self.task_guis:
+            from PerformanceMonitor import span
+
+            with span("build_task_gui", "gui", task=task_name):
+                self.build_task_gui(task_name)
+        return self.task_guis[task_name]
+
+    def build_task_gui(self, task_name):
+        """
+        Creates the GUI registered for task_name, connects its reset and load signals to Main
+        and adds its components to the task's id2label observer.
+
+        :return: The newly created task GUI.
+        """
+        entry = self.TASK_REGISTRY[task_name]
+        start_time = time.perf_counter()
+
+        task_gui = import_class(*entry["gui_class"])(self.factory)
+        getattr(task_gui, entry["reset_requested"]).connect(getattr(self, entry["reset_signal"]).emit)
+        task_gui.load_model_gui.load_model_signal.connect(self.on_model_loaded)
+        task_gui.load_dataset_gui.load_dataset_signal.connect(self.on_dataset_loaded)
+        task_gui.load_model_gui.load_model_signal.connect(
+            lambda path, task=task_name: self.record_loaded_path(task, "model", path))
+        task_gui.load_dataset_gui.load_dataset_signal.connect(
+            lambda path, task=task_name: self.record_loaded_path(task, "dataset", path))
+        # Label updates are delivered as they are made; code changing many labels in a row (a model with
+        # hundreds of labels loading, a bulk edit) wraps them in `with id2label_notifier.batch():`
+        getattr(task_gui, entry["singleton"]).id2label_notifier = self.id2label_notifier(task_name)
+
+        # Register before wiring the observer, which reads the GUI back through get_task_gui
+        self.task_guis[task_name] = task_gui
+        getattr(self, entry["observer"])()
+        self.apply_license_status(task_name)
+        self.restore_task_session(task_name)
+
+        self.task_build_times[task_name] = time.perf_counter() - start_time
+        logging.info("Built %s task GUI in %.3f s", task_name, self.task_build_times[task_name])
+        return task_gui
+
+    def record_loaded_path(self, task_name, kind, path):
+        """
+        Remembers the model or dataset path a task has loaded, for the session snapshot.
+        """
+        self.loaded_paths[task_name][kind] = path
+        if kind == "dataset" and self.pending_view_states.get(task_name, (None,))[0] == path:
+            # After the GUI has filled its views from the dataset, so they have rows to scroll to
+            QTimer.singleShot(0, lambda: self.restore_view_states(task_name))
+
+    def prewarm_next_task(self, task_name):
+        """
+        Imports the GUI and observer modules of the tab most likely to be opened after task_name (and with
+        them torch, transformers or timm) on the job pool, so the first switch to it does not pay the import
+        cost. The GUI itself is still built on first use, on the GUI thread.
+        """
+        next_task = self.PREWARM_ORDER.get(task_name)
+        if not self.prewarm_enabled or next_task is None or next_task in self.task_guis \
+                or next_task in self.prewarmed_tasks:
+            return
+        self.prewarmed_tasks.add(next_task)
+        QTimer.singleShot(self.PREWARM_DELAY_MS, lambda: self.prewarm_jobs.add(self.background_jobs.submit(
+            self.import_task_modules, self.TASK_REGISTRY[next_task], job_name=f"prewarm {next_task}")))
+
+    @staticmethod
+    def import_task_modules(entry):
+        for module_name, class_name in (entry["gui_class"], entry["observer_class"]):
+            import_class(module_name, class_name)
+
+    def report_startup_timing(self, start_time, eager_gui=False):
+        """
+        Logs the time until the first tab is shown, together with the task GUIs built by then. run() calls it
+        at that point in both modes, so a run with --eager-gui (every tab built before the window appears)
+        can be compared with the default lazy start-up.
+        """
+        time_to_window = time.perf_counter() - start_time
+        built = ", ".join(f"{name}={seconds:.3f}s" for name, seconds in self.task_build_times.items())
+        logging.info("Startup report (%s): time-to-first-window %.3f s; task GUIs built: %s",
+                     "eager" if eager_gui else "lazy", time_to_window, built or "none")
+        return time_to_window
+
+    def app_data_path(self, *parts):
+        """
+        Returns a folder under $APPDATA/Gantrithor/data (the folder the installer creates), creating it if needed.
+        """
+        base_path = os.environ.get("APPDATA", os.path.expanduser("~"))
+        path = os.path.join(base_path, "Gantrithor", "data", *parts)
+        os.makedirs(path, exist_ok=True)
+        return path
 
     def create_main_window(self):
         # Use the factory's method to create the main window
@@ -238,6 +471,149 @@ class Main(QObject, PathsAndDirectoriesMixin):
     def on_dataset_loaded(self, dataset_path):
         self.add_directory_path_gui(f"Dataset: {dataset_path}", 'dataset')
 
+    def on_job_progress(self, job_id, percent, message):
+        logging.info("%s: %d%% %s", self.background_jobs.job_name(job_id), percent, message)
+
+    def on_job_finished(self, job_id, result):
+        logging.info("Background job %s finished", job_id)
+        self.prewarm_jobs.discard(job_id)
+
+    def on_job_failed(self, job_id, error_message, error_traceback):
+        if job_id in self.prewarm_jobs:
+            # The tab reports the error itself if it fails to import when it is opened
+            self.prewarm_jobs.discard(job_id)
+            logging.warning("Prewarming failed: %s", error_message)
+            return
+        self.show_message_dialog("Loading failed", error_message)
+
+    def on_job_cancelled(self, job_id):
+        logging.info("Background job %s cancelled", job_id)
+
+    def on_training_state_changed(self, job_id, status):
+        job = self.training_scheduler.job(job_id)
+        logging.info("Training job %s: %s", job["name"], status)
+        if status == "failed":
+            self.show_message_dialog("Training failed", job.get("result", {}).get("error", ""))
+
+    def save_session(self):
+        """
+        Writes the session snapshot on quit: the active task and, for each task GUI built in this session,
+        its model and dataset identities, id2label map and item view positions. A task that has not loaded
+        its model or dataset again keeps what the previous session saved for it, and tasks that were not
+        opened keep their whole previous state.
+        """
+        from PerformanceMonitor import span
+        from SessionSnapshot import path_identity, view_states
+
+        with span("save_session", "gui"):
+            previous_tasks = (self.saved_session or {}).get("tasks", {})
+            tasks = {}
+            for task_name, task_gui in self.task_guis.items():
+                previous = previous_tasks.get(task_name, {})
+                paths = self.loaded_paths[task_name]
+                notifier = self.id2label_notifiers.get(task_name)
+                state = {"model": path_identity(paths["model"]), "dataset": path_identity(paths["dataset"]),
+                         "id2label": notifier.id2label if notifier is not None else None,
+                         "id2label_call": notifier.id2label_call if notifier is not None else None,
+                         "views": view_states(task_gui)}
+                if paths["model"] is None:
+                    state["model"] = previous.get("model")
+                if paths["dataset"] is None:
+                    state["dataset"], state["views"] = previous.get("dataset"), previous.get("views", {})
+                if state["id2label"] is None or state["id2label_call"] is None:
+                    state["id2label"], state["id2label_call"] = previous.get("id2label"), previous.get("id2label_call")
+                tasks[task_name] = state
+            tasks.update({task_name: state for task_name, state in self.pending_session_tasks.items()
+                          if task_name not in tasks})
+            self._session_snapshot.save({"active_task": self.active_task, "tasks": tasks})
+
+    def restore_task_session(self, task_name):
+        """
+        Restores the saved state of a task whose GUI has just been built, through the objects Main already
+        wires into every task GUI, so the GUIs need no session hooks:
+
+        - the id2label map is replayed through the task's Id2LabelNotifier with the observer call that
+          delivered it, in one batch;
+        - the scroll positions, current cells and selections of its tables are applied when the user loads
+          the saved dataset again (restore_view_states()).
+
+        Nothing is restored if the saved model or dataset changed on disk. Models and datasets are not
+        reloaded automatically, so nothing is shown as loaded before the user loads it. Predictions live in
+        the task GUIs and are recomputed; embeddings are already persisted by the ProjectionEngine store.
+        """
+        from PerformanceMonitor import span
+        from SessionSnapshot import identity_matches
+
+        state = self.pending_session_tasks.pop(task_name, None) if self.saved_session else None
+        if state is None:
+            return
+        stale = [kind for kind in ("model", "dataset") if state.get(kind) is not None
+                 and not identity_matches(state[kind])]
+        if stale:
+            logging.info("Not restoring the %s session: the %s changed on disk", task_name, " and ".join(stale))
+            return
+        with span("restore_session", "gui", task=task_name):
+            notifier = self.id2label_notifiers.get(task_name)
+            if notifier is not None and state.get("id2label") and state.get("id2label_call"):
+                notifier.publish(state["id2label"], *state["id2label_call"])
+            if state.get("dataset") is not None and state.get("views"):
+                self.pending_view_states[task_name] = (state["dataset"]["path"], state["views"])
+
+    def restore_view_states(self, task_name):
+        task_gui, pending = self.task_guis.get(task_name), self.pending_view_states.pop(task_name, None)
+        if task_gui is not None and pending is not None:
+            from SessionSnapshot import apply_view_states
+
+            restored = apply_view_states(task_gui, pending[1])
+            logging.info("Restored the positions of %d %s views", restored, task_name)
+
+    def export_performance_trace(self):
+        """
+        Writes the buffered timing spans as a Chrome trace and a JSON summary, for attaching to bug reports.
+
+        :return: The path of the Chrome trace.
+        """
+        from PerformanceMonitor import MONITOR
+
+        output_dir = self.app_data_path("performance")
+        os.makedirs(output_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        trace_path = MONITOR.export_chrome_trace(os.path.join(output_dir, f"trace-{stamp}.json"))
+        MONITOR.export_json(os.path.join(output_dir, f"spans-{stamp}.json"))
+        logging.info("Performance trace written to %s", trace_path)
+        return trace_path
+
+    def toggle_profiling(self, mode="sample"):
+        from PerformanceMonitor import MONITOR
+
+        profile_path = MONITOR.toggle_profiling(self.app_data_path("performance"), mode)
+        if profile_path is None:
+            self.show_popup_message("Profiling", "Profiling started. Press Ctrl+Shift+P again to stop it.")
+        else:
+            trace_path = self.export_performance_trace()
+            self.show_popup_message("Profiling", f"Profile written to {profile_path}\nTrace written to {trace_path}")
+
+    def shutdown_background_jobs(self):
+        """
+        Cancels queued jobs and waits for running ones when the application quits.
+        """
+        try:
+            self.save_session()
+        except Exception as e:
+            logging.error("Saving the session failed: %s", str(e), exc_info=True)
+        from PerformanceMonitor import MONITOR
+
+        if self._background_jobs is not None:
+            self._background_jobs.cancel_all()
+            self._background_jobs.wait_for_done(5000)
+        if self._training_scheduler is not None:
+            # Running training workers keep going and are re-attached next launch
+            self._training_scheduler.shutdown()
+        MONITOR.stop_profiling(self.app_data_path("performance"))
+        if self.trace_on_exit:
+            self.export_performance_trace()
+        logging.info("Performance spans: %s", MONITOR.summary())
+
     def format_directory_path(self, directory_path, label_type):
         label_prefix = f"{label_type}: "
         path = directory_path.replace(label_prefix, "")
@@ -263,28 +639,28 @@ class Main(QObject, PathsAndDirectoriesMixin):
 
     def open_settings(self):
         # Method to show the SettingsGui
+        if self.settings_gui is None:
+            self.settings_gui = import_class(*SETTINGS_GUI_CLASS)(self.factory)
         self.settings_gui.show()
 
     def switch_gui(self, gui_name):
-        self.reset_button_styles()
-
-        current_widget = self.central_layout.takeAt(0).widget()
-        if current_widget is not None:
-            current_widget.setParent(None)
-
-        # Add the new GUI based on the button clicked
-        if gui_name == "ner":
-            self.central_layout.addWidget(self.ner_gui)
-            self.ner_button.setChecked(True)  # Mark the button as checked
-        elif gui_name == "text":
-            self.central_layout.addWidget(self.text_gui)
-            self.text_button.setChecked(True)  # Mark the button as checked
-        elif gui_name == "img":
-            self.central_layout.addWidget(self.img_gui)
-            self.img_button.setChecked(True)  # Mark the button as checked
-        elif gui_name == "obj":
-            self.central_layout.addWidget(self.obj_gui)
-            # self.obj_button.setChecked(True)  # Mark the button as checked
+        from PerformanceMonitor import span
+
+        with span("switch_gui", "gui", task=gui_name):
+            self.active_task = gui_name
+            self.reset_button_styles()
+
+            # The layout is empty until the first task is opened
+            item = self.central_layout.takeAt(0)
+            if item is not None and item.widget() is not None:
+                item.widget().setParent(None)
+
+            # Add the new GUI based on the button clicked, building it on first use
+            self.central_layout.addWidget(self.get_task_gui(gui_name))
+            button = self.task_buttons.get(gui_name)
+            if button is not None:
+                button.setChecked(True)  # Mark the button as checked
+            self.prewarm_next_task(gui_name)
 
     def reset_button_styles(self):
         """
@@ -317,24 +693,39 @@ class Main(QObject, PathsAndDirectoriesMixin):
         dialog.setLayout(layout)
         dialog.exec()
 
+    def id2label_notifier(self, task_name):
+        """
+        Returns the task's Id2LabelNotifier, emptied of the subscribers of a previous task GUI.
+        """
+        notifier = self.id2label_notifiers.get(task_name)
+        if notifier is None:
+            from Id2LabelNotifier import Id2LabelNotifier
+
+            notifier = self.id2label_notifiers[task_name] = Id2LabelNotifier(task_name)
+        notifier.clear()
+        return notifier
+
     def add_to_observer(self):
         """
         This method adds the modules that are involved in creating label buttons from
         the model and dataset parameters. The observer pattern here is for making sure the data and model
         initialization in our pipeline all has access to all attributes related to the id2label in model config.
+        The modules are subscribed through an Id2LabelNotifier, which records the label map each received and
+        lets bulk changes made inside its batch() reach each module once.
 
         :return:
         """
 
-        id2label_observer = Id2LabelObserver()
+        id2label_observer = import_class(*self.TASK_REGISTRY["ner"]["observer_class"])()
 
         self.ner_gui.id2label_converter_instance.reset()
-        id2label_observer.add_observer(self.ner_gui.ner_dataframe)
-        id2label_observer.add_observer(self.ner_gui.load_dataset_gui)
-        id2label_observer.add_observer(self.ner_gui.create_dataset_gui)
-        id2label_observer.add_observer(self.ner_gui.load_model_gui)
-        id2label_observer.add_observer(self.ner_gui.create_model_gui)
-        id2label_observer.add_observer(self.ner_gui)
+        notifier = self.id2label_notifier("ner")
+        notifier.subscribe(id2label_observer, self.ner_gui.ner_dataframe)
+        notifier.subscribe(id2label_observer, self.ner_gui.load_dataset_gui)
+        notifier.subscribe(id2label_observer, self.ner_gui.create_dataset_gui)
+        notifier.subscribe(id2label_observer, self.ner_gui.load_model_gui)
+        notifier.subscribe(id2label_observer, self.ner_gui.create_model_gui)
+        notifier.subscribe(id2label_observer, self.ner_gui)
 
     def add_to_observer_text(self):
         """
@@ -343,33 +734,35 @@ class Main(QObject, PathsAndDirectoriesMixin):
         :return:
         """
 
-        text_id2label_observer = TEXTId2LabelObserver()
+        text_id2label_observer = import_class(*self.TASK_REGISTRY["text"]["observer_class"])()
 
         self.text_gui.text_id2label_converter_instance.reset()
-        text_id2label_observer.add_observer(self.text_gui.text_dataframe)
-        text_id2label_observer.add_observer(self.text_gui.load_dataset_gui)
-        text_id2label_observer.add_observer(self.text_gui.create_dataset_gui)
-        text_id2label_observer.add_observer(self.text_gui.load_model_gui)
-        text_id2label_observer.add_observer(self.text_gui.create_model_gui)
-        text_id2label_observer.add_observer(self.text_gui)
+        notifier = self.id2label_notifier("text")
+        notifier.subscribe(text_id2label_observer, self.text_gui.text_dataframe)
+        notifier.subscribe(text_id2label_observer, self.text_gui.load_dataset_gui)
+        notifier.subscribe(text_id2label_observer, self.text_gui.create_dataset_gui)
+        notifier.subscribe(text_id2label_observer, self.text_gui.load_model_gui)
+        notifier.subscribe(text_id2label_observer, self.text_gui.create_model_gui)
+        notifier.subscribe(text_id2label_observer, self.text_gui)
 
     def add_to_observer_img(self):
         """
         Adds the modules involved in creating label buttons for image classification to the observer.
         Ensures that data and model initialization have access to attributes related to the id2label in model config.
         """
-        img_id2label_observer = IMGId2LabelObserver()
+        img_id2label_observer = import_class(*self.TASK_REGISTRY["img"]["observer_class"])()
 
         # Reset the id2label converter instance for image GUI
         self.img_gui.img_id2label_converter_instance.reset()
+        notifier = self.id2label_notifier("img")
 
         # Add necessary GUI components to the observer
-        img_id2label_observer.add_observer(self.img_gui.img_dataframe)
-        img_id2label_observer.add_observer(self.img_gui.load_dataset_gui)
-        img_id2label_observer.add_observer(self.img_gui.create_dataset_gui)
-        img_id2label_observer.add_observer(self.img_gui.load_model_gui)
-        img_id2label_observer.add_observer(self.img_gui.create_model_gui)
-        img_id2label_observer.add_observer(self.img_gui)
+        notifier.subscribe(img_id2label_observer, self.img_gui.img_dataframe)
+        notifier.subscribe(img_id2label_observer, self.img_gui.load_dataset_gui)
+        notifier.subscribe(img_id2label_observer, self.img_gui.create_dataset_gui)
+        notifier.subscribe(img_id2label_observer, self.img_gui.load_model_gui)
+        notifier.subscribe(img_id2label_observer, self.img_gui.create_model_gui)
+        notifier.subscribe(img_id2label_observer, self.img_gui)
 
     def add_to_observer_obj(self):
         """
@@ -378,94 +771,50 @@ class Main(QObject, PathsAndDirectoriesMixin):
 
 
         """
-        obj_id2label_observer = OBJId2LabelObserver()
+        obj_id2label_observer = import_class(*self.TASK_REGISTRY["obj"]["observer_class"])()
 
         # Reset the id2label converter instance for object GUI
         self.obj_gui.obj_id2label_converter_instance.reset()
+        notifier = self.id2label_notifier("obj")
 
         # Add necessary GUI components to the observer
-        obj_id2label_observer.add_observer(self.obj_gui.obj_dataframe)
-        obj_id2label_observer.add_observer(self.obj_gui.load_dataset_gui)
-        obj_id2label_observer.add_observer(self.obj_gui.create_dataset_gui)
-        obj_id2label_observer.add_observer(self.obj_gui.load_model_gui)
-        obj_id2label_observer.add_observer(self.obj_gui.create_model_gui)
-        obj_id2label_observer.add_observer(self.obj_gui)
+        notifier.subscribe(obj_id2label_observer, self.obj_gui.obj_dataframe)
+        notifier.subscribe(obj_id2label_observer, self.obj_gui.load_dataset_gui)
+        notifier.subscribe(obj_id2label_observer, self.obj_gui.create_dataset_gui)
+        notifier.subscribe(obj_id2label_observer, self.obj_gui.load_model_gui)
+        notifier.subscribe(obj_id2label_observer, self.obj_gui.create_model_gui)
+        notifier.subscribe(obj_id2label_observer, self.obj_gui)
+
+    def reset_task_pipeline(self, task_name):
+        """
+        Resets the pipeline of the given task: the task GUI is discarded and a fresh one is shown in its place.
+        """
+        from PerformanceMonitor import span
 
-    def reset_pipeline_ner(self):
-        # Clear NER related components
-        if hasattr(self, 'ner_gui'):
-            self.ner_gui.deleteLater()  # Safely delete the current instance
+        with span("reset_pipeline", "gui", task=task_name):
+            start_time = time.perf_counter()
+            old_gui = self.task_guis.pop(task_name, None)
+            if old_gui is not None:
+                old_gui.deleteLater()  # Safely delete the current instance
 
-        # Reinitialize NER GUI component
-        self.ner_gui = NERgui(self.factory)
-        self.ner_gui.reset_pipeline_requested_ner.connect(self.reset_pipeline_signal.emit)
-        self.reset_pipeline_signal.connect(self.reset_pipeline_ner)
-        self.ner_gui.load_model_gui.load_model_signal.connect(self.on_model_loaded)
-        self.ner_gui.load_dataset_gui.load_dataset_signal.connect(self.on_dataset_loaded)
+            # Rebuild the GUI and update the central layout
+            self.switch_gui(task_name)
+            self.directory_labels = {}
+            self.clearBottomLayout()
+            self.is_commercial_version()
+            logging.info("Rebuilt %s pipeline in %.3f s", task_name, time.perf_counter() - start_time)
 
-        # Update the central layout
-        self.switch_gui("ner")
-        self.directory_labels = {}
-        self.clearBottomLayout()
-        self.add_to_observer()
-        self.is_commercial_version()
+    def reset_pipeline_ner(self):
+        self.reset_task_pipeline("ner")
 
     def reset_pipeline_text(self):
-        # Clear TEXT related components
-        if hasattr(self, 'text_gui'):
-            self.text_gui.deleteLater()  # Safely delete the current instance
-
-        # Reinitialize TEXT GUI component
-        self.text_gui = TEXTgui(self.factory)
-        self.text_gui.reset_pipeline_requested_text.connect(self.reset_pipeline_signal_text.emit)
-        self.reset_pipeline_signal_text.connect(self.reset_pipeline_text)
-        self.text_gui.load_model_gui.load_model_signal.connect(self.on_model_loaded)
-        self.text_gui.load_dataset_gui.load_dataset_signal.connect(self.on_dataset_loaded)
-
-        # Update the central layout
-        self.switch_gui("text")
-        self.directory_labels = {}
-        self.clearBottomLayout()
-        self.add_to_observer_text()
-        self.is_commercial_version()
+        self.reset_task_pipeline("text")
 
     def reset_pipeline_img(self):
-        # Clear IMG related components
-        if hasattr(self, 'img_gui'):
-            self.img_gui.deleteLater()  # Safely delete the current instance
-
-        # Reinitialize IMG GUI component
-        self.img_gui = IMGgui(self.factory)
-        self.img_gui.reset_pipeline_requested_img.connect(self.reset_pipeline_signal_img.emit)
-        self.reset_pipeline_signal_img.connect(self.reset_pipeline_img)
-        self.img_gui.load_model_gui.load_model_signal.connect(self.on_model_loaded)
-        self.img_gui.load_dataset_gui.load_dataset_signal.connect(self.on_dataset_loaded)
-
-        # Update the central layout
-        self.switch_gui("img")
-        self.directory_labels = {}
-        self.clearBottomLayout()
-        self.add_to_observer_img()
-        self.is_commercial_version()
+        self.reset_task_pipeline("img")
 
     def reset_pipeline_obj(self):
-        # Clear OBJ related components
-        if hasattr(self, 'obj_gui'):
-            self.obj_gui.deleteLater()  # Safely delete the current instance
-
-        # Reinitialize OBJ GUI component
-        self.obj_gui = OBJgui(self.factory)
-        self.obj_gui.reset_pipeline_requested.connect(self.reset_pipeline_signal_obj.emit)
-        self.reset_pipeline_signal_obj.connect(self.reset_pipeline_obj)
-        self.obj_gui.load_model_gui.load_model_signal.connect(self.on_model_loaded)
-        self.obj_gui.load_dataset_gui.load_dataset_signal.connect(self.on_dataset_loaded)
-
-        # Update the central layout
-        self.switch_gui("obj")
-        self.directory_labels = {}
-        self.add_to_observer_obj()
-        self.is_commercial_version()
-
+        self.reset_task_pipeline("obj")
 
     def clearBottomLayout(self):
         """Clear all widgets from the bottom layout."""
@@ -483,16 +832,32 @@ class Main(QObject, PathsAndDirectoriesMixin):
     def clear_central_layout(self):
         self.clearLayout(self.central_layout)
 
-    def run(self):
+    def run(self, startup_start_time=None):
         # Set the global exception handler
         sys.excepthook = self.global_exception_handler
+        QApplication.instance().aboutToQuit.connect(self.shutdown_background_jobs)
+        # Re-attaches training jobs of the last session once the window is up
+        QTimer.singleShot(0, lambda: self.training_scheduler.start())
+        # Ctrl+Shift+P starts/stops the sampling profiler, Ctrl+Shift+T exports the timing spans
+        QShortcut(QKeySequence("Ctrl+Shift+P"), self.main_window, activated=self.toggle_profiling)
+        QShortcut(QKeySequence("Ctrl+Shift+T"), self.main_window,
+                  activated=lambda: self.show_popup_message("Performance trace", self.export_performance_trace()))
         try:
             # Show the main window
             self.main_window.show()
+            if self.open_task_on_start:
+                QTimer.singleShot(0, lambda: self.open_start_task(startup_start_time))
         except Exception as e:
             logging.error("An error occurred: %s", str(e), exc_info=True)
             # self.show_error_popup(str(e))
 
+    def open_start_task(self, startup_start_time=None):
+        # Reopen the task that was active when the application was last closed
+        active_task = (self.saved_session or {}).get("active_task")
+        self.switch_gui(active_task if active_task in self.TASK_REGISTRY else "ner")
+        if startup_start_time is not None:
+            self.report_startup_timing(startup_start_time, self.eager_gui)
+
     def show_error_popup(self, error_message):
         msg_box = QMessageBox()
         msg_box.setWindowTitle("Error")
@@ -507,6 +872,14 @@ class Main(QObject, PathsAndDirectoriesMixin):
 
 
 if __name__ == '__main__':
+    # Headless commands (infer, train, update) were dispatched at the top of the file
+    startup_start_time = time.perf_counter()
+    eager_gui = "--eager-gui" in sys.argv
+    for argument in sys.argv:
+        if argument.startswith("--profile="):
+            from PerformanceMonitor import MONITOR
+
+            MONITOR.start_profiling(argument.split("=", 1)[1])
     app = QApplication(sys.argv)
     paths = PathsAndDirectoriesMixin()
     paths.initialize_paths_and_directories()
@@ -530,8 +903,11 @@ if __name__ == '__main__':
 
     app.processEvents()  # Process any pending events to ensure the splash screen is displayed promptly
 
-    main_app = Main()  # Create an instance of your main application class
+    main_app = Main(eager_gui=eager_gui)  # Create an instance of your main application class
+    main_app.trace_on_exit = "--trace" in sys.argv
     splash.hide()
-    main_app.run()
+    main_app.run(startup_start_time)
+    if IMPORT_PROFILER is not None:
+        IMPORT_PROFILER.write_report(os.path.join(os.getcwd(), "import_profile.txt"), label="first window")
     sys.exit(app.exec())
 
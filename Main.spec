@@ -1,9 +1,109 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
+import re
+import sys
+import importlib.util
+
 from PyInstaller.utils.hooks import collect_data_files
+from PyInstaller.utils.hooks import collect_submodules
 from PyInstaller.utils.hooks import copy_metadata
 
+# Build profile: "gpu" (default) bundles the CUDA build of torch as before, "cpu" builds the slim
+# CPU-only installer and must be run in an environment with the CPU wheel of torch installed:
+#   set GANTRITHOR_BUILD_PROFILE=cpu && pyinstaller Main.spec
+BUILD_PROFILE = os.environ.get("GANTRITHOR_BUILD_PROFILE", "gpu")
+if BUILD_PROFILE not in ("gpu", "cpu"):
+    raise SystemExit(f"Unknown GANTRITHOR_BUILD_PROFILE: {BUILD_PROFILE}")
+
+sys.path.insert(0, SPECPATH)
+from BundleReport import CUDA_LIBRARY_PATTERN, write_report
+
+if BUILD_PROFILE == "cpu":
+    import torch
+
+    if torch.version.cuda is not None:
+        raise SystemExit(f"The cpu profile needs the CPU-only torch wheel, found CUDA {torch.version.cuda}")
+
+# Model families that the task GUIs load through the Auto classes. Which family a checkpoint needs is
+# only known from its config.json, so these are the backbones the tasks are trained from. Set
+# GANTRITHOR_TRANSFORMERS_MODELS (comma separated) to bundle more; a frozen build asked to load a
+# family it does not bundle fails with an error that names the family (TaskLoaders.py).
+CHECKPOINT_MODELS = [
+    "bert", "roberta", "xlm_roberta", "distilbert", "deberta", "deberta_v2", "electra", "vit", "deit", "convnext",
+    "swin", "resnet", "detr", "conditional_detr", "deformable_detr", "yolos", "table_transformer",
+]
+EXTRA_MODELS = [name.strip() for name in os.environ.get("GANTRITHOR_TRANSFORMERS_MODELS", "").split(",")
+                if name.strip()]
+TRANSFORMERS_IMPORT = re.compile(r"from\s+transformers(?:\.models\.(\w+))?[\w.]*\s+import\s+"
+                                 r"(?:\(([\w\s,]+)\)|([\w \t,]+))|transformers\.models\.(\w+)")
+
+
+def source_files():
+    """The project modules next to this spec and the GANTRITHOR package with the task GUIs."""
+    paths = [os.path.join(SPECPATH, name) for name in os.listdir(SPECPATH) if name.endswith(".py")]
+    spec = importlib.util.find_spec("GANTRITHOR")
+    for root in (spec.submodule_search_locations or []) if spec is not None else []:
+        paths += [os.path.join(folder, name) for folder, _, names in os.walk(root)
+                  for name in names if name.endswith(".py")]
+    return paths
+
+
+def imported_transformers_models():
+    """
+    The transformers.models packages the sources import: named directly (transformers.models.bert) or
+    through a class exported by transformers (AutoModelForSequenceClassification -> auto).
+    """
+    import transformers
+
+    families = set()
+    for path in source_files():
+        with open(path, "r", encoding="utf-8", errors="ignore") as source_file:
+            source = source_file.read()
+        for match in TRANSFORMERS_IMPORT.finditer(source):
+            family = match.group(1) or match.group(4)
+            if family:
+                families.add(family)
+                continue
+            for name in re.split(r"[\s,]+", match.group(2) or match.group(3)):
+                try:
+                    module = getattr(transformers, name).__module__
+                except Exception:  # not a lazily exported class (or a name that needs a missing backend)
+                    continue
+                if module.startswith("transformers.models."):
+                    families.add(module.split(".")[2])
+    return families
+
+
+TRANSFORMERS_MODELS = sorted(imported_transformers_models() | set(CHECKPOINT_MODELS) | set(EXTRA_MODELS))
+print(f"Bundling transformers model families: {', '.join(TRANSFORMERS_MODELS)}")
+
+
+def transformers_exclusions():
+    import transformers.models
+
+    models_path = os.path.dirname(transformers.models.__file__)
+    unknown = [name for name in TRANSFORMERS_MODELS if not os.path.isdir(os.path.join(models_path, name))]
+    if unknown:
+        raise SystemExit(f"Unknown transformers model families: {', '.join(unknown)} (GANTRITHOR_TRANSFORMERS_MODELS "
+                         f"takes package names under transformers/models, e.g. xlm_roberta)")
+    excluded = []
+    for name in sorted(os.listdir(models_path)):
+        package_path = os.path.join(models_path, name)
+        if not os.path.isdir(package_path) or name.startswith("_"):
+            continue
+        if name not in TRANSFORMERS_MODELS:
+            excluded.append(f"transformers.models.{name}")
+            continue
+        # TensorFlow and Flax variants of the kept models are never used
+        excluded += [f"transformers.models.{name}.{file_name[:-3]}" for file_name in os.listdir(package_path)
+                     if file_name.startswith(("modeling_tf_", "modeling_flax_"))]
+    return excluded
+
+
 datas = []
-datas += collect_data_files('torch')
+# Headers, CMake files and static libraries of torch are only needed to build extensions
+datas += collect_data_files('torch', excludes=['include/**', 'share/**', '**/*.h', '**/*.hpp', '**/*.cuh',
+                                               '**/*.lib', '**/*.pyi', 'testing/**', 'utils/benchmark/**'])
 datas += copy_metadata('pyyaml')
 datas += copy_metadata('safetensors')
 datas += copy_metadata('torch')
@@ -15,7 +115,27 @@ datas += copy_metadata('filelock')
 datas += copy_metadata('numpy')
 datas += copy_metadata('tokenizers')
 datas += copy_metadata('importlib_metadata')
-datas += [('C:/Users/doren/anaconda3/envs/GANT_CONDA_ENV/lib/site-packages/timm', 'timm')]
+
+# timm registers its architectures when timm.models is imported, so its modules are collected as bytecode
+# instead of copying the whole source tree as data
+timm_modules = collect_submodules('timm', filter=lambda name: '.tests' not in name)
+transformers_modules = [module for name in TRANSFORMERS_MODELS
+                        for module in collect_submodules(f'transformers.models.{name}',
+                                                         filter=lambda module: '_tf_' not in module
+                                                         and '_flax_' not in module)]
+
+# Main.py imports these through import_class on first use, so the analysis cannot see them
+lazy_imports = [
+    'GANTRITHOR.NER_GUI.NERgui', 'GANTRITHOR.NER_ADAPTER.id2labelObserver',
+    'GANTRITHOR.TEXT_GUI.TEXTgui', 'GANTRITHOR.TEXT_ADAPTER.TEXTid2labelObserver',
+    'GANTRITHOR.IMG_GUI.IMGgui', 'GANTRITHOR.IMG_ADAPTER.IMGId2LabelObserver',
+    'GANTRITHOR.OBJ_GUI.OBJ_GUI', 'GANTRITHOR.OBJ_ADAPTER.OBJId2LabelObserver',
+    'GANTRITHOR.SETTINGS.SettingsGui', 'ProjectionEngine', 'VectorIndex', 'InferenceEngine',
+    'ActiveLearning',
+]
+
+excludes = ['pytest', 'tensorflow', 'flax', 'jax', 'keras', 'torch.utils.tensorboard', 'torch.testing._internal',
+            'torch.utils.benchmark', 'caffe2'] + transformers_exclusions()
 
 
 a = Analysis(
@@ -23,16 +143,21 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=datas,
-    hiddenimports=['pyyaml', 'safetensors', 'pkg_resources.py2_warn', 'googleapiclient', 'apiclient', 'pytorch', 'sklearn.utils._cython_blas', 'sklearn.neighbors.typedefs', 'sklearn.neighbors.quad_tree', 'sklearn.tree', 'sklearn.tree._utils'],
+    hiddenimports=['pyyaml', 'safetensors', 'pkg_resources.py2_warn', 'googleapiclient', 'apiclient', 'pytorch', 'sklearn.utils._cython_blas', 'sklearn.neighbors.typedefs', 'sklearn.neighbors.quad_tree', 'sklearn.tree', 'sklearn.tree._utils'] + lazy_imports + timm_modules + transformers_modules,
      hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=['pytest'],
+    excludes=excludes,
     noarchive=False,
     module_collection_mode={
         'datasets': 'pyz+py'
     }
 )
+
+if BUILD_PROFILE == "cpu":
+    # Stray CUDA runtimes can still come in through other packages (nvidia-* wheels, cupy)
+    a.binaries = [entry for entry in a.binaries if not CUDA_LIBRARY_PATTERN.search(os.path.basename(entry[0]))]
+
 pyz = PYZ(a.pure)
 
 exe = EXE(
@@ -63,3 +188,6 @@ coll = COLLECT(
     upx_exclude=[],
     name='Main',
 )
+
+# Size per package, compared with the previous build of the same profile
+write_report(os.path.join(DISTPATH, 'Main'), os.path.join(DISTPATH, f'bundle_report_{BUILD_PROFILE}.json'))
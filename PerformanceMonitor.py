@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from collections import Counter, deque
+
+
+class _Span:
+    __slots__ = ("monitor", "name", "category", "args", "start_ns")
+
+    def __init__(self, monitor, name, category, args):
+        self.monitor = monitor
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.monitor.record(self.name, self.category, self.start_ns, time.perf_counter_ns() - self.start_ns,
+                            self.args)
+        return False
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class StackSampler:
+    """
+    A sampling profiler that reads the stacks of every Python thread from sys._current_frames() at a fixed
+    interval. Samples are written in the collapsed ("folded") stack format also produced by py-spy
+    (--format raw), which flamegraph.pl, speedscope and inferno read directly.
+    """
+
+    def __init__(self, interval_seconds=0.005):
+        self.interval_seconds = interval_seconds
+        self.samples = Counter()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._sample, name="StackSampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        thread_names = {}
+        while not self._stopped.wait(self.interval_seconds):
+            if len(thread_names) != threading.active_count():
+                thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def write_folded(self, path):
+        with open(path, "w", encoding="utf-8") as folded_file:
+            for stack, count in self.samples.most_common():
+                folded_file.write(f"{stack} {count}\n")
+
+
+class PerformanceMonitor:
+    """
+    PerformanceMonitor Class Description:
+
+    Timing spans for the hot paths of the application: tab switches, pipeline resets, model and dataset
+    loads, inference batches and Dash renders. A span costs two perf_counter_ns() calls and one deque
+    append, so instrumentation stays on by default. Spans are kept in a ring buffer of the latest
+    max_events, and can be exported as a Chrome trace (chrome://tracing, Perfetto) or summarised per name.
+
+    For performance bug reports, a profiling mode can be toggled at runtime: "sample" runs the StackSampler
+    and writes folded stacks for flame graphs, "cprofile" runs cProfile and writes a .prof file for
+    pstats/snakeviz. py-spy can also be attached from outside to the pid logged at start-up.
+
+    Attributes:
+    - events (deque): Ring buffer of (name, category, start_ns, duration_ns, thread_id, args).
+    - enabled (bool): When False, span() returns a no-op context manager.
+    - profiling_mode (str or None): "sample" or "cprofile" while profiling.
+
+    Methods:
+    - span(): Context manager timing a block.
+    - traced(): Decorator timing every call of a function.
+    - record(): Adds a finished span.
+    - summary(): Returns count, total, mean, p50, p95 and max milliseconds per span name.
+    - export_chrome_trace(), export_json(): Write the buffered spans to a file.
+    - start_profiling(), stop_profiling(), toggle_profiling(): Control the profiling mode.
+    """
+
+    def __init__(self, max_events=20000, enabled=True):
+        self.events = deque(maxlen=max_events)
+        self.enabled = enabled
+        self.profiling_mode = None
+        self._profiler = None
+        self._origin_ns = time.perf_counter_ns()
+        self._origin_wall = time.time()
+
+    def span(self, name, category="app", **args):
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name, category, args)
+
+    def traced(self, name=None, category="app"):
+        def decorator(function):
+            span_name = name or function.__qualname__
+
+            def wrapper(*args, **kwargs):
+                with self.span(span_name, category):
+                    return function(*args, **kwargs)
+
+            wrapper.__name__ = function.__name__
+            wrapper.__qualname__ = function.__qualname__
+            wrapper.__doc__ = function.__doc__
+            wrapper.__wrapped__ = function
+            return wrapper
+
+        return decorator
+
+    def record(self, name, category, start_ns, duration_ns, args=None):
+        # deque.append is atomic, so spans from worker threads need no lock
+        self.events.append((name, category, start_ns, duration_ns, threading.get_ident(), args or {}))
+
+    def summary(self):
+        durations = {}
+        for name, category, _, duration_ns, _, _ in list(self.events):
+            durations.setdefault((category, name), []).append(duration_ns / 1e6)
+        summary = {}
+        for (category, name), values in sorted(durations.items()):
+            values.sort()
+            summary[f"{category}/{name}"] = {
+                "count": len(values),
+                "total_ms": round(sum(values), 3),
+                "mean_ms": round(sum(values) / len(values), 3),
+                "p50_ms": round(values[len(values) // 2], 3),
+                "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+                "max_ms": round(values[-1], 3),
+            }
+        return summary
+
+    def chrome_trace_events(self):
+        pid = os.getpid()
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        trace_events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id, "args": {"name": name}}
+                        for thread_id, name in thread_names.items()]
+        for name, category, start_ns, duration_ns, thread_id, args in list(self.events):
+            trace_events.append({"name": name, "cat": category, "ph": "X", "pid": pid, "tid": thread_id,
+                                 "ts": (start_ns - self._origin_ns) / 1000, "dur": duration_ns / 1000,
+                                 "args": {key: str(value) for key, value in args.items()}})
+        return trace_events
+
+    def export_chrome_trace(self, path):
+        """
+        Writes the buffered spans in the Chrome trace event format; open the file in chrome://tracing
+        or https://ui.perfetto.dev.
+        """
+        with open(path, "w", encoding="utf-8") as trace_file:
+            json.dump({"traceEvents": self.chrome_trace_events(), "displayTimeUnit": "ms",
+                       "otherData": {"started": self._origin_wall}}, trace_file)
+        return path
+
+    def export_json(self, path):
+        events = [{"name": name, "category": category, "start_ms": (start_ns - self._origin_ns) / 1e6,
+                   "duration_ms": duration_ns / 1e6, "thread": thread_id,
+                   "args": {key: str(value) for key, value in args.items()}}
+                  for name, category, start_ns, duration_ns, thread_id, args in list(self.events)]
+        with open(path, "w", encoding="utf-8") as json_file:
+            json.dump({"summary": self.summary(), "events": events}, json_file, indent=1)
+        return path
+
+    # Profiling mode
+
+    def start_profiling(self, mode="sample", interval_seconds=0.005):
+        if self.profiling_mode is not None:
+            return
+        if mode == "cprofile":
+            import cProfile
+
+            # cProfile only sees the thread that enabled it, which is the GUI thread here
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif mode == "sample":
+            self._profiler = StackSampler(interval_seconds)
+            self._profiler.start()
+        else:
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        self.profiling_mode = mode
+        logging.info("Profiling started (%s)", mode)
+
+    def stop_profiling(self, output_dir):
+        """
+        Stops profiling and writes the profile to output_dir.
+
+        :return: The path of the written profile, or None when no profiling was running.
+        """
+        if self.profiling_mode is None:
+            return None
+        os.makedirs(output_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        if self.profiling_mode == "cprofile":
+            self._profiler.disable()
+            path = os.path.join(output_dir, f"profile-{stamp}.prof")
+            self._profiler.dump_stats(path)
+        else:
+            self._profiler.stop()
+            path = os.path.join(output_dir, f"profile-{stamp}.folded")
+            self._profiler.write_folded(path)
+        self._profiler = None
+        self.profiling_mode = None
+        logging.info("Profile written to %s", path)
+        return path
+
+    def toggle_profiling(self, output_dir, mode="sample"):
+        if self.profiling_mode is None:
+            self.start_profiling(mode)
+            return None
+        return self.stop_profiling(output_dir)
+
+
+# Shared by every module of the process; the hot paths time themselves through span()
+MONITOR = PerformanceMonitor(enabled=os.environ.get("GANTRITHOR_PERF_SPANS", "1") != "0")
+
+
+def span(name, category="app", **args):
+    return MONITOR.span(name, category, **args)
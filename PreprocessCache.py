@@ -0,0 +1,171 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+
+
+class PreprocessCache:
+    """
+    PreprocessCache Class Description:
+
+    An on-disk cache of tokenized and spread SpanMarker samples. Preprocessing a NER dataset (IOB scheme
+    detection, tokenization and spreading sentences across samples) only depends on the dataset, the
+    tokenizer and the length settings, so the result is stored as an Arrow dataset under a key built from:
+    - the dataset fingerprint,
+    - a hash of the tokenizer,
+    - model_max_length, marker_max_length and entity_max_length,
+    - the label2id map of the model config,
+    - the split name and whether it is an evaluation split.
+    Cached datasets are opened with load_from_disk, which memory-maps the Arrow files instead of reading them.
+
+    Attributes:
+    - cache_dir (str): Folder holding one sub-folder per cached key.
+    - hits, misses (int): Lookup counters for this session.
+    - bytes_saved (int): Size of the cached Arrow data served instead of preprocessing again.
+
+    Methods:
+    - make_key(): Builds the cache key for a dataset/tokenizer/length combination.
+    - load(), save(): Read or write a cached dataset.
+    - get_or_preprocess(): Returns the cached dataset or runs preprocess() and stores its result.
+    - stats(): Returns hits, misses, bytes saved and the size on disk.
+    - clear(): Removes every cached entry.
+    - trainer_class(): Returns a span_marker Trainer subclass that preprocesses through this cache.
+    """
+
+    def __init__(self, cache_dir, enabled=True):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def tokenizer_hash(tokenizer):
+        # SpanMarkerTokenizer wraps the Hugging Face tokenizer in .tokenizer
+        tokenizer = getattr(tokenizer, "tokenizer", tokenizer)
+        digest = hashlib.sha256(type(tokenizer).__name__.encode("utf-8"))
+        backend = getattr(tokenizer, "backend_tokenizer", None)
+        if backend is not None:
+            digest.update(backend.to_str().encode("utf-8"))
+        else:
+            digest.update(json.dumps(tokenizer.get_vocab(), sort_keys=True).encode("utf-8"))
+        digest.update(json.dumps(getattr(tokenizer, "init_kwargs", {}), sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def dataset_fingerprint(dataset):
+        fingerprint = getattr(dataset, "_fingerprint", None)
+        if fingerprint is None:
+            raise ValueError("Only datasets.Dataset objects with a fingerprint can be cached")
+        return fingerprint
+
+    def make_key(self, dataset, tokenizer, model_max_length, marker_max_length, **extra):
+        parts = {
+            "dataset": self.dataset_fingerprint(dataset),
+            "tokenizer": self.tokenizer_hash(tokenizer),
+            "model_max_length": model_max_length,
+            "marker_max_length": marker_max_length,
+        }
+        parts.update(extra)
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32]
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    @staticmethod
+    def folder_size(path):
+        total = 0
+        for root, _, files in os.walk(path):
+            for file_name in files:
+                total += os.path.getsize(os.path.join(root, file_name))
+        return total
+
+    def load(self, key):
+        from datasets import load_from_disk
+
+        path = self.entry_path(key)
+        if not self.enabled or not os.path.isdir(path):
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            dataset = load_from_disk(path)
+        except Exception as e:
+            logging.warning("PreprocessCache: dropping unreadable entry %s: %s", key, str(e))
+            shutil.rmtree(path, ignore_errors=True)
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += self.folder_size(path)
+        return dataset
+
+    def save(self, key, dataset):
+        if not self.enabled:
+            return
+        path = self.entry_path(key)
+        temporary_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            dataset.save_to_disk(temporary_path)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            os.replace(temporary_path, path)
+        except Exception as e:
+            logging.warning("PreprocessCache: could not store entry %s: %s", key, str(e))
+            shutil.rmtree(temporary_path, ignore_errors=True)
+
+    def get_or_preprocess(self, key, preprocess):
+        dataset = self.load(key)
+        if dataset is not None:
+            logging.info("PreprocessCache: reusing preprocessed samples %s", key)
+            return dataset
+        dataset = preprocess()
+        self.save(key, dataset)
+        return dataset
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytes_saved": self.bytes_saved,
+                "entries": len([name for name in os.listdir(self.cache_dir) if ".tmp-" not in name]),
+                "disk_bytes": self.folder_size(self.cache_dir),
+            }
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def trainer_class(self):
+        """
+        Returns a span_marker Trainer subclass whose preprocess_dataset goes through this cache,
+        so repeated training and evaluation runs from the NER GUI skip preprocessing entirely.
+        """
+        from span_marker import Trainer
+
+        cache = self
+
+        class CachedSpanMarkerTrainer(Trainer):
+            def preprocess_dataset(self, dataset, label_normalizer, tokenizer, dataset_name="train", is_evaluate=False):
+                config = self.model.config
+                try:
+                    key = cache.make_key(dataset, tokenizer,
+                                         getattr(config, "model_max_length", None),
+                                         getattr(config, "marker_max_length", None),
+                                         entity_max_length=getattr(config, "entity_max_length", None),
+                                         label2id=getattr(config, "label2id", None),
+                                         dataset_name=dataset_name,
+                                         is_evaluate=is_evaluate)
+                except ValueError:
+                    return Trainer.preprocess_dataset(self, dataset, label_normalizer, tokenizer, dataset_name, is_evaluate)
+                return cache.get_or_preprocess(
+                    key,
+                    lambda: Trainer.preprocess_dataset(self, dataset, label_normalizer, tokenizer, dataset_name, is_evaluate))
+
+        return CachedSpanMarkerTrainer
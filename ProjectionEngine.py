@@ -0,0 +1,278 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+
+import numpy as np
+
+
+class EmbeddingStore:
+    """
+    A growable NumPy memmap of embeddings with the sample id of each row, stored in one folder:
+    embeddings.f32 (capacity x dim), projection.f32 (capacity x 2), ids.jsonl and meta.json.
+    Rows are only appended, so earlier rows and their projections stay valid when samples are added.
+    Ids are appended to ids.jsonl one JSON value per line, and meta.json (whose count is the number of
+    valid rows) is written once per batch of appends, so adding rows costs the same at any store size.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self.meta_path = os.path.join(folder, "meta.json")
+        self.ids_path = os.path.join(folder, "ids.jsonl")
+        self.meta = {"count": 0, "dim": None, "capacity": 0, "projected": 0}
+        self.ids = []
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as meta_file:
+                self.meta = json.load(meta_file)
+            self.ids = self._read_ids()
+        self.id_to_row = {sample_id: row for row, sample_id in enumerate(self.ids)}
+
+    def _read_ids(self):
+        legacy_path = os.path.join(self.folder, "ids.json")
+        if not os.path.exists(self.ids_path) and os.path.exists(legacy_path):
+            # Stores written before ids.jsonl kept every id in one JSON list
+            with open(legacy_path, "r", encoding="utf-8") as ids_file:
+                ids = json.load(ids_file)[:self.count]
+            self._rewrite_ids(ids)
+            os.remove(legacy_path)
+            return ids
+        ids = []
+        if os.path.exists(self.ids_path):
+            with open(self.ids_path, "r", encoding="utf-8") as ids_file:
+                ids = [json.loads(line) for line in ids_file if line.strip()]
+        if len(ids) != self.count:
+            # Ids appended after the last meta.json write belong to rows that are not valid; drop them so the
+            # next append lines up with the count again
+            ids = ids[:self.count]
+            self.meta["count"] = len(ids)
+            self._rewrite_ids(ids)
+        return ids
+
+    def _rewrite_ids(self, ids):
+        temporary_path = self.ids_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as ids_file:
+            ids_file.writelines(json.dumps(sample_id) + "\n" for sample_id in ids)
+        os.replace(temporary_path, self.ids_path)
+
+    @staticmethod
+    def plain_id(sample_id):
+        """NumPy scalars (a DataFrame index) are stored as the equivalent Python value."""
+        return sample_id.item() if hasattr(sample_id, "item") else sample_id
+
+    @property
+    def count(self):
+        return self.meta["count"]
+
+    def _open(self, name, columns, mode="r+"):
+        path = os.path.join(self.folder, name)
+        return np.memmap(path, dtype=np.float32, mode=mode, shape=(self.meta["capacity"], columns))
+
+    def embeddings(self):
+        if not self.count:
+            return np.empty((0, self.meta["dim"] or 0), dtype=np.float32)
+        return self._open("embeddings.f32", self.meta["dim"], "r")[:self.count]
+
+    def projection(self):
+        if not self.meta["projected"]:
+            return np.empty((0, 2), dtype=np.float32)
+        return self._open("projection.f32", 2, "r")[:self.meta["projected"]]
+
+    def _grow(self, needed):
+        capacity = max(1024, self.meta["capacity"])
+        while capacity < needed:
+            capacity *= 2
+        if capacity == self.meta["capacity"]:
+            return
+        for name, columns in (("embeddings.f32", self.meta["dim"]), ("projection.f32", 2)):
+            path = os.path.join(self.folder, name)
+            # Extending the file keeps existing rows in place; the new tail reads as zeros
+            with open(path, "ab") as data_file:
+                data_file.truncate(capacity * columns * 4)
+        self.meta["capacity"] = capacity
+
+    def append(self, sample_ids, embeddings, save=True):
+        """
+        Adds rows for sample_ids. With save=False meta.json is not written; call save_meta() after the
+        last append of a batch.
+        """
+        sample_ids = [self.plain_id(sample_id) for sample_id in sample_ids]
+        # Serialised before any state changes, so an id that is not JSON-serialisable leaves the store as it was
+        id_lines = "".join(json.dumps(sample_id) + "\n" for sample_id in sample_ids)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if len(embeddings) != len(sample_ids):
+            raise ValueError(f"{len(sample_ids)} sample ids for {len(embeddings)} embeddings")
+        if self.meta["dim"] is None:
+            self.meta["dim"] = int(embeddings.shape[1])
+        start = self.count
+        self._grow(start + len(embeddings))
+        data = self._open("embeddings.f32", self.meta["dim"])
+        data[start:start + len(embeddings)] = embeddings
+        data.flush()
+        with open(self.ids_path, "a", encoding="utf-8") as ids_file:
+            ids_file.write(id_lines)
+        for offset, sample_id in enumerate(sample_ids):
+            self.id_to_row[sample_id] = start + offset
+        self.ids.extend(sample_ids)
+        self.meta["count"] = start + len(embeddings)
+        if save:
+            self.save_meta()
+
+    def write_projection(self, start, points):
+        data = self._open("projection.f32", 2)
+        data[start:start + len(points)] = np.asarray(points, dtype=np.float32)
+        data.flush()
+        self.meta["projected"] = start + len(points)
+        self.save_meta()
+
+    def save_meta(self):
+        temporary_path = self.meta_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as output_file:
+            json.dump(self.meta, output_file)
+        os.replace(temporary_path, self.meta_path)
+
+
+class ProjectionEngine:
+    """
+    ProjectionEngine Class Description:
+
+    Computes and persists the 2-D UMAP projections shown in the Dash views. For every (dataset, model)
+    fingerprint it keeps an EmbeddingStore and the fitted UMAP reducer on disk, so reloading a dataset
+    or resetting a pipeline no longer recomputes the projection:
+    - embed() only runs the model on samples whose ids are not stored yet, in batches of batch_size.
+    - project() fits UMAP once (on at most max_fit_points rows) and projects every later row with
+      transform() instead of refitting.
+    Embeddings and projections live in NumPy memmaps, so million-point datasets are not held in RAM.
+
+    Attributes:
+    - cache_dir (str): Folder holding one sub-folder per fingerprint.
+    - batch_size (int): Number of samples passed to the embedding function at once.
+    - max_fit_points (int): Upper bound on the rows used to fit the reducer.
+
+    Methods:
+    - fingerprint(): Builds the key for a dataset and model identity.
+    - embed(): Adds embeddings for new samples.
+    - project(): Returns the projection of every stored sample, fitting or transforming as needed.
+    - invalidate(): Deletes the stored embeddings and reducer for a fingerprint.
+    - text_embedder(): Returns an embedding function for a transformers model and tokenizer.
+    """
+
+    def __init__(self, cache_dir, batch_size=64, max_fit_points=50000, transform_chunk=20000):
+        self.cache_dir = cache_dir
+        self.batch_size = batch_size
+        self.max_fit_points = max_fit_points
+        self.transform_chunk = transform_chunk
+        self._stores = {}
+        self._lock = threading.RLock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(dataset_identity, model_identity, **parameters):
+        """
+        dataset_identity and model_identity can be paths (their modification time is included),
+        Hugging Face ids, or a datasets.Dataset (its fingerprint is used).
+        """
+        def identity(value):
+            if hasattr(value, "_fingerprint"):
+                return value._fingerprint
+            if isinstance(value, str) and os.path.exists(value):
+                return f"{os.path.abspath(value)}@{os.path.getmtime(value)}"
+            return str(value)
+
+        parts = {"dataset": identity(dataset_identity), "model": identity(model_identity)}
+        parts.update(parameters)
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32]
+
+    def store(self, key):
+        with self._lock:
+            if key not in self._stores:
+                self._stores[key] = EmbeddingStore(os.path.join(self.cache_dir, key))
+            return self._stores[key]
+
+    def embed(self, key, sample_ids, samples, embed_function):
+        """
+        Runs embed_function (a batch of samples -> array of shape (batch, dim)) on the samples whose ids
+        are not in the store yet.
+
+        :return: The number of newly embedded samples.
+        """
+        store = self.store(key)
+        new_ids, new_samples = [], []
+        for sample_id, sample in zip(sample_ids, samples):
+            sample_id = store.plain_id(sample_id)
+            if sample_id not in store.id_to_row:
+                new_ids.append(sample_id)
+                new_samples.append(sample)
+        try:
+            for start in range(0, len(new_samples), self.batch_size):
+                batch = new_samples[start:start + self.batch_size]
+                store.append(new_ids[start:start + self.batch_size], embed_function(batch), save=False)
+        finally:
+            if new_ids:
+                store.save_meta()  # Once per call; rows appended before a failure are kept
+        if new_ids:
+            logging.info("ProjectionEngine: embedded %d new samples for %s", len(new_ids), key)
+        return len(new_ids)
+
+    def reducer_path(self, key):
+        return os.path.join(self.cache_dir, key, "umap.joblib")
+
+    def project(self, key, n_neighbors=15, min_dist=0.1, random_state=42):
+        """
+        Returns an (n, 2) memmap with the projection of every stored sample, in store order.
+        """
+        import joblib
+
+        store = self.store(key)
+        if not store.count:
+            return store.projection()
+        reducer_path = self.reducer_path(key)
+
+        if os.path.exists(reducer_path):
+            reducer = joblib.load(reducer_path)
+        else:
+            import umap
+
+            embeddings = store.embeddings()
+            fit_rows = np.arange(store.count)
+            if store.count > self.max_fit_points:
+                fit_rows = np.sort(np.random.default_rng(random_state).choice(store.count, self.max_fit_points,
+                                                                              replace=False))
+            reducer = umap.UMAP(n_neighbors=n_neighbors, min_dist=min_dist, random_state=random_state)
+            reducer.fit(np.asarray(embeddings[fit_rows]))
+            joblib.dump(reducer, reducer_path)
+            store.meta["projected"] = 0
+            logging.info("ProjectionEngine: fitted UMAP on %d samples for %s", len(fit_rows), key)
+
+        embeddings = store.embeddings()
+        for start in range(store.meta["projected"], store.count, self.transform_chunk):
+            chunk = np.asarray(embeddings[start:start + self.transform_chunk])
+            store.write_projection(start, reducer.transform(chunk))
+        return store.projection()
+
+    def invalidate(self, key):
+        import shutil
+
+        with self._lock:
+            self._stores.pop(key, None)
+            shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+
+    @staticmethod
+    def text_embedder(model, tokenizer, max_length=256):
+        """
+        Returns a function that mean-pools the last hidden state of a transformers model over a batch of texts.
+        """
+        import torch
+
+        def embed(texts):
+            encoded = tokenizer(list(texts), padding=True, truncation=True, max_length=max_length, return_tensors="pt")
+            encoded = {name: tensor.to(model.device) for name, tensor in encoded.items()}
+            with torch.no_grad():
+                outputs = model(**encoded, output_hidden_states=True)
+            hidden = outputs.hidden_states[-1]
+            mask = encoded["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+            return pooled.float().cpu().numpy()
+
+        return embed
@@ -0,0 +1,234 @@
+import os
+import sys
+import json
+import struct
+import logging
+import threading
+from collections import OrderedDict
+
+from FileIdentity import path_signature
+from PerformanceMonitor import span
+
+# safetensors dtype -> (numpy dtype the bytes are read as, torch dtype name the tensor is viewed as).
+# bfloat16 is read as int16: numpy has no bfloat16, and torch.from_numpy does not accept uint16 before 2.3
+SAFETENSORS_DTYPES = {
+    "F64": ("float64", "float64"), "F32": ("float32", "float32"), "F16": ("float16", "float16"),
+    "BF16": ("int16", "bfloat16"), "I64": ("int64", "int64"), "I32": ("int32", "int32"),
+    "I16": ("int16", "int16"), "I8": ("int8", "int8"), "U8": ("uint8", "uint8"), "BOOL": ("bool", "bool"),
+}
+
+
+def mmap_safetensors(path):
+    """
+    Returns the tensors of a .safetensors file as views of one copy-on-write memory map of the file. Pages
+    are read from disk on first access and, as long as they are not written to, shared through the OS page
+    cache with every other process mapping the same file.
+    """
+    import numpy as np
+    import torch
+
+    with open(path, "rb") as checkpoint_file:
+        header_size = struct.unpack("<Q", checkpoint_file.read(8))[0]
+        header = json.loads(checkpoint_file.read(header_size))
+    mapped = np.memmap(path, dtype=np.uint8, mode="c")
+    data_start = 8 + header_size
+    state_dict = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        numpy_dtype, torch_dtype = SAFETENSORS_DTYPES[info["dtype"]]
+        begin, end = info["data_offsets"]
+        array = mapped[data_start + begin:data_start + end].view(numpy_dtype).reshape(info["shape"])
+        state_dict[name] = torch.from_numpy(array).view(getattr(torch, torch_dtype))
+    return state_dict
+
+
+class ResourceCache:
+    """
+    ResourceCache Class Description:
+
+    A process-level cache for loaded models, tokenizers and state dicts. TaskLoaders.load_task_model loads
+    through it when it is given one, so a checkpoint that is asked for again in the same process is not read
+    from disk again.
+
+    Entries are keyed by (kind, variant, normalised path, revision, dtype), where variant names the loader (a
+    model class, "timm"), so the same folder loaded as two different model classes is cached twice. The
+    signature of the path (see FileIdentity.path_signature: the weight files and config.json of a checkpoint
+    folder, the size and mtime of a file) is stored with each entry, and an entry whose files have changed
+    on disk is dropped on the next lookup.
+
+    Entries are kept in least-recently-used order; when the estimated size of all entries goes over
+    ram_budget_mb the oldest ones are evicted. Concurrent get_or_load calls for the same key wait for the
+    first one, so a checkpoint requested by two threads at once is only deserialised once.
+
+    Attributes:
+    - ram_budget_mb (int): Memory budget for all cached objects. 0 disables eviction.
+    - mmap_safetensors (bool): Whether load_safetensors memory-maps the checkpoint (see mmap_safetensors())
+      instead of reading it into memory.
+    - hits, misses, evictions (int): Lookup and eviction counters.
+
+    Methods:
+    - get(): Returns a cached object or None.
+    - put(): Stores an object and evicts older entries if the budget is exceeded.
+    - get_or_load(): Returns the cached object, calling loader(path) on a miss.
+    - load_safetensors(): Loads a .safetensors state dict through the cache.
+    - invalidate(): Drops entries by kind, path or both (everything when called without arguments).
+    - paths(): Returns the cached paths for a kind.
+    - stats(): Returns the counters and current memory use.
+    """
+
+    DEFAULT_RAM_BUDGET_MB = 4096
+
+    def __init__(self, ram_budget_mb=DEFAULT_RAM_BUDGET_MB, mmap_safetensors=True):
+        self.ram_budget_mb = ram_budget_mb
+        self.mmap_safetensors = mmap_safetensors
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._loading = {}  # key -> Lock held while that key is being loaded
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalise_path(path):
+        return os.path.normcase(os.path.abspath(path)) if path and os.path.exists(path) else path
+
+    @staticmethod
+    def estimate_size(value):
+        """
+        Estimates the resident size of a cached object in bytes. Torch modules and state dicts are
+        measured from their tensors, dataframes from their columns; anything else falls back to getsizeof.
+        """
+        if hasattr(value, "parameters") and hasattr(value, "buffers"):
+            tensors = list(value.parameters()) + list(value.buffers())
+            return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+        if isinstance(value, dict) and value and all(hasattr(v, "element_size") for v in value.values()):
+            return sum(tensor.numel() * tensor.element_size() for tensor in value.values())
+        if hasattr(value, "memory_usage"):
+            return int(value.memory_usage(index=True).sum())
+        if hasattr(value, "nbytes"):
+            return int(value.nbytes)
+        return sys.getsizeof(value)
+
+    def _key(self, kind, path, revision=None, dtype=None, variant=None):
+        return kind, variant, self.normalise_path(path), revision, str(dtype) if dtype is not None else None
+
+    def _lookup(self, key, path):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["signature"] != path_signature(path):
+                logging.info("ResourceCache: %s changed on disk, dropping cached %s", path, key[0])
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry["value"]
+
+    def _count(self, value):
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def get(self, kind, path, revision=None, dtype=None, variant=None):
+        with self._lock:
+            return self._count(self._lookup(self._key(kind, path, revision, dtype, variant), path))
+
+    def put(self, kind, path, value, revision=None, dtype=None, variant=None):
+        key = self._key(kind, path, revision, dtype, variant)
+        with self._lock:
+            self._entries[key] = {"value": value, "signature": path_signature(path),
+                                  "size": self.estimate_size(value)}
+            self._entries.move_to_end(key)
+            self._evict(keep=key)
+        return value
+
+    def get_or_load(self, kind, path, loader, revision=None, dtype=None, variant=None):
+        key = self._key(kind, path, revision, dtype, variant)
+        with self._lock:
+            value = self._lookup(key, path)
+            if value is not None:
+                return self._count(value)
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            # Another thread may have loaded it while this one waited
+            with self._lock:
+                value = self._count(self._lookup(key, path))
+            if value is not None:
+                return value
+            try:
+                with span("load", "load", kind=kind, path=path):
+                    loaded = loader(path)
+                with self._lock:
+                    # The entry is in place before the key lock is dropped, so a caller arriving in between
+                    # finds one or the other and never loads a second copy
+                    value = self.put(kind, path, loaded, revision, dtype, variant)
+                    self._release(key, key_lock)
+            except BaseException:
+                with self._lock:
+                    self._release(key, key_lock)
+                raise
+        return value
+
+    def _release(self, key, key_lock):
+        if self._loading.get(key) is key_lock:
+            del self._loading[key]
+
+    def load_safetensors(self, path, device="cpu", revision=None, dtype=None):
+        """
+        Loads a .safetensors checkpoint into a state dict through the cache. With mmap_safetensors (and
+        device "cpu", no dtype conversion) the tensors are views of a copy-on-write memory map of the file,
+        so only the pages that are used are read and the OS shares them between processes. Otherwise the
+        file is read into memory with safetensors' load_file.
+        """
+        def loader(checkpoint_path):
+            from safetensors.torch import load_file
+
+            if self.mmap_safetensors and device == "cpu" and dtype is None:
+                return mmap_safetensors(checkpoint_path)
+            state_dict = load_file(checkpoint_path, device=device)
+            if dtype is not None:
+                state_dict = {name: tensor.to(dtype) for name, tensor in state_dict.items()}
+            return state_dict
+
+        return self.get_or_load("state_dict", path, loader, revision, dtype)
+
+    def _evict(self, keep=None):
+        if not self.ram_budget_mb:
+            return
+        budget = self.ram_budget_mb * 1024 * 1024
+        while len(self._entries) > 1 and self.memory_used() > budget:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            logging.info("ResourceCache: evicting %s %s to stay within %d MB", oldest[0], oldest[2], self.ram_budget_mb)
+            del self._entries[oldest]
+            self.evictions += 1
+
+    def memory_used(self):
+        with self._lock:
+            return sum(entry["size"] for entry in self._entries.values())
+
+    def invalidate(self, kind=None, path=None):
+        normalised = self.normalise_path(path) if path is not None else None
+        with self._lock:
+            for key in list(self._entries):
+                if (kind is None or key[0] == kind) and (normalised is None or key[2] == normalised):
+                    del self._entries[key]
+
+    def paths(self, kind):
+        with self._lock:
+            return [key[2] for key in self._entries if key[0] == kind]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "memory_used_mb": round(self.memory_used() / (1024 * 1024), 1),
+                "ram_budget_mb": self.ram_budget_mb,
+            }
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import shutil
+import logging
+
+from PyQt6.QtWidgets import QAbstractItemView
+
+from FileIdentity import folder_files
+
+FORMAT_VERSION = 3  # 2: folder identities use the files in the folder; 3: no arrays, id2label call saved
+MAX_SAVED_SELECTION = 1000
+
+
+def path_identity(path):
+    """
+    Identifies a loaded model or dataset: a local file with its size and modification time, a folder by the
+    size and mtime of its files, or a Hub id. A snapshot is only reused for a path whose identity is unchanged.
+
+    For a checkpoint folder only the weight files and config.json count, so retraining into the same folder
+    invalidates the saved label map and positions while files written next to the weights do not. Other folders
+    (datasets) use their top-level entries.
+    """
+    if not path:
+        return None
+    if not os.path.exists(path):
+        return {"path": path, "local": False}
+    if os.path.isdir(path):
+        return {"path": path, "local": True, "files": folder_files(path)}
+    stat = os.stat(path)
+    return {"path": path, "local": True, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def identity_matches(identity):
+    if identity is None:
+        return False
+    if not identity.get("local"):
+        return not os.path.exists(identity["path"])
+    return path_identity(identity["path"]) == identity
+
+
+def view_states(widget):
+    """
+    Scroll positions, current cell and selected rows of every item view (tables, lists, trees) in widget,
+    keyed by object name, or by class name and position for views without one.
+    """
+    states = {}
+    for number, view in enumerate(widget.findChildren(QAbstractItemView)):
+        model = view.model()
+        if model is None:
+            continue
+        current = view.currentIndex()
+        selection = view.selectionModel()
+        selected = sorted({index.row() for index in selection.selectedIndexes()}) if selection is not None else []
+        states[view.objectName() or f"{type(view).__name__}#{number}"] = {
+            "scroll": view.verticalScrollBar().value(),
+            "hscroll": view.horizontalScrollBar().value(),
+            "current": [current.row(), current.column()] if current.isValid() else None,
+            "selected": selected[:MAX_SAVED_SELECTION],
+        }
+    return states
+
+
+def apply_view_states(widget, states):
+    """
+    Restores what view_states saved. Views whose model has fewer rows than the saved position (data not
+    loaded yet, or a different dataset) are left as they are.
+
+    :return: The number of views restored.
+    """
+    restored = 0
+    for number, view in enumerate(widget.findChildren(QAbstractItemView)):
+        state = states.get(view.objectName() or f"{type(view).__name__}#{number}")
+        model = view.model()
+        if state is None or model is None:
+            continue
+        rows = model.rowCount()
+        if state["current"] is not None and state["current"][0] < rows:
+            view.setCurrentIndex(model.index(*state["current"]))
+        selection = view.selectionModel()
+        if selection is not None:
+            for row in state["selected"]:
+                if row < rows:
+                    selection.select(model.index(row, 0), selection.SelectionFlag.Select |
+                                     selection.SelectionFlag.Rows)
+        view.verticalScrollBar().setValue(state["scroll"])
+        view.horizontalScrollBar().setValue(state["hscroll"])
+        restored += 1
+    return restored
+
+
+class SessionSnapshot:
+    """
+    SessionSnapshot Class Description:
+
+    Saves where the user was when the application closed and hands it back on the next launch. The snapshot
+    is one folder holding session.json: the format version, the active task and, per task, the model and
+    dataset identities, the id2label map with the observer call that delivered it, and the item view
+    positions. It is small enough to read before the first window is shown.
+
+    The file is written to a temporary name and renamed, so a crash while saving leaves the previous
+    snapshot intact. A snapshot with another format version is ignored.
+
+    Attributes:
+    - folder (str): The snapshot folder, $APPDATA/Gantrithor/data/session.
+
+    Methods:
+    - save(): Writes the session.
+    - load(): Returns the saved session, or None.
+    - clear(): Deletes the snapshot.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.session_path = os.path.join(folder, "session.json")
+
+    def save(self, session):
+        """
+        :param session: {"active_task": ..., "tasks": {task name: JSON-serialisable state}}.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        header = dict(session, format=FORMAT_VERSION, saved=time.strftime("%Y-%m-%dT%H:%M:%S"))
+        with open(self.session_path + ".tmp", "w", encoding="utf-8") as session_file:
+            json.dump(header, session_file)
+        os.replace(self.session_path + ".tmp", self.session_path)
+
+    def load(self):
+        if not os.path.exists(self.session_path):
+            return None
+        try:
+            with open(self.session_path, "r", encoding="utf-8") as session_file:
+                session = json.load(session_file)
+        except (OSError, ValueError):
+            logging.warning("Session snapshot %s is unreadable, starting a new session", self.session_path)
+            return None
+        if session.get("format") != FORMAT_VERSION:
+            logging.info("Session snapshot has format %s, expected %s; starting a new session",
+                         session.get("format"), FORMAT_VERSION)
+            return None
+        return session
+
+    def clear(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
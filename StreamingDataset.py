@@ -0,0 +1,164 @@
+import io
+import os
+import time
+import logging
+import threading
+
+
+class ArrowPager:
+    """
+    Random-access pages over a memory-mapped Arrow table, used by the table views instead of a fully
+    materialised pandas dataframe. Local datasets saved with save_to_disk, Arrow files and Parquet files are
+    opened without reading their rows; rows are converted to Python only for the page that is shown.
+    Image columns are returned undecoded (path or bytes) and decoded by decode_image when displayed.
+    """
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.column_names = list(dataset.column_names)
+        self.image_columns = [name for name, feature in dataset.features.items()
+                              if type(feature).__name__ == "Image"]
+        if self.image_columns:
+            from datasets import Image
+
+            for column in self.image_columns:
+                self.dataset = self.dataset.cast_column(column, Image(decode=False))
+
+    @property
+    def row_count(self):
+        return len(self.dataset)
+
+    def is_complete(self):
+        return True
+
+    def page(self, start, count):
+        end = min(start + count, self.row_count)
+        if start >= end:
+            return []
+        columns = self.dataset[start:end]
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+
+class StreamingPager:
+    """
+    Pages over a Hugging Face IterableDataset (streaming=True). Rows are pulled from the stream only as far
+    as the requested page and kept, so scrolling back does not refetch them. row_count is the number of rows
+    fetched so far until the stream is exhausted.
+    """
+
+    def __init__(self, iterable_dataset, max_buffered_rows=None):
+        self.iterable_dataset = iterable_dataset
+        self.max_buffered_rows = max_buffered_rows
+        self.column_names = list(iterable_dataset.column_names or [])
+        self.image_columns = []
+        features = getattr(iterable_dataset, "features", None) or {}
+        for name, feature in features.items():
+            if type(feature).__name__ == "Image":
+                self.image_columns.append(name)
+        if self.image_columns:
+            from datasets import Image
+
+            for column in self.image_columns:
+                self.iterable_dataset = self.iterable_dataset.cast_column(column, Image(decode=False))
+        self._iterator = iter(self.iterable_dataset)
+        self._rows = []
+        self._exhausted = False
+        self._lock = threading.Lock()
+
+    @property
+    def row_count(self):
+        return len(self._rows)
+
+    def is_complete(self):
+        return self._exhausted
+
+    def _fill(self, end):
+        while not self._exhausted and len(self._rows) < end:
+            if self.max_buffered_rows is not None and len(self._rows) >= self.max_buffered_rows:
+                break
+            try:
+                row = next(self._iterator)
+            except StopIteration:
+                self._exhausted = True
+                break
+            if not self.column_names:
+                self.column_names = list(row)
+            self._rows.append(row)
+
+    def page(self, start, count):
+        with self._lock:
+            self._fill(start + count)
+            return self._rows[start:start + count]
+
+
+def decode_image(value, thumbnail_size=None):
+    """
+    Decodes an undecoded image cell ({"path": ..., "bytes": ...}, a path, or raw bytes) into a PIL image,
+    optionally reduced to thumbnail_size. Called by the views only for rows scrolled into view.
+    """
+    from PIL import Image
+
+    if isinstance(value, dict):
+        value = value.get("bytes") or value.get("path")
+    image = Image.open(io.BytesIO(value)) if isinstance(value, (bytes, bytearray)) else Image.open(value)
+    if thumbnail_size is not None:
+        image.draft("RGB", thumbnail_size)  # Lets JPEG decode at a reduced scale
+        image.thumbnail(thumbnail_size)
+    return image
+
+
+def download_hub_dataset(repo_id, cache_dir, revision=None, retries=5, backoff_seconds=2.0, token=None):
+    """
+    Downloads a dataset repository from the Hugging Face Hub into cache_dir. Partially downloaded files are
+    resumed on the next attempt instead of being fetched again, and failures are retried with exponential
+    backoff.
+
+    :return: The local folder holding the snapshot.
+    """
+    from huggingface_hub import snapshot_download
+
+    if not repo_id:
+        raise ValueError("No Hugging Face Hub dataset id was given")
+    for attempt in range(1, retries + 1):
+        try:
+            return snapshot_download(repo_id=repo_id, repo_type="dataset", revision=revision, cache_dir=cache_dir,
+                                     resume_download=True, token=token)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            wait_seconds = backoff_seconds * 2 ** (attempt - 1)
+            logging.warning("Hub download of %s failed (attempt %d/%d): %s; resuming in %.0f s",
+                            repo_id, attempt, retries, str(e), wait_seconds)
+            time.sleep(wait_seconds)
+
+
+def open_dataset(source, split="train", streaming=False, cache_dir=None, name=None, **hub_options):
+    """
+    Opens a dataset for paged display without materialising it into a dataframe.
+
+    - A folder written by save_to_disk, an .arrow file or a .parquet file is memory-mapped (ArrowPager).
+    - A Hugging Face Hub id with streaming=True is read as a stream (StreamingPager).
+    - A Hub id without streaming is downloaded resumably into cache_dir and then memory-mapped.
+    """
+    import datasets
+
+    if not source:
+        raise ValueError("No dataset path or Hugging Face Hub id was given")
+
+    saved_markers = ("dataset_info.json", "dataset_dict.json")
+    if os.path.isdir(source) and any(os.path.exists(os.path.join(source, marker)) for marker in saved_markers):
+        dataset = datasets.load_from_disk(source)
+        if isinstance(dataset, datasets.DatasetDict):
+            dataset = dataset[split]
+        return ArrowPager(dataset)
+    if os.path.isfile(source) and source.endswith(".arrow"):
+        return ArrowPager(datasets.Dataset.from_file(source))
+    if os.path.isfile(source) and source.endswith(".parquet"):
+        return ArrowPager(datasets.load_dataset("parquet", data_files=source, split="train", cache_dir=cache_dir))
+
+    if streaming:
+        return StreamingPager(datasets.load_dataset(source, name, split=split, streaming=True, **hub_options))
+
+    local_path = download_hub_dataset(source, cache_dir, revision=hub_options.pop("revision", None),
+                                      token=hub_options.pop("token", None))
+    return ArrowPager(datasets.load_dataset(local_path, name, split=split, cache_dir=cache_dir, **hub_options))
@@ -0,0 +1,213 @@
+import os
+import json
+import importlib.util
+
+# Hub id prefixes of models published by timm; local timm checkpoints are recognised by their config.json
+TIMM_HUB_PREFIXES = ("timm/", "hf-hub:", "hf_hub:")
+
+
+def checkpoint_config(model_path):
+    """
+    :return: The config.json of a local checkpoint folder, or {} for Hub ids and folders without one.
+    """
+    config_path = os.path.join(model_path, "config.json")
+    if not os.path.isfile(config_path):
+        return {}
+    with open(config_path, "r", encoding="utf-8") as config_file:
+        return json.load(config_file)
+
+
+def is_timm_checkpoint(model_path):
+    """
+    timm writes "architecture" (a timm model name) to config.json, transformers writes "model_type" and
+    "architectures", so the two are told apart without importing either library.
+    """
+    if os.path.isdir(model_path):
+        config = checkpoint_config(model_path)
+        return "architecture" in config and "model_type" not in config
+    return model_path.startswith(TIMM_HUB_PREFIXES)
+
+
+def model_id2label(model):
+    """
+    The id2label map of a loaded model with int keys: the config's id2label for transformers models, the
+    label_names of the pretrained config for timm models (class indices when the checkpoint has none).
+    """
+    config = getattr(model, "config", None)
+    if config is not None and getattr(config, "id2label", None):
+        return {int(key): label for key, label in config.id2label.items()}
+    pretrained_cfg = getattr(model, "pretrained_cfg", None) or {}
+    label_names = pretrained_cfg.get("label_names")
+    if label_names:
+        return dict(enumerate(label_names))
+    return {index: str(index) for index in range(getattr(model, "num_classes", 0))}
+
+
+def bundled_loader(from_pretrained):
+    """
+    Wraps a transformers from_pretrained so that a checkpoint whose model family is not in the build (Main.spec
+    bundles only some transformers.models packages) fails with an error naming the family, instead of an
+    ImportError from inside transformers.
+    """
+
+    def load(model_path):
+        try:
+            return from_pretrained(model_path)
+        except (ImportError, KeyError, ValueError) as error:
+            model_type = checkpoint_config(model_path).get("model_type") if os.path.isdir(model_path) else None
+            if not model_type:
+                raise
+            family = model_type.replace("-", "_")
+            try:
+                bundled = importlib.util.find_spec(f"transformers.models.{family}") is not None
+            except ImportError:
+                bundled = False
+            if bundled:
+                raise
+            raise RuntimeError(f"{model_path} is a '{model_type}' model, but the transformers model family "
+                               f"'{family}' is not bundled with this build. Add it to "
+                               f"GANTRITHOR_TRANSFORMERS_MODELS and rebuild with Main.spec.") from error
+
+    return load
+
+
+def _cached(resource_cache, kind, model_path, loader, variant):
+    """
+    variant (the model class, or "timm") is part of the cache key, so one folder loaded as two kinds of model
+    does not return the first one for both.
+    """
+    if resource_cache is None:
+        return loader(model_path)
+    return resource_cache.get_or_load(kind, model_path, loader, variant=variant)
+
+
+def load_timm_model(model_path, resource_cache=None):
+    """
+    Creates a timm model from a checkpoint folder in timm's Hub format (config.json with "architecture",
+    "num_classes", "label_names" and "pretrained_cfg", next to model.safetensors or pytorch_model.bin).
+    The folder is read here rather than through timm's local-dir: scheme, which only exists from timm 1.0
+    on, while the build pins timm 0.9. Hub ids are loaded through hf-hub:, which timm 0.9 supports.
+    """
+    import timm
+    import torch
+
+    if not os.path.isdir(model_path):
+        hub_id = model_path if model_path.startswith(("hf-hub:", "hf_hub:")) else f"hf-hub:{model_path}"
+        return timm.create_model(hub_id, pretrained=True)
+    config = checkpoint_config(model_path)
+    pretrained_cfg = dict(config.get("pretrained_cfg") or {})
+    num_classes = config.get("num_classes", pretrained_cfg.get("num_classes"))
+    model_args = dict(config.get("model_args") or {})
+    if config.get("global_pool"):
+        model_args.setdefault("global_pool", config["global_pool"])
+    model = timm.create_model(config["architecture"], pretrained=False, num_classes=num_classes, **model_args)
+    # The data config (input size, mean, std, crop) and the label names come from the checkpoint
+    pretrained_cfg["architecture"] = config["architecture"]
+    pretrained_cfg["num_classes"] = num_classes
+    if config.get("label_names"):
+        pretrained_cfg["label_names"] = config["label_names"]
+    model.pretrained_cfg = {**(getattr(model, "pretrained_cfg", None) or {}), **pretrained_cfg}
+    model.default_cfg = model.pretrained_cfg
+
+    safetensors_path = os.path.join(model_path, "model.safetensors")
+    if os.path.isfile(safetensors_path) and resource_cache is not None:
+        # assign=True makes the parameters the memory-mapped tensors themselves instead of copies, so the
+        # weights stay in the OS page cache, shared with every other process that maps the checkpoint
+        model.load_state_dict(resource_cache.load_safetensors(safetensors_path), assign=True)
+    elif os.path.isfile(safetensors_path):
+        from safetensors.torch import load_file
+
+        model.load_state_dict(load_file(safetensors_path))
+    else:
+        model.load_state_dict(torch.load(os.path.join(model_path, "pytorch_model.bin"), map_location="cpu"))
+    return model
+
+
+def save_timm_checkpoint(model, folder):
+    """
+    Writes a timm model (label names in model.pretrained_cfg) in the format load_timm_model reads.
+    """
+    from safetensors.torch import save_file
+
+    os.makedirs(folder, exist_ok=True)
+    pretrained_cfg = dict(getattr(model, "pretrained_cfg", None) or {})
+    config = {"architecture": pretrained_cfg.pop("architecture"), "num_classes": model.num_classes,
+              "num_features": model.num_features}
+    if isinstance(getattr(model, "global_pool", None), str) and model.global_pool:
+        config["global_pool"] = model.global_pool
+    if pretrained_cfg.get("label_names"):
+        config["label_names"] = list(pretrained_cfg["label_names"])
+    config["pretrained_cfg"] = pretrained_cfg
+    with open(os.path.join(folder, "config.json"), "w", encoding="utf-8") as config_file:
+        json.dump(config, config_file, indent=2)
+    save_file({name: tensor.contiguous() for name, tensor in model.state_dict().items()},
+              os.path.join(folder, "model.safetensors"))
+
+
+def load_ner_model(model_path, resource_cache=None):
+    from span_marker import SpanMarkerModel
+
+    model = _cached(resource_cache, "model", model_path, SpanMarkerModel.from_pretrained, "SpanMarkerModel")
+    model.eval()
+    return {"model": model, "id2label": model_id2label(model)}
+
+
+def load_text_classifier(model_path, resource_cache=None):
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    tokenizer = _cached(resource_cache, "tokenizer", model_path, bundled_loader(AutoTokenizer.from_pretrained),
+                        "AutoTokenizer")
+    model = _cached(resource_cache, "model", model_path,
+                    bundled_loader(AutoModelForSequenceClassification.from_pretrained),
+                    "AutoModelForSequenceClassification")
+    model.eval()
+    return {"model": model, "tokenizer": tokenizer, "id2label": model_id2label(model)}
+
+
+def load_image_classifier(model_path, resource_cache=None):
+    """
+    Loads a timm checkpoint (the format the app ships and trains) or a transformers image classifier.
+    "transform" maps an RGB PIL image to the model's input tensor (see ImagePipeline.resolve_model_transform).
+    """
+    from ImagePipeline import resolve_model_transform
+
+    framework = "timm" if is_timm_checkpoint(model_path) else "transformers"
+    if framework == "timm":
+        def loader(path):
+            return load_timm_model(path, resource_cache)
+    else:
+        from transformers import AutoModelForImageClassification
+
+        loader = bundled_loader(AutoModelForImageClassification.from_pretrained)
+    model = _cached(resource_cache, "model", model_path, loader,
+                    "timm" if framework == "timm" else "AutoModelForImageClassification")
+    model.eval()
+    transform, input_size = resolve_model_transform(model)
+    return {"model": model, "transform": transform, "input_size": input_size, "id2label": model_id2label(model),
+            "framework": framework}
+
+
+def load_object_detector(model_path, resource_cache=None):
+    from transformers import AutoImageProcessor, AutoModelForObjectDetection
+
+    processor = _cached(resource_cache, "processor", model_path, bundled_loader(AutoImageProcessor.from_pretrained),
+                        "AutoImageProcessor")
+    model = _cached(resource_cache, "model", model_path, bundled_loader(AutoModelForObjectDetection.from_pretrained),
+                    "AutoModelForObjectDetection")
+    model.eval()
+    return {"model": model, "processor": processor, "id2label": model_id2label(model)}
+
+
+TASK_LOADERS = {"ner": load_ner_model, "text": load_text_classifier, "img": load_image_classifier,
+                "obj": load_object_detector}
+
+
+def load_task_model(task_name, model_path, resource_cache=None):
+    """
+    Loads the model of a task the same way for the headless CLI and the inference workers, through a
+    ResourceCache when one is given.
+
+    :return: A dict with "model", "id2label" and the task's preprocessing ("tokenizer", "transform" or
+             "processor").
+    """
+    return TASK_LOADERS[task_name](model_path, resource_cache)
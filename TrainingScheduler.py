@@ -0,0 +1,324 @@
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import logging
+import subprocess
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from TrainingWorker import HEARTBEAT_FILE, JOB_FILE, LOG_FILE, METRICS_FILE, RESULT_FILE, STOP_FILE, TRAINERS
+
+
+class TrainingScheduler(QObject):
+    """
+    TrainingScheduler Class Description:
+
+    Queues fine-tuning runs from the task GUIs and runs each in its own worker process (TrainingWorker),
+    so training survives a pipeline reset, a crash of the GUI or closing the application. Each job lives
+    in a folder under jobs_dir holding its spec (job.json) and the files written by the worker: metrics as
+    JSON lines, a heartbeat and the final result. Workers checkpoint every save_steps and at least every
+    checkpoint_minutes and always resume from the newest checkpoint, so a crash costs minutes of training.
+
+    Progress comes back through metrics.jsonl, which is tailed from a QTimer in the GUI thread; there are
+    no blocking reads or pipes between the processes. On start-up, jobs still marked running are
+    re-attached while their worker process (the saved pid) is alive, and re-queued (to resume) when it died.
+
+    Attributes:
+    - jobs_dir (str): Folder holding one folder per job.
+    - max_concurrent (int): Jobs trained at the same time; 1 chains queued runs one after another.
+    - max_attempts (int): Starts of a job before a crashing worker marks it failed.
+    - task_options (dict): Maps task name to default options for its jobs; options passed to submit() win.
+
+    Signals:
+    - job_state_changed(str, str): Job id and its new status (queued, running, finished, stopped, failed, cancelled).
+    - job_metrics(str, object): Job id and a metrics record (step, epoch, loss, ...).
+
+    Methods:
+    - start(): Re-attaches or re-queues jobs from a previous session and starts polling.
+    - submit(): Queues a training job and returns its id.
+    - stop(): Cancels a queued job or asks a running worker to checkpoint and stop.
+    - resume(): Queues a stopped or failed job again; it continues from its last checkpoint.
+    - jobs(), job(): Return job specs with their status.
+    - metrics(): Returns the metrics received so far for a job.
+    """
+
+    job_state_changed = pyqtSignal(str, str)
+    job_metrics = pyqtSignal(str, object)
+
+    ACTIVE_STATES = ("queued", "running")
+
+    def __init__(self, jobs_dir, max_concurrent=1, max_attempts=3, poll_interval_ms=500, heartbeat_timeout=90,
+                 task_options=None, parent=None):
+        super().__init__(parent)
+        self.jobs_dir = jobs_dir
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_attempts = max_attempts
+        self.task_options = task_options or {}
+        self.heartbeat_timeout = heartbeat_timeout
+        self._jobs = {}
+        self._processes = {}
+        self._metrics_offsets = {}
+        self._metrics = {}
+        self._timer = QTimer(self)
+        self._timer.setInterval(poll_interval_ms)
+        self._timer.timeout.connect(self.poll)
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    # Job files
+
+    def job_dir(self, job_id):
+        return os.path.join(self.jobs_dir, job_id)
+
+    def _save_job(self, job):
+        path = os.path.join(self.job_dir(job["job_id"]), JOB_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as job_file:
+            json.dump(job, job_file, indent=2, default=str)
+        os.replace(path + ".tmp", path)
+
+    def _set_status(self, job, status, **fields):
+        job["status"] = status
+        job.update(fields)
+        self._save_job(job)
+        self.job_state_changed.emit(job["job_id"], status)
+
+    def _read_result(self, job_id):
+        path = os.path.join(self.job_dir(job_id), RESULT_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as result_file:
+            return json.load(result_file)
+
+    def _heartbeat_age(self, job_id):
+        try:
+            return time.time() - os.path.getmtime(os.path.join(self.job_dir(job_id), HEARTBEAT_FILE))
+        except OSError:
+            return None
+
+    @staticmethod
+    def _pid_alive(job):
+        """
+        Whether the worker process saved in the job is still running. A process with the same pid that was
+        created after the job started is a reused pid, not the worker. None when the job has no pid.
+        """
+        import psutil
+
+        if not job.get("pid"):
+            return None
+        try:
+            process = psutil.Process(job["pid"])
+            return process.is_running() and process.status() != psutil.STATUS_ZOMBIE and \
+                process.create_time() <= job.get("started", time.time()) + 1
+        except psutil.NoSuchProcess:
+            return False
+        except psutil.AccessDenied:
+            return True  # Exists, but belongs to another user
+
+    def _worker_gone(self, job):
+        """
+        For a job re-attached from a previous session: the worker is gone when its process is, or, for jobs
+        without a saved pid, when the heartbeat went stale. A live worker with a stale heartbeat (a long
+        evaluation or checkpoint save) is still waited for.
+        """
+        alive = self._pid_alive(job)
+        if alive is not None:
+            if alive:
+                age = self._heartbeat_age(job["job_id"])
+                if age is not None and age > self.heartbeat_timeout:
+                    logging.debug("TrainingScheduler: no heartbeat from %s for %.0f s, its worker is still running",
+                                  job["job_id"], age)
+            return not alive
+        age = self._heartbeat_age(job["job_id"])
+        return age is None or age > self.heartbeat_timeout
+
+    # Public interface
+
+    def start(self):
+        for name in sorted(os.listdir(self.jobs_dir)):
+            path = os.path.join(self.jobs_dir, name, JOB_FILE)
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as job_file:
+                    job = json.load(job_file)
+            except (OSError, ValueError) as e:
+                logging.warning("TrainingScheduler: skipping unreadable job %s: %s", name, str(e))
+                continue
+            self._jobs[job["job_id"]] = job
+            if job["status"] == "running":
+                if self._read_result(job["job_id"]) is None and self._worker_gone(job):
+                    logging.info("TrainingScheduler: worker of %s is gone, resuming from its last checkpoint",
+                                 job["job_id"])
+                    self._set_status(job, "queued")
+                else:
+                    logging.info("TrainingScheduler: re-attached to running job %s", job["job_id"])
+        self._timer.start()
+        self.poll()
+
+    def submit(self, task, model_path, dataset_path, output_dir=None, name=None, **options):
+        """
+        Queues a training job. options are passed to the worker (epochs, batch_size, learning_rate,
+        save_steps, checkpoint_minutes, labels, text_column, label_column, entry_point, preprocess_cache_dir, ...)
+        on top of the scheduler's task_options for the task.
+        Tasks without a built-in trainer (obj) need an entry_point ("module:function"); without one the job
+        is rejected here instead of failing in the worker.
+        """
+        options = dict(self.task_options.get(task, {}), **options)
+        if task not in TRAINERS and not options.get("entry_point"):
+            raise ValueError(f"No built-in trainer for task '{task}'; pass an entry_point option (module:function)")
+        job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        os.makedirs(self.job_dir(job_id))
+        job = {
+            "job_id": job_id,
+            "name": name or f"{task}: {os.path.basename(os.path.normpath(dataset_path))}",
+            "task": task,
+            "model_path": model_path,
+            "dataset_path": dataset_path,
+            "output_dir": output_dir or os.path.join(self.job_dir(job_id), "output"),
+            "options": options,
+            "status": "queued",
+            "attempts": 0,
+            "created": time.time(),
+        }
+        self._jobs[job_id] = job
+        self._save_job(job)
+        self.job_state_changed.emit(job_id, "queued")
+        self.poll()
+        return job_id
+
+    def stop(self, job_id):
+        job = self._jobs[job_id]
+        if job["status"] == "queued":
+            self._set_status(job, "cancelled")
+        elif job["status"] == "running":
+            # The worker checks for this file after every step, saves a checkpoint and exits
+            open(os.path.join(self.job_dir(job_id), STOP_FILE), "w").close()
+
+    def resume(self, job_id):
+        job = self._jobs[job_id]
+        if job["status"] in self.ACTIVE_STATES:
+            return
+        for file_name in (STOP_FILE, RESULT_FILE):
+            path = os.path.join(self.job_dir(job_id), file_name)
+            if os.path.exists(path):
+                os.remove(path)
+        self._set_status(job, "queued", attempts=0)
+        self.poll()
+
+    def remove(self, job_id):
+        if self._jobs[job_id]["status"] in self.ACTIVE_STATES:
+            raise ValueError(f"Training job {job_id} is still {self._jobs[job_id]['status']}")
+        del self._jobs[job_id]
+        self._metrics.pop(job_id, None)
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def jobs(self):
+        return sorted(self._jobs.values(), key=lambda job: job["created"])
+
+    def job(self, job_id):
+        return self._jobs[job_id]
+
+    def metrics(self, job_id):
+        return list(self._metrics.get(job_id, []))
+
+    # Worker processes
+
+    @staticmethod
+    def worker_command(job_dir):
+        if getattr(sys, "frozen", False):
+            return [sys.executable, "train", job_dir]
+        main_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Main.py")
+        return [sys.executable, main_script, "train", job_dir]
+
+    def _launch(self, job):
+        job_dir = self.job_dir(job["job_id"])
+        for file_name in (STOP_FILE, RESULT_FILE, HEARTBEAT_FILE):
+            path = os.path.join(job_dir, file_name)
+            if os.path.exists(path):
+                os.remove(path)
+        # The worker runs in its own process group so it outlives the GUI
+        if os.name == "nt":
+            launch_options = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.CREATE_NO_WINDOW}
+        else:
+            launch_options = {"start_new_session": True}
+        with open(os.path.join(job_dir, LOG_FILE), "ab") as log_file:
+            process = subprocess.Popen(self.worker_command(job_dir), stdout=log_file, stderr=subprocess.STDOUT,
+                                       stdin=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       **launch_options)
+        self._processes[job["job_id"]] = process
+        self._set_status(job, "running", attempts=job["attempts"] + 1, pid=process.pid, started=time.time())
+        logging.info("TrainingScheduler: started %s (attempt %d, pid %d)", job["name"], job["attempts"], process.pid)
+
+    def _read_new_metrics(self, job_id):
+        path = os.path.join(self.job_dir(job_id), METRICS_FILE)
+        if not os.path.exists(path):
+            return
+        offset = self._metrics_offsets.get(job_id, 0)
+        with open(path, "rb") as metrics_file:
+            metrics_file.seek(offset)
+            data = metrics_file.read()
+        # Only complete lines are consumed; a line being written is picked up on the next poll
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            return
+        self._metrics_offsets[job_id] = offset + end
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("type") == "metrics":
+                self._metrics.setdefault(job_id, []).append(record)
+            self.job_metrics.emit(job_id, record)
+
+    def _worker_exited(self, job):
+        process = self._processes.get(job["job_id"])
+        if process is not None:
+            return process.poll() is not None
+        # Re-attached from a previous session: rely on the result file and the saved pid
+        if self._read_result(job["job_id"]) is not None:
+            return True
+        return self._worker_gone(job)
+
+    def _finish(self, job):
+        self._processes.pop(job["job_id"], None)
+        result = self._read_result(job["job_id"])
+        if result is not None:
+            self._set_status(job, result["status"], result=result)
+        elif job["attempts"] < self.max_attempts:
+            logging.warning("TrainingScheduler: worker of %s crashed, resuming from its last checkpoint", job["name"])
+            self._set_status(job, "queued")
+        else:
+            self._set_status(job, "failed", result={"status": "failed", "error": "The training worker crashed "
+                                                    f"{job['attempts']} times; see {LOG_FILE}"})
+
+    def poll(self):
+        running = 0
+        for job in self.jobs():
+            if job["status"] != "running":
+                continue
+            self._read_new_metrics(job["job_id"])
+            if self._worker_exited(job):
+                self._read_new_metrics(job["job_id"])
+                self._finish(job)
+            else:
+                running += 1
+        for job in self.jobs():
+            if running >= self.max_concurrent:
+                break
+            if job["status"] == "queued":
+                try:
+                    self._launch(job)
+                except OSError as e:
+                    logging.error("TrainingScheduler: could not start %s: %s", job["name"], str(e))
+                    self._set_status(job, "failed", result={"status": "failed", "error": str(e)})
+                    continue
+                running += 1
+
+    def shutdown(self):
+        """
+        Stops polling. Running workers are left to finish; the next session re-attaches to them.
+        """
+        self._timer.stop()
@@ -0,0 +1,334 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+import traceback
+import importlib
+
+# Files of a job folder. job.json is written by the scheduler only; the worker writes the others.
+JOB_FILE = "job.json"
+METRICS_FILE = "metrics.jsonl"
+RESULT_FILE = "result.json"
+HEARTBEAT_FILE = "heartbeat"
+STOP_FILE = "stop"
+LOG_FILE = "worker.log"
+
+
+class TrainingReporter:
+    """
+    The worker side of the progress channel. Metrics, checkpoints and state changes are appended as JSON
+    lines to metrics.jsonl, which the scheduler in the GUI process tails on a timer. A heartbeat file is
+    touched from a background thread so the scheduler can tell a running worker from a crashed one, even
+    after the GUI itself was restarted.
+    """
+
+    def __init__(self, job_dir, heartbeat_seconds=10):
+        self.job_dir = job_dir
+        self.heartbeat_seconds = heartbeat_seconds
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._heartbeat_thread = threading.Thread(target=self._beat, name="TrainingHeartbeat", daemon=True)
+
+    def start(self):
+        self._touch_heartbeat()
+        self._heartbeat_thread.start()
+
+    def close(self):
+        self._stopped.set()
+
+    def _touch_heartbeat(self):
+        with open(os.path.join(self.job_dir, HEARTBEAT_FILE), "w") as heartbeat_file:
+            heartbeat_file.write(str(time.time()))
+
+    def _beat(self):
+        while not self._stopped.wait(self.heartbeat_seconds):
+            self._touch_heartbeat()
+
+    def emit(self, kind, **values):
+        record = {"time": time.time(), "type": kind}
+        record.update(values)
+        line = json.dumps(record, default=str)
+        with self._lock, open(os.path.join(self.job_dir, METRICS_FILE), "a", encoding="utf-8") as metrics_file:
+            metrics_file.write(line + "\n")
+
+    def stop_requested(self):
+        return os.path.exists(os.path.join(self.job_dir, STOP_FILE))
+
+
+def progress_callback(reporter, checkpoint_minutes):
+    """
+    Returns a transformers TrainerCallback that streams logged metrics to the reporter, saves a checkpoint
+    at least every checkpoint_minutes (on top of save_steps), and stops at the next step with a checkpoint
+    when the scheduler asks the job to stop.
+    """
+    from transformers import TrainerCallback
+
+    class ProgressCallback(TrainerCallback):
+        def __init__(self):
+            self.last_save_time = time.monotonic()
+
+        def on_log(self, args, state, control, logs=None, **kwargs):
+            reporter.emit("metrics", step=state.global_step, max_steps=state.max_steps, epoch=state.epoch,
+                          **(logs or {}))
+
+        def on_step_end(self, args, state, control, **kwargs):
+            if checkpoint_minutes and time.monotonic() - self.last_save_time >= checkpoint_minutes * 60:
+                control.should_save = True
+            if reporter.stop_requested():
+                control.should_save = True
+                control.should_training_stop = True
+            return control
+
+        def on_save(self, args, state, control, **kwargs):
+            self.last_save_time = time.monotonic()
+            reporter.emit("checkpoint", step=state.global_step)
+
+    return ProgressCallback()
+
+
+def load_training_dataset(dataset_path, split="train"):
+    """
+    Opens a dataset folder written by save_to_disk, or a .json/.jsonl/.csv/.parquet file.
+    """
+    import datasets
+
+    if os.path.isdir(dataset_path):
+        dataset = datasets.load_from_disk(dataset_path)
+        return dataset[split] if isinstance(dataset, datasets.DatasetDict) else dataset
+    extension = os.path.splitext(dataset_path)[1].lstrip(".")
+    builder = {"jsonl": "json", "json": "json", "csv": "csv", "parquet": "parquet"}.get(extension)
+    if builder is None:
+        raise ValueError(f"Unsupported training dataset format: {dataset_path}")
+    return datasets.load_dataset(builder, data_files=dataset_path, split="train")
+
+
+def training_arguments(job):
+    from transformers import TrainingArguments
+
+    options = job["options"]
+    return TrainingArguments(
+        output_dir=job["output_dir"],
+        num_train_epochs=options.get("epochs", 3),
+        per_device_train_batch_size=options.get("batch_size", 16),
+        learning_rate=options.get("learning_rate", 5e-5),
+        save_strategy="steps",
+        save_steps=options.get("save_steps", 500),
+        save_total_limit=options.get("save_total_limit", 2),
+        logging_steps=options.get("logging_steps", 25),
+        remove_unused_columns=options.get("remove_unused_columns", True),
+        report_to=[],
+    )
+
+
+def dataset_labels(dataset, label_column, labels=None):
+    if labels:
+        return list(labels)
+    feature = dataset.features[label_column]
+    names = getattr(feature, "names", None) or getattr(getattr(feature, "feature", None), "names", None)
+    return list(names) if names else sorted(set(dataset[label_column]))
+
+
+def train_text(job, reporter, callbacks, resume_checkpoint):
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer, DataCollatorWithPadding, Trainer
+
+    options = job["options"]
+    text_column, label_column = options.get("text_column", "text"), options.get("label_column", "label")
+    dataset = load_training_dataset(job["dataset_path"])
+    labels = dataset_labels(dataset, label_column, options.get("labels"))
+    label2id = {label: index for index, label in enumerate(labels)}
+    tokenizer = AutoTokenizer.from_pretrained(job["model_path"])
+
+    def encode(batch):
+        encoded = tokenizer(batch[text_column], truncation=True)
+        encoded["labels"] = [value if isinstance(value, int) else label2id[value] for value in batch[label_column]]
+        return encoded
+
+    dataset = dataset.map(encode, batched=True, remove_columns=dataset.column_names)
+    model = AutoModelForSequenceClassification.from_pretrained(
+        job["model_path"], num_labels=len(labels), id2label=dict(enumerate(labels)), label2id=label2id,
+        ignore_mismatched_sizes=True)
+    trainer = Trainer(model=model, args=training_arguments(job), train_dataset=dataset, tokenizer=tokenizer,
+                      data_collator=DataCollatorWithPadding(tokenizer), callbacks=callbacks)
+    return trainer, trainer.train(resume_from_checkpoint=resume_checkpoint)
+
+
+def train_ner(job, reporter, callbacks, resume_checkpoint):
+    from span_marker import SpanMarkerModel, Trainer
+
+    options = job["options"]
+    dataset = load_training_dataset(job["dataset_path"])
+    labels = dataset_labels(dataset, options.get("label_column", "ner_tags"), options.get("labels"))
+    model = SpanMarkerModel.from_pretrained(job["model_path"], labels=labels,
+                                            model_max_length=options.get("model_max_length", 256),
+                                            entity_max_length=options.get("entity_max_length", 8))
+    trainer_class = Trainer
+    if options.get("preprocess_cache_dir"):
+        from PreprocessCache import PreprocessCache
+
+        trainer_class = PreprocessCache(options["preprocess_cache_dir"]).trainer_class()
+    trainer = trainer_class(model=model, args=training_arguments(job), train_dataset=dataset, callbacks=callbacks)
+    return trainer, trainer.train(resume_from_checkpoint=resume_checkpoint)
+
+
+def train_timm_image(job, reporter, callbacks, resume_checkpoint):
+    """
+    Fine-tunes a timm checkpoint, loaded like the inference runners load it (TaskLoaders.load_timm_model),
+    with timm's training augmentation for the model's data config. The final model is written in the same
+    timm format, so it opens in the IMAGE tab and the headless CLI like the checkpoint it was trained from.
+    """
+    import torch
+    from timm.data import create_transform, resolve_data_config
+    from transformers import Trainer
+
+    from TaskLoaders import load_timm_model, save_timm_checkpoint
+
+    options = job["options"]
+    image_column, label_column = options.get("image_column", "image"), options.get("label_column", "label")
+    dataset = load_training_dataset(job["dataset_path"])
+    labels = dataset_labels(dataset, label_column, options.get("labels"))
+    label2id = {label: index for index, label in enumerate(labels)}
+    model = load_timm_model(job["model_path"])
+    model.reset_classifier(len(labels))
+    model.pretrained_cfg = dict(model.pretrained_cfg, num_classes=len(labels),
+                                label_names=[str(label) for label in labels])
+    train_transform = create_transform(**resolve_data_config(model=model), is_training=True)
+
+    def transform(batch):
+        from PIL import Image
+
+        images = [value if hasattr(value, "convert") else Image.open(value) for value in batch[image_column]]
+        return {"pixel_values": [train_transform(image.convert("RGB")) for image in images],
+                "labels": [value if isinstance(value, int) else label2id[value] for value in batch[label_column]]}
+
+    def collate(examples):
+        return {"pixel_values": torch.stack([example["pixel_values"] for example in examples]),
+                "labels": torch.tensor([example["labels"] for example in examples])}
+
+    class TimmClassifier(torch.nn.Module):
+        # The Trainer expects a loss in the model output
+        def __init__(self, timm_model):
+            super().__init__()
+            self.model = timm_model
+
+        def forward(self, pixel_values, labels=None):
+            logits = self.model(pixel_values)
+            loss = torch.nn.functional.cross_entropy(logits, labels) if labels is not None else None
+            return {"loss": loss, "logits": logits}
+
+    class TimmTrainer(Trainer):
+        def save_model(self, output_dir=None, _internal_call=False):
+            if _internal_call:
+                # Checkpoints keep the Trainer's state dict format, which resuming reads back
+                return super().save_model(output_dir, _internal_call)
+            save_timm_checkpoint(self.model.model, output_dir or self.args.output_dir)
+
+    job["options"] = dict(options, remove_unused_columns=False)  # The transform needs the raw image column
+    trainer = TimmTrainer(model=TimmClassifier(model), args=training_arguments(job),
+                          train_dataset=dataset.with_transform(transform), data_collator=collate, callbacks=callbacks)
+    return trainer, trainer.train(resume_from_checkpoint=resume_checkpoint)
+
+
+def train_image(job, reporter, callbacks, resume_checkpoint):
+    from TaskLoaders import is_timm_checkpoint
+
+    if is_timm_checkpoint(job["model_path"]):
+        return train_timm_image(job, reporter, callbacks, resume_checkpoint)
+
+    import torch
+    from transformers import AutoImageProcessor, AutoModelForImageClassification, Trainer
+
+    options = job["options"]
+    image_column, label_column = options.get("image_column", "image"), options.get("label_column", "label")
+    dataset = load_training_dataset(job["dataset_path"])
+    labels = dataset_labels(dataset, label_column, options.get("labels"))
+    label2id = {label: index for index, label in enumerate(labels)}
+    processor = AutoImageProcessor.from_pretrained(job["model_path"])
+
+    def transform(batch):
+        from PIL import Image
+
+        images = [value if hasattr(value, "convert") else Image.open(value) for value in batch[image_column]]
+        encoded = processor(images=[image.convert("RGB") for image in images], return_tensors="pt")
+        encoded["labels"] = [value if isinstance(value, int) else label2id[value] for value in batch[label_column]]
+        return encoded
+
+    def collate(examples):
+        return {"pixel_values": torch.stack([example["pixel_values"] for example in examples]),
+                "labels": torch.tensor([example["labels"] for example in examples])}
+
+    job["options"] = dict(options, remove_unused_columns=False)  # The transform needs the raw image column
+    model = AutoModelForImageClassification.from_pretrained(
+        job["model_path"], num_labels=len(labels), id2label=dict(enumerate(labels)), label2id=label2id,
+        ignore_mismatched_sizes=True)
+    trainer = Trainer(model=model, args=training_arguments(job), train_dataset=dataset.with_transform(transform),
+                      data_collator=collate, callbacks=callbacks)
+    return trainer, trainer.train(resume_from_checkpoint=resume_checkpoint)
+
+
+# Object detection training needs the task GUI's own annotation format, so it is given as an entry point
+TRAINERS = {"ner": train_ner, "text": train_text, "img": train_image}
+
+
+def resolve_trainer(job):
+    entry_point = job["options"].get("entry_point")
+    if entry_point:
+        module_name, function_name = entry_point.split(":")
+        return getattr(importlib.import_module(module_name), function_name)
+    if job["task"] not in TRAINERS:
+        raise ValueError(f"No built-in trainer for task '{job['task']}'; pass an entry_point option")
+    return TRAINERS[job["task"]]
+
+
+def write_result(job_dir, result):
+    temporary_path = os.path.join(job_dir, RESULT_FILE + ".tmp")
+    with open(temporary_path, "w", encoding="utf-8") as result_file:
+        json.dump(result, result_file, default=str)
+    os.replace(temporary_path, os.path.join(job_dir, RESULT_FILE))
+
+
+def run_job(job_dir):
+    """
+    Runs one training job to completion, resuming from the newest checkpoint in its output folder.
+    The outcome is written to result.json: finished, stopped (on request, after a checkpoint) or failed.
+    """
+    with open(os.path.join(job_dir, JOB_FILE), "r", encoding="utf-8") as job_file:
+        job = json.load(job_file)
+    reporter = TrainingReporter(job_dir)
+    reporter.start()
+    try:
+        from transformers.trainer_utils import get_last_checkpoint
+
+        os.makedirs(job["output_dir"], exist_ok=True)
+        resume_checkpoint = get_last_checkpoint(job["output_dir"])
+        reporter.emit("state", state="running", resumed_from=resume_checkpoint, pid=os.getpid())
+        callbacks = [progress_callback(reporter, job["options"].get("checkpoint_minutes", 10))]
+        trainer, train_output = resolve_trainer(job)(job, reporter, callbacks, resume_checkpoint)
+        if reporter.stop_requested():
+            result = {"status": "stopped", "step": trainer.state.global_step}
+        else:
+            final_model = os.path.join(job["output_dir"], "final")
+            trainer.save_model(final_model)
+            result = {"status": "finished", "final_model": final_model, "metrics": train_output.metrics}
+    except Exception as e:
+        logging.error("Training job %s failed: %s", job.get("job_id"), str(e), exc_info=True)
+        result = {"status": "failed", "error": str(e), "traceback": traceback.format_exc()}
+    reporter.emit("state", state=result["status"])
+    write_result(job_dir, result)
+    reporter.close()
+    return 0 if result["status"] != "failed" else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="gantrithor train", description="Run one queued training job")
+    parser.add_argument("command", choices=["train"])
+    parser.add_argument("job_dir", help="Job folder created by the TrainingScheduler")
+    options = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    return run_job(options.job_dir)
+
+
+if __name__ == "__main__":
+    sys.exit(main(["train"] + sys.argv[1:]))
@@ -0,0 +1,375 @@
+import os
+import logging
+import threading
+
+import numpy as np
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def kmeans(data, clusters, iterations=20, random_state=0, chunk=16384):
+    """
+    Lloyd's k-means in NumPy with chunked distance computation. Empty clusters are re-seeded from random rows.
+
+    :return: (centroids of shape (clusters, dim), assignment of each row)
+    """
+    rng = np.random.default_rng(random_state)
+    centroids = data[rng.choice(len(data), clusters, replace=len(data) < clusters)].copy()
+    assignment = np.zeros(len(data), dtype=np.int32)
+    for _ in range(iterations):
+        assignment = nearest_centroids(data, centroids, chunk)
+        # Per-column bincount is much faster than np.add.at for the cluster sums
+        sums = np.stack([np.bincount(assignment, weights=data[:, column], minlength=clusters)
+                         for column in range(data.shape[1])], axis=1)
+        counts = np.bincount(assignment, minlength=clusters)
+        empty = counts == 0
+        centroids = sums / np.maximum(counts, 1)[:, None]
+        if empty.any():
+            centroids[empty] = data[rng.choice(len(data), int(empty.sum()))]
+    return centroids.astype(np.float32), assignment
+
+
+def nearest_centroids(data, centroids, chunk=16384):
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    assignment = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), chunk):
+        block = data[start:start + chunk]
+        # argmin ||x - c||^2 = argmin (||c||^2 - 2xc); ||x||^2 is the same for every centroid
+        assignment[start:start + chunk] = np.argmin(centroid_norms[None, :] - 2 * block @ centroids.T, axis=1)
+    return assignment
+
+
+def top_k(scores, ids, k):
+    if len(scores) > k:
+        part = np.argpartition(-scores, k)[:k]
+        scores, ids = scores[part], ids[part]
+    order = np.argsort(-scores, kind="stable")
+    return ids[order], scores[order]
+
+
+class IVFPQIndex:
+    """
+    An inverted-file index with product quantization, for cosine search over large embedding sets.
+
+    Vectors are assigned to the nearest of n_lists coarse centroids, and the residual to that centroid is
+    encoded as m one-byte codes (one per sub-vector, 256 centroids each), so a million 384-d rows take
+    m bytes each instead of 1.5 KB. A query scores only the rows in the n_probe closest lists, reading the
+    residual part from one lookup table per query (asymmetric distance), and the best candidates are
+    re-ranked on the exact embeddings.
+    New rows are encoded with the trained codebooks and appended; the codes live in append-only files.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.centroids = None
+        self.codebooks = None
+        self.trained_rows = 0
+        self.codes = np.empty((0, 0), dtype=np.uint8)
+        self.lists = np.empty(0, dtype=np.int32)
+        self._order = None
+        self._offsets = None
+        if os.path.exists(os.path.join(folder, "ivfpq.npz")):
+            self.load()
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    @property
+    def count(self):
+        return len(self.lists)
+
+    @staticmethod
+    def subquantizers(dim):
+        for m in (64, 48, 32, 24, 16, 12, 8, 6, 4, 2, 1):
+            if dim % m == 0 and dim // m >= 4 or m == 1:
+                return m
+
+    def train(self, vectors, n_lists=None, iterations=15, random_state=0, total_rows=None):
+        vectors = normalize_rows(vectors)
+        self.trained_rows = total_rows or len(vectors)
+        n_lists = n_lists or int(min(4096, max(16, 4 * np.sqrt(len(vectors)))))
+        rng = np.random.default_rng(random_state)
+        # k-means needs a few dozen rows per centroid, not the whole sample
+        coarse_rows = rng.permutation(len(vectors))[:64 * n_lists]
+        self.centroids = kmeans(vectors[coarse_rows], n_lists, iterations, random_state)[0]
+        pq_rows = rng.permutation(len(vectors))[:64 * 256]
+        residuals = vectors[pq_rows] - self.centroids[nearest_centroids(vectors[pq_rows], self.centroids)]
+        m = self.subquantizers(vectors.shape[1])
+        sub_dim = vectors.shape[1] // m
+        self.codebooks = np.stack([kmeans(residuals[:, j * sub_dim:(j + 1) * sub_dim], 256, iterations,
+                                          random_state + j)[0] for j in range(m)])
+        self.codes = np.empty((0, m), dtype=np.uint8)
+        self.lists = np.empty(0, dtype=np.int32)
+        for name in ("codes.u8", "lists.i32"):
+            path = os.path.join(self.folder, name)
+            if os.path.exists(path):
+                os.remove(path)
+        np.savez(os.path.join(self.folder, "ivfpq.npz"), centroids=self.centroids, codebooks=self.codebooks,
+                 trained_rows=self.trained_rows)
+
+    def encode(self, vectors):
+        vectors = normalize_rows(vectors)
+        lists = nearest_centroids(vectors, self.centroids)
+        residuals = vectors - self.centroids[lists]
+        m, _, sub_dim = self.codebooks.shape
+        codes = np.empty((len(vectors), m), dtype=np.uint8)
+        for j in range(m):
+            codes[:, j] = nearest_centroids(residuals[:, j * sub_dim:(j + 1) * sub_dim], self.codebooks[j])
+        return codes, lists
+
+    def add(self, vectors):
+        codes, lists = self.encode(vectors)
+        with open(os.path.join(self.folder, "codes.u8"), "ab") as codes_file:
+            codes.tofile(codes_file)
+        with open(os.path.join(self.folder, "lists.i32"), "ab") as lists_file:
+            lists.tofile(lists_file)
+        self.codes = np.concatenate([self.codes, codes])
+        self.lists = np.concatenate([self.lists, lists])
+        self._order = None
+
+    def load(self):
+        arrays = np.load(os.path.join(self.folder, "ivfpq.npz"))
+        self.centroids, self.codebooks = arrays["centroids"], arrays["codebooks"]
+        self.trained_rows = int(arrays["trained_rows"])
+        m = self.codebooks.shape[0]
+        codes_path, lists_path = os.path.join(self.folder, "codes.u8"), os.path.join(self.folder, "lists.i32")
+        # An interrupted write leaves one file longer or a row cut short; the extra bytes are cut from the files
+        # too, so later appends line up again, and the rows are re-added by sync()
+        rows = min(os.path.getsize(codes_path) // m if os.path.exists(codes_path) else 0,
+                   os.path.getsize(lists_path) // 4 if os.path.exists(lists_path) else 0)
+        self.codes = np.fromfile(codes_path, dtype=np.uint8, count=rows * m).reshape(rows, m) if rows \
+            else np.empty((0, m), dtype=np.uint8)
+        self.lists = np.fromfile(lists_path, dtype=np.int32, count=rows) if rows else np.empty(0, dtype=np.int32)
+        for path, row_bytes in ((codes_path, m), (lists_path, 4)):
+            if os.path.exists(path) and os.path.getsize(path) != rows * row_bytes:
+                with open(path, "r+b") as index_file:
+                    index_file.truncate(rows * row_bytes)
+
+    def _inverted_lists(self):
+        if self._order is None:
+            self._order = np.argsort(self.lists, kind="stable").astype(np.int64)
+            self._offsets = np.searchsorted(self.lists[self._order], np.arange(len(self.centroids) + 1))
+        return self._order, self._offsets
+
+    def candidates(self, query, n_probe, count):
+        """
+        :return: Row numbers and approximate cosine scores of the best count rows for one normalized query.
+        """
+        order, offsets = self._inverted_lists()
+        m, _, sub_dim = self.codebooks.shape
+        centroid_scores = self.centroids @ query
+        probes = np.argsort(-centroid_scores)[:n_probe]
+        # score = q.c + q.r; the residual codebooks are shared by all lists, so one table of sub-vector
+        # dot products serves every probed list
+        table = np.einsum("jkd,jd->jk", self.codebooks, query.reshape(m, sub_dim))
+        rows, scores = [], []
+        for list_id in probes:
+            members = order[offsets[list_id]:offsets[list_id + 1]]
+            if not len(members):
+                continue
+            rows.append(members)
+            scores.append(centroid_scores[list_id] + table[np.arange(m), self.codes[members]].sum(axis=1))
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return top_k(np.concatenate(scores), np.concatenate(rows), count)
+
+
+class VectorIndex:
+    """
+    VectorIndex Class Description:
+
+    Similarity search over the embeddings a ProjectionEngine stores for a (dataset, model) key, for
+    "find similar", near-duplicate detection before training and bulk label propagation.
+
+    Up to flat_threshold rows the index is exact: cosine scores are computed in chunks straight from the
+    embedding memmap. Above it an IVFPQIndex is trained once on a sample and persisted in the store folder;
+    its candidates are re-ranked on the exact embeddings. sync() indexes only the rows appended to the store
+    since the last call (queries call it when the store has grown), so the index follows the dataset as
+    rows are added.
+
+    Attributes:
+    - store (EmbeddingStore): The embeddings and sample ids being searched.
+    - flat_threshold (int): Row count above which the IVF-PQ index is used.
+    - n_probe (int): Inverted lists scanned per query.
+    - rerank (int): Candidates per requested neighbour re-scored exactly.
+
+    Methods:
+    - sync(): Indexes rows added to the store.
+    - search(): Returns the nearest sample ids and cosine scores for query vectors.
+    - similar_to(): Returns the samples most similar to a stored sample.
+    - duplicate_groups(): Groups samples whose similarity is above a threshold.
+    - propagate_labels(): Suggests labels for unlabeled samples from their labelled neighbours.
+    """
+
+    def __init__(self, store, flat_threshold=100000, n_probe=16, rerank=8, train_sample=200000):
+        self.store = store
+        self.flat_threshold = flat_threshold
+        self.n_probe = n_probe
+        self.rerank = rerank
+        self.train_sample = train_sample
+        self.folder = os.path.join(store.folder, "index")
+        os.makedirs(self.folder, exist_ok=True)
+        self.ivfpq = IVFPQIndex(self.folder)
+        self._inverse_norms = np.empty(0, dtype=np.float32)
+        self._lock = threading.RLock()
+
+    @property
+    def uses_ivfpq(self):
+        return self.ivfpq.is_trained
+
+    def sync(self):
+        """
+        :return: The number of newly indexed rows.
+        """
+        with self._lock:
+            count = self.store.count
+            embeddings = self.store.embeddings()
+            indexed = len(self._inverse_norms)
+            if count > indexed:
+                norms = np.linalg.norm(np.asarray(embeddings[indexed:count]), axis=1)
+                self._inverse_norms = np.concatenate([self._inverse_norms, 1.0 / np.maximum(norms, 1e-12)])
+            # The lists are sized for the rows seen at training time; retrain once the store outgrows them
+            outgrown = self.ivfpq.is_trained and count > 4 * self.ivfpq.trained_rows
+            if count > self.flat_threshold and (not self.ivfpq.is_trained or outgrown):
+                rows = np.random.default_rng(0).choice(count, min(count, self.train_sample), replace=False)
+                self.ivfpq.train(np.asarray(embeddings[np.sort(rows)]), total_rows=count)
+                logging.info("VectorIndex: trained IVF-PQ (%d lists) on %d of %d rows", len(self.ivfpq.centroids),
+                             len(rows), count)
+            added = 0
+            if self.ivfpq.is_trained:
+                for start in range(self.ivfpq.count, count, 65536):
+                    chunk = np.asarray(embeddings[start:min(count, start + 65536)])
+                    self.ivfpq.add(chunk)
+                    added += len(chunk)
+            return max(added, count - indexed)
+
+    def _flat_search(self, queries, k, chunk=65536):
+        embeddings = self.store.embeddings()
+        count = len(self._inverse_norms)
+        best_ids = np.full((len(queries), 0), -1, dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, count, chunk):
+            block = np.asarray(embeddings[start:start + chunk]) * self._inverse_norms[start:start + chunk, None]
+            scores = queries @ block.T
+            ids = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+            scores = np.concatenate([best_scores, scores], axis=1)
+            ids = np.concatenate([best_ids, ids], axis=1)
+            if scores.shape[1] > k:
+                part = np.argpartition(-scores, k, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, part, axis=1)
+                ids = np.take_along_axis(ids, part, axis=1)
+            best_scores, best_ids = scores, ids
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        return np.take_along_axis(best_ids, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def _ivfpq_search(self, queries, k):
+        embeddings = self.store.embeddings()
+        all_ids, all_scores = [], []
+        for query in queries:
+            rows, _ = self.ivfpq.candidates(query, self.n_probe, k * self.rerank)
+            rows = np.sort(rows)  # Sorted rows read the memmap sequentially
+            exact = (np.asarray(embeddings[rows]) * self._inverse_norms[rows, None]) @ query
+            ids, scores = top_k(exact, rows, k)
+            all_ids.append(np.pad(ids, (0, k - len(ids)), constant_values=-1))
+            all_scores.append(np.pad(scores, (0, k - len(scores)), constant_values=-np.inf))
+        return np.array(all_ids), np.array(all_scores, dtype=np.float32)
+
+    def search_rows(self, query_vectors, k=10):
+        """
+        :return: (rows, scores), each of shape (queries, k), best first. Missing neighbours are -1.
+        """
+        queries = normalize_rows(np.atleast_2d(query_vectors))
+        with self._lock:
+            if self.store.count != len(self._inverse_norms):
+                self.sync()
+            if self.uses_ivfpq:
+                return self._ivfpq_search(queries, k)
+            return self._flat_search(queries, k)
+
+    def search(self, query_vectors, k=10):
+        """
+        :return: One list of (sample_id, cosine similarity) per query vector, most similar first.
+        """
+        rows, scores = self.search_rows(query_vectors, k)
+        return [[(self.store.ids[row], float(score)) for row, score in zip(row_list, score_list) if row >= 0]
+                for row_list, score_list in zip(rows, scores)]
+
+    def vectors_of(self, sample_ids):
+        rows = [self.store.id_to_row[sample_id] for sample_id in sample_ids]
+        return np.asarray(self.store.embeddings()[rows])
+
+    def similar_to(self, sample_id, k=10):
+        results = self.search(self.vectors_of([sample_id]), k + 1)[0]
+        return [(other_id, score) for other_id, score in results if other_id != sample_id][:k]
+
+    def duplicate_groups(self, threshold=0.97, sample_ids=None, k=10, batch_size=1024):
+        """
+        Groups near-identical samples: every pair with cosine similarity >= threshold among each sample's
+        k nearest neighbours is joined (union-find), so chains of near-duplicates end up in one group.
+
+        :return: A list of groups (lists of sample ids, in store order) with more than one member.
+        """
+        rows = np.arange(self.store.count) if sample_ids is None else \
+            np.array(sorted(self.store.id_to_row[sample_id] for sample_id in sample_ids))
+        allowed = None if sample_ids is None else set(rows.tolist())
+        parent = {}
+
+        def find(row):
+            while parent.get(row, row) != row:
+                parent[row] = parent.get(parent[row], parent[row])
+                row = parent[row]
+            return row
+
+        embeddings = self.store.embeddings()
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            neighbours, scores = self.search_rows(np.asarray(embeddings[batch]), k + 1)
+            for row, neighbour_row, score_row in zip(batch, neighbours, scores):
+                for neighbour, score in zip(neighbour_row, score_row):
+                    if score < threshold:
+                        break
+                    if neighbour < 0 or neighbour == row or (allowed is not None and neighbour not in allowed):
+                        continue
+                    root_a, root_b = find(int(row)), find(int(neighbour))
+                    if root_a != root_b:
+                        parent[max(root_a, root_b)] = min(root_a, root_b)
+
+        groups = {}
+        for row in parent:
+            groups.setdefault(find(row), set()).update((row, find(row)))
+        return [[self.store.ids[row] for row in sorted(members)] for members in groups.values() if len(members) > 1]
+
+    def propagate_labels(self, labels, k=20, min_similarity=0.9):
+        """
+        Spreads labels to unlabeled samples. Each labelled sample votes for its k nearest neighbours above
+        min_similarity, weighted by similarity; only the labelled samples are queried, so the cost grows
+        with the number of labels, not with the dataset.
+
+        :param labels: Maps sample id to label.
+        :return: Maps unlabeled sample id to (label, confidence), confidence being the label's share of the votes.
+        """
+        labelled_ids = [sample_id for sample_id in labels if sample_id in self.store.id_to_row]
+        votes = {}
+        for start in range(0, len(labelled_ids), 1024):
+            batch = labelled_ids[start:start + 1024]
+            for sample_id, neighbours in zip(batch, self.search(self.vectors_of(batch), k + 1)):
+                for neighbour_id, score in neighbours:
+                    if score < min_similarity or neighbour_id in labels:
+                        continue
+                    sample_votes = votes.setdefault(neighbour_id, {})
+                    sample_votes[labels[sample_id]] = sample_votes.get(labels[sample_id], 0.0) + score
+        suggestions = {}
+        for sample_id, sample_votes in votes.items():
+            label, weight = max(sample_votes.items(), key=lambda item: item[1])
+            suggestions[sample_id] = (label, weight / sum(sample_votes.values()))
+        return suggestions
+
+    def stats(self):
+        return {"rows": self.store.count, "indexed": len(self._inverse_norms),
+                "kind": "ivfpq" if self.uses_ivfpq else "flat",
+                "lists": len(self.ivfpq.centroids) if self.uses_ivfpq else 0}
@@ -0,0 +1,394 @@
+import logging
+import threading
+from collections import OrderedDict
+
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, QObject, QRunnable, QSize, Qt, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QImage, QPixmap
+
+
+class DataFrameSource:
+    """
+    Adapts a pandas dataframe to the pager interface the table model reads from (row_count, column_names,
+    page(start, count)), so the model can show the existing task dataframes as well as Arrow pagers.
+    """
+
+    def __init__(self, dataframe):
+        self.dataframe = dataframe
+        self.column_names = [str(column) for column in dataframe.columns]
+        self.image_columns = []
+
+    @property
+    def row_count(self):
+        return len(self.dataframe)
+
+    def is_complete(self):
+        return True
+
+    def page(self, start, count):
+        return self.dataframe.iloc[start:start + count].to_dict(orient="records")
+
+
+class _IndexSignals(QObject):
+    finished = pyqtSignal(int, object)
+
+
+class _IndexJob(QRunnable):
+    """Builds a sorted/filtered row index off the GUI thread."""
+
+    def __init__(self, generation, build, signals):
+        super().__init__()
+        self.generation = generation
+        self.build = build
+        self.signals = signals
+
+    def run(self):
+        try:
+            row_index = self.build()
+        except Exception as e:
+            logging.error("Building the table index failed: %s", str(e), exc_info=True)
+            return
+        self.signals.finished.emit(self.generation, row_index)
+
+
+class _PageSignals(QObject):
+    loaded = pyqtSignal(object, object)
+
+
+class _PageJob(QRunnable):
+    """Reads one page of rows from the source off the GUI thread (streams fetch from the network here)."""
+
+    def __init__(self, key, source, start, count, signals):
+        super().__init__()
+        self.key = key
+        self.source = source
+        self.start = start
+        self.count = count
+        self.signals = signals
+
+    def run(self):
+        try:
+            page = self.source.page(self.start, self.count)
+        except Exception as e:
+            logging.error("Reading rows %d-%d failed: %s", self.start, self.start + self.count - 1, str(e),
+                          exc_info=True)
+            page = None
+        self.signals.loaded.emit(self.key, page)
+
+
+class _ThumbnailSignals(QObject):
+    decoded = pyqtSignal(object, object)
+
+
+class _ThumbnailJob(QRunnable):
+    def __init__(self, key, value, size, decode, signals):
+        super().__init__()
+        self.key = key
+        self.value = value
+        self.size = size
+        self.decode = decode
+        self.signals = signals
+
+    def run(self):
+        try:
+            image = self.decode(self.value, (self.size.width(), self.size.height())).convert("RGB")
+            data = image.tobytes("raw", "RGB")
+            # copy() detaches the QImage from the Python buffer before it crosses threads
+            qimage = QImage(data, image.width, image.height, image.width * 3, QImage.Format.Format_RGB888).copy()
+        except Exception as e:
+            logging.warning("Could not decode thumbnail for %s: %s", self.key, str(e))
+            qimage = None
+        self.signals.decoded.emit(self.key, qimage)
+
+
+class VirtualTableModel(QAbstractTableModel):
+    """
+    VirtualTableModel Class Description:
+
+    A QAbstractTableModel over an Arrow/streaming pager or a pandas dataframe, for showing large datasets in
+    a QTableView instead of building one widget per row. Qt only asks for the rows in view, and the model
+    loads those in pages of page_size rows kept in a small LRU, so rendering cost is O(visible rows)
+    whatever the dataset size. Pages are read on the thread pool, so scrolling a stream never waits for the
+    network; rows show empty until their page arrives and dataChanged repaints them.
+
+    Sorting and filtering build an index of source row positions on a thread pool; the view keeps showing
+    the previous order until the new index is swapped in. Image columns are shown as thumbnails that are
+    decoded in the background and kept in an LRU of QPixmaps.
+
+    Attributes:
+    - source: The pager (row_count, column_names, page()) being displayed.
+    - row_index (list or None): Source row positions in display order; None means source order.
+    - page_size (int): Rows fetched from the source at once.
+
+    Methods:
+    - set_source(): Replaces the displayed data.
+    - sort(): Sorts by a column in the background.
+    - set_filter(): Keeps only rows whose column contains the given text, in the background.
+    - row_data(): Returns the source record behind a display row, or {} while its page is loading.
+    """
+
+    index_ready = pyqtSignal()
+
+    def __init__(self, source=None, page_size=256, max_cached_pages=64, thumbnail_size=QSize(96, 96),
+                 max_thumbnails=512, decode_image=None, parent=None):
+        super().__init__(parent)
+        self.page_size = page_size
+        self.max_cached_pages = max_cached_pages
+        self.thumbnail_size = thumbnail_size
+        self.max_thumbnails = max_thumbnails
+        self.decode_image = decode_image
+        self.thread_pool = QThreadPool()
+        self._pages = OrderedDict()
+        self._pending_pages = set()
+        self._thumbnails = OrderedDict()
+        self._pending_thumbnails = set()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._source_generation = 0  # tags page and thumbnail jobs, so results for a replaced source are dropped
+        self._sort = None
+        self._filter = None
+        self._index_signals = _IndexSignals()
+        self._index_signals.finished.connect(self._apply_index)
+        self._page_signals = _PageSignals()
+        self._page_signals.loaded.connect(self._store_page)
+        self._thumbnail_signals = _ThumbnailSignals()
+        self._thumbnail_signals.decoded.connect(self._store_thumbnail)
+        self.source = None
+        self.row_index = None
+        self._visible_rows = 0
+        if source is not None:
+            self.set_source(source)
+
+    def set_source(self, source):
+        if hasattr(source, "iloc"):
+            source = DataFrameSource(source)
+        self.beginResetModel()
+        self.source = source
+        self.row_index = None
+        self._sort = None
+        self._filter = None
+        self._generation += 1
+        self._source_generation += 1
+        with self._lock:
+            self._pages.clear()
+        self._pending_pages.clear()
+        self._thumbnails.clear()
+        self._pending_thumbnails.clear()
+        self._visible_rows = source.row_count
+        self.endResetModel()
+
+    # Qt model interface
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.source is None:
+            return 0
+        return len(self.row_index) if self.row_index is not None else self._visible_rows
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.source is None:
+            return 0
+        return len(self.source.column_names)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole or self.source is None:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.source.column_names[section]
+        return str(section + 1)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return self.source is not None and self.row_index is None and not self.source.is_complete()
+
+    def fetchMore(self, parent=QModelIndex()):
+        # Streaming sources grow as the view scrolls to the end; the rows are inserted when the page arrives
+        self.request_page(self._visible_rows // self.page_size)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or self.source is None:
+            return None
+        column = self.source.column_names[index.column()]
+        is_image = column in self.source.image_columns
+        if role == Qt.ItemDataRole.DisplayRole and not is_image:
+            value = self.row_data(index.row()).get(column)
+            return "" if value is None else str(value)
+        if role == Qt.ItemDataRole.DecorationRole and is_image:
+            return self.thumbnail(index.row(), column)
+        if role == Qt.ItemDataRole.SizeHintRole and is_image:
+            return self.thumbnail_size
+        return None
+
+    # Paging
+
+    def source_row(self, row):
+        return self.row_index[row] if self.row_index is not None else row
+
+    def row_data(self, row):
+        record = self._cached_row(row)
+        return {} if record is None else record
+
+    def _cached_row(self, row):
+        """
+        :return: The source record behind a display row, {} past the end of its page, or None if the page is
+                 not loaded yet, in which case it is requested.
+        """
+        source_row = self.source_row(row)
+        page_number = source_row // self.page_size
+        with self._lock:
+            page = self._pages.get(page_number)
+            if page is not None:
+                self._pages.move_to_end(page_number)
+        if page is None:
+            self.request_page(page_number)
+            return None
+        offset = source_row - page_number * self.page_size
+        return page[offset] if offset < len(page) else {}
+
+    def request_page(self, page_number):
+        if page_number in self._pending_pages:
+            return
+        self._pending_pages.add(page_number)
+        self.thread_pool.start(_PageJob((self._source_generation, page_number), self.source,
+                                        page_number * self.page_size, self.page_size, self._page_signals))
+
+    def _store_page(self, job_key, page):
+        generation, page_number = job_key
+        if generation != self._source_generation:
+            return  # Read from a source that has been replaced since
+        self._pending_pages.discard(page_number)
+        if page is None:
+            return
+        with self._lock:
+            self._pages[page_number] = page
+            while len(self._pages) > self.max_cached_pages:
+                self._pages.popitem(last=False)
+        available = self.source.row_count
+        if self.row_index is None and available > self._visible_rows:
+            # Short pages were read before the stream reached this far and would hide the new rows
+            with self._lock:
+                for number in [number for number, cached in self._pages.items() if len(cached) < self.page_size]:
+                    del self._pages[number]
+            self.beginInsertRows(QModelIndex(), self._visible_rows, available - 1)
+            self._visible_rows = available
+            self.endInsertRows()
+        if not page or self.rowCount() == 0:
+            return
+        last_column = self.columnCount() - 1
+        if self.row_index is None:
+            first_row = page_number * self.page_size
+            if first_row >= self.rowCount():
+                return
+            top = self.index(first_row, 0)
+            bottom = self.index(min(first_row + len(page), self.rowCount()) - 1, last_column)
+        else:
+            # The display rows are not tracked for sorted views; the view only repaints what is visible
+            top, bottom = self.index(0, 0), self.index(self.rowCount() - 1, last_column)
+        self.dataChanged.emit(top, bottom)
+
+    # Thumbnails
+
+    def thumbnail(self, row, column):
+        key = (self.source_row(row), column)
+        pixmap = self._thumbnails.get(key)
+        if pixmap is not None:
+            self._thumbnails.move_to_end(key)
+            return pixmap
+        if key not in self._pending_thumbnails and self.decode_image is not None:
+            record = self._cached_row(row)
+            if record is None:
+                return None  # Asked for again when the page arrives
+            self._pending_thumbnails.add(key)
+            value = record.get(column)
+            self.thread_pool.start(_ThumbnailJob((self._source_generation,) + key, value, self.thumbnail_size,
+                                                 self.decode_image, self._thumbnail_signals))
+        return None
+
+    def _store_thumbnail(self, job_key, qimage):
+        generation, key = job_key[0], job_key[1:]
+        if generation != self._source_generation:
+            return  # Decoded for a source that has been replaced since
+        self._pending_thumbnails.discard(key)
+        if qimage is None:
+            return
+        self._thumbnails[key] = QPixmap.fromImage(qimage)
+        while len(self._thumbnails) > self.max_thumbnails:
+            self._thumbnails.popitem(last=False)
+        source_row, column = key
+        column_number = self.source.column_names.index(column)
+        if self.row_index is None:
+            top = bottom = self.index(source_row, column_number)
+        else:
+            # The display row is not tracked for sorted views; the view only repaints what is visible
+            top, bottom = self.index(0, column_number), self.index(self.rowCount() - 1, column_number)
+        self.dataChanged.emit(top, bottom, [Qt.ItemDataRole.DecorationRole])
+
+    # Sorting and filtering
+
+    def column_values(self, column):
+        """
+        Returns every value of a column, straight from the Arrow table or dataframe when possible.
+        """
+        if isinstance(self.source, DataFrameSource):
+            return self.source.dataframe[self.source.dataframe.columns[self.source.column_names.index(column)]]
+        dataset = getattr(self.source, "dataset", None)
+        if dataset is not None:
+            return dataset.data.column(column)
+        return [row.get(column) for row in self.source.page(0, self.source.row_count)]
+
+    def sort(self, column_number, order=Qt.SortOrder.AscendingOrder):
+        self._sort = (self.source.column_names[column_number], order == Qt.SortOrder.DescendingOrder)
+        self._rebuild_index()
+
+    def set_filter(self, column, text):
+        self._filter = (column, text) if text else None
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        self._generation += 1
+        sort, row_filter = self._sort, self._filter
+        if sort is None and row_filter is None:
+            self._apply_index(self._generation, None)
+            return
+        self.thread_pool.start(_IndexJob(self._generation, lambda: self._build_index(sort, row_filter),
+                                         self._index_signals))
+
+    def _build_index(self, sort, row_filter):
+        import numpy as np
+
+        rows = np.arange(self.source.row_count)
+        if row_filter is not None:
+            column, text = row_filter
+            values = self.column_values(column)
+            if hasattr(values, "str"):
+                mask = values.astype(str).str.contains(text, case=False, regex=False).to_numpy()
+            elif hasattr(values, "to_numpy") and hasattr(values, "type"):
+                import pyarrow.compute as pc
+
+                mask = pc.fill_null(pc.match_substring(pc.cast(values, "string"), text, ignore_case=True),
+                                    False).to_numpy(zero_copy_only=False)
+            else:
+                mask = np.array([text.lower() in str(value).lower() for value in values])
+            rows = rows[mask]
+        if sort is not None:
+            column, descending = sort
+            values = self.column_values(column)
+            if hasattr(values, "to_numpy") and not hasattr(values, "type"):
+                keys = values.to_numpy()[rows]
+            elif hasattr(values, "type"):
+                keys = values.take(rows).to_numpy(zero_copy_only=False)
+            else:
+                keys = np.asarray(values, dtype=object)[rows]
+            try:
+                order = np.argsort(keys, kind="stable")
+            except TypeError:
+                order = np.argsort(keys.astype(str), kind="stable")
+            if descending:
+                order = order[::-1]
+            rows = rows[order]
+        return rows.tolist()
+
+    def _apply_index(self, generation, row_index):
+        if generation != self._generation:
+            return  # A newer sort or filter was requested meanwhile
+        self.beginResetModel()
+        self.row_index = row_index
+        self.endResetModel()
+        self.index_ready.emit()
@@ -0,0 +1,204 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from PerformanceMonitor import MONITOR
+
+
+class VisualizationServer:
+    """
+    VisualizationServer Class Description:
+
+    One long-lived local Dash server owned by Main, instead of starting a new Dash app for every plot.
+    The server is started in a background thread the first time a figure is pushed: the thread binds the
+    port, then imports Dash and builds the app, so the caller only waits for the port. Requests that arrive
+    while the app is being built wait in the listen backlog. Figures are
+    kept server-side by name; the page polls a version counter through a dcc.Interval and only redraws
+    the graph when the figure it shows has changed.
+
+    Computed projections (UMAP and other embeddings) are memoised by key in projection_cache, so opening
+    the same view again returns immediately instead of recomputing.
+
+    Attributes:
+    - host, port (str, int): Address the server listens on. The next free port is used if port is taken.
+    - figures (dict): Maps figure name to (version, figure).
+    - projection_cache (OrderedDict): LRU cache of computed projections, at most max_cached_projections.
+
+    Methods:
+    - start(): Starts the server thread if it is not running yet, without waiting for it.
+    - push_figure(): Stores or replaces a figure and returns the URL that shows it.
+    - cached_projection(): Returns a cached projection or computes and stores it.
+    - url_for(): Returns the URL of a figure.
+    - stop(): Shuts the server down.
+    """
+
+    POLL_INTERVAL_MS = 1000
+
+    def __init__(self, host="127.0.0.1", port=8050, max_cached_projections=16):
+        self.host = host
+        self.port = port
+        self.max_cached_projections = max_cached_projections
+        self.figures = {}
+        self.projection_cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self._bound = None  # Set by the server thread once the port is bound (or binding failed)
+        self._bind_error = None
+        self._serving = False
+        self._stop_requested = None  # Set by stop(); one per start(), so a restart is not affected by the last stop
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @staticmethod
+    def _starting(environ, start_response):
+        # Placeholder WSGI app until the Dash app is built; requests are not served before that
+        start_response("503 Service Unavailable", [("Content-Type", "text/plain")])
+        return [b"Starting"]
+
+    def build_app(self):
+        import dash
+        import flask
+        from dash import dcc, html
+        from dash.dependencies import Input, Output, State
+
+        app = dash.Dash(__name__, title="Gantrithor")
+        app.layout = html.Div([
+            dcc.Location(id="location"),
+            dcc.Store(id="shown-version"),
+            dcc.Interval(id="poll", interval=self.POLL_INTERVAL_MS),
+            dcc.Graph(id="figure", style={"height": "95vh"}),
+        ])
+
+        @app.callback(
+            Output("figure", "figure"),
+            Output("shown-version", "data"),
+            Input("poll", "n_intervals"),
+            Input("location", "search"),
+            State("shown-version", "data"),
+        )
+        def refresh_figure(_, search, shown_version):
+            name = self.figure_name_from_search(search)
+            with self._lock:
+                version, figure = self.figures.get(name, (None, None))
+            if figure is None or (shown_version is not None and shown_version == [name, version]):
+                raise dash.exceptions.PreventUpdate
+            return figure, [name, version]
+
+        @app.server.before_request
+        def start_render_span():
+            flask.g.span_start_ns = time.perf_counter_ns()
+
+        @app.server.after_request
+        def end_render_span(response):
+            # Covers the callback and the JSON serialisation of the figure, the costly part of a redraw
+            if flask.request.path.startswith("/_dash-update-component") and response.status_code == 200:
+                start_ns = flask.g.span_start_ns
+                MONITOR.record("render_figure", "dash", start_ns, time.perf_counter_ns() - start_ns,
+                               {"bytes": response.calculate_content_length()})
+            return response
+
+        return app
+
+    @staticmethod
+    def figure_name_from_search(search):
+        from urllib.parse import parse_qs
+
+        values = parse_qs((search or "").lstrip("?")).get("view")
+        return values[0] if values else "default"
+
+    def start(self):
+        if self.is_running():
+            return
+        self._bound, self._bind_error, self._serving = threading.Event(), None, False
+        self._stop_requested = threading.Event()
+        self._thread = threading.Thread(target=self._serve, args=(self._bound, self._stop_requested),
+                                        name="VisualizationServer", daemon=True)
+        self._thread.start()
+
+    def _serve(self, bound, stop_requested):
+        from werkzeug.serving import make_server
+
+        for port in range(self.port, self.port + 20):
+            try:
+                server = make_server(self.host, port, self._starting, threaded=True)
+                break
+            except OSError:
+                continue
+        else:
+            self._bind_error = OSError(f"No free port for the visualization server from {self.port}")
+            bound.set()
+            return
+        self.port, self._server = port, server
+        bound.set()
+
+        try:
+            server.app = self.build_app().server
+        except Exception as e:
+            logging.error("Building the visualization app failed: %s", str(e), exc_info=True)
+            stop_requested.set()
+        with self._lock:
+            if stop_requested.is_set():
+                server.server_close()
+                return
+            self._serving = True
+        logging.info("Visualization server running on http://%s:%d/", self.host, self.port)
+        server.serve_forever()
+        server.server_close()
+
+    def wait_until_bound(self):
+        """
+        Waits until the server thread has bound its port, so self.port is final.
+
+        :raise OSError: No port in range was free.
+        """
+        if self._bound is not None:
+            self._bound.wait()
+            if self._bind_error is not None:
+                raise self._bind_error
+
+    def url_for(self, name="default"):
+        self.wait_until_bound()
+        return f"http://{self.host}:{self.port}/?view={name}"
+
+    def push_figure(self, figure, name="default"):
+        """
+        Stores a Plotly figure (or its dict form) under name; open pages showing it redraw on their next poll.
+
+        :return: The URL that shows the figure.
+        """
+        self.start()
+        with self._lock:
+            version = self.figures.get(name, (0, None))[0] + 1
+            self.figures[name] = (version, figure)
+        return self.url_for(name)
+
+    def cached_projection(self, key, compute):
+        """
+        Returns the projection stored under key, or runs compute() and stores its result.
+        Keys should identify the dataset, the model and the projection parameters.
+        """
+        with self._lock:
+            if key in self.projection_cache:
+                self.projection_cache.move_to_end(key)
+                return self.projection_cache[key]
+        projection = compute()
+        with self._lock:
+            self.projection_cache[key] = projection
+            while len(self.projection_cache) > self.max_cached_projections:
+                self.projection_cache.popitem(last=False)
+        return projection
+
+    def stop(self):
+        if self._stop_requested is None:
+            return
+        with self._lock:
+            self._stop_requested.set()
+            serving, server = self._serving, self._server
+        if serving:
+            server.shutdown()
+        # Otherwise the thread closes the socket itself once the app is built
+        self._server = None
+        self._thread = None
@@ -1,5 +1,14 @@
 import os
+import re
+import json
+import time
 import shutil
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import DeltaUpdate
 
 class GantrithorInstallerPrep:
     """
@@ -8,6 +17,19 @@ class GantrithorInstallerPrep:
     The GantrithorInstallerPrep class is designed to prepare the Gantrithor installation files for packaging using NSIS (Nullsoft Scriptable Install System).
     It automates the process of setting up the required directory structure and moving necessary files to their respective locations.
 
+    Staging is incremental and can be run any number of times. Every file of the build is mapped straight to
+    its final place (the DLLs to 'excluded/ToMain' and the 'torch' folder to 'excluded'), so nothing is copied
+    twice. Files are hard-linked when the build and the staging folder are on the same drive, and copied
+    otherwise, on a thread pool. A manifest (.staging_manifest.json) records size, mtime and content hash
+    of each staged file, so after a rebuild only the files whose content changed are staged again, and files
+    that are no longer part of the build are removed.
+
+    After staging, a content-addressed manifest of the files as they will be installed is written to
+    'Gantrithor/gantrithor_manifest.json' (so the installer puts it in the installation folder) and to
+    'releases/<version>.json', and their chunks are added to 'chunk_store'. The chunk hashes are kept in the
+    staging manifest too, so files that staging found unchanged are not read again to chunk them. A delta
+    patch from an earlier release holds only the chunks that changed (see DeltaUpdate.py).
+
     Attributes:
     - base_path (str): The base path where the GantrithorInstaller folder is located.
     - dist_path (str): The path to the 'dist/Main' directory containing the installation files.
@@ -15,12 +37,17 @@ class GantrithorInstallerPrep:
     - excluded_path (str): The path to the 'excluded' directory within the 'Gantrithor' directory.
     - internal_path (str): The path to the '_internal' directory within the 'Gantrithor' directory.
     - dll_paths (list): A list of relative paths to the DLL files to be moved.
+    - workers (int): Threads used to link, copy and hash files.
+    - use_links (bool): Hard-link files instead of copying them when possible.
+    - version (str): Release version, read from exe_coded.nsi by default.
+    - patch_from (list): Earlier release versions to write delta patches from.
 
     Steps:
     Step 1: Create the 'Gantrithor' directory if it doesn't exist.
-    Step 2: Copy 'Main.exe' and '_internal' directory from 'dist/Main' to 'Gantrithor'.
-    Step 3: Move DLL files from '_internal' to 'excluded/ToMain'.
-    Step 4: Move the 'torch' folder from '_internal' to 'excluded'.
+    Step 2: Map 'Main.exe' to 'Gantrithor.exe', the DLL files to 'excluded/ToMain', the 'torch' folder to 'excluded'
+            and the rest of '_internal' and 'data_template' to '_internal' and 'data'.
+    Step 3: Stage the files whose content changed since the last run and remove the ones no longer in the build.
+    Step 4: Write the release manifest and chunks, and the delta patches from earlier releases.
     Step 5: Print a message with the path to 'exe_coded.nsi' for NSIS packaging.
 
     Usage:
@@ -33,66 +60,255 @@ class GantrithorInstallerPrep:
 
     Note: Ensure that the paths are correctly set for your system.
     """
-    def __init__(self):
-        self.base_path = "C:\\Users\\doren\\OneDrive\\Desktop\\GantrithorInstaller"
-        self.dist_path = os.path.join(self.base_path, "dist", "Main")
+    MANIFEST_NAME = ".staging_manifest.json"
+
+    def __init__(self, base_path=None, dist_path=None, workers=None, use_links=True, version=None, patch_from=()):
+        self.base_path = base_path or "C:\\Users\\doren\\OneDrive\\Desktop\\GantrithorInstaller"
+        self.dist_path = dist_path or os.path.join(self.base_path, "dist", "Main")
         self.gantrithor_path = os.path.join(self.base_path, "Gantrithor")
         self.excluded_path = os.path.join(self.gantrithor_path, "excluded")
         self.to_main_path = os.path.join(self.excluded_path, "ToMain")
         self.internal_path = os.path.join(self.gantrithor_path, "_internal")
         self.data_template_path = os.path.join(self.base_path, "data_template")
+        self.manifest_path = os.path.join(self.gantrithor_path, self.MANIFEST_NAME)
+        self.releases_path = os.path.join(self.base_path, "releases")
+        self.chunk_store_path = os.path.join(self.base_path, "chunk_store")
+        self.patches_path = os.path.join(self.base_path, "patches")
         self.dll_paths = [
             "cublasLt64_11.dll",
             "cusolver64_11.dll",
             "cufft64_10.dll",
             "cusparse64_11.dll",
         ]
+        self.workers = workers or min(32, (os.cpu_count() or 4) * 4)
+        self.use_links = use_links
+        self.version = version or self.read_nsis_version()
+        self.patch_from = list(patch_from)
+        self.counts = {"linked": 0, "copied": 0, "unchanged": 0, "removed": 0}
+        self._lock = threading.Lock()
 
     def setup(self):
+        start_time = time.perf_counter()
         self.create_gantrithor_directory()
         self.create_excluded_directories()
-        self.copy_main_files()
-        self.move_dll_files()
-        self.move_torch_folder()
-        self.copy_data_template()
+        manifest = self.load_manifest()
+        plan = self.build_plan()
+        new_manifest = self.stage_files(plan, manifest)
+        self.remove_stale_files(manifest, new_manifest)
+        self.save_manifest(new_manifest)
+        print("Staged %d files in %.1f s: %s" % (len(plan), time.perf_counter() - start_time, self.counts))
+        self.write_release(new_manifest)
         self.print_nsis_message()
 
     def create_gantrithor_directory(self):
-        if not os.path.exists(self.gantrithor_path):
-            os.makedirs(self.gantrithor_path)
+        os.makedirs(self.gantrithor_path, exist_ok=True)
 
     def create_excluded_directories(self):
-        if not os.path.exists(self.excluded_path):
-            os.makedirs(self.excluded_path)
-        if not os.path.exists(self.to_main_path):
-            os.makedirs(self.to_main_path)
-
-    def copy_data_template(self):
-        data_path = os.path.join(self.gantrithor_path, "data")
-        shutil.copytree(self.data_template_path, data_path)
-
-    def copy_main_files(self):
-        # Copy Main.exe to the Gantrithor directory
-        shutil.copy(os.path.join(self.dist_path, "Main.exe"), self.gantrithor_path)
-        # Rename Main.exe to Gantrithor.exe
-        os.rename(os.path.join(self.gantrithor_path, "Main.exe"), os.path.join(self.gantrithor_path, "Gantrithor.exe"))
-        # Copy the _internal directory
-        shutil.copytree(os.path.join(self.dist_path, "_internal"), self.internal_path)
-
-    def move_dll_files(self):
+        os.makedirs(self.excluded_path, exist_ok=True)
+        os.makedirs(self.to_main_path, exist_ok=True)
+
+    # Planning
+
+    def destination_of(self, relative_path):
+        """
+        Returns where a file of dist/Main goes, relative to the 'Gantrithor' directory.
+        """
+        parts = relative_path.split(os.sep)
+        if relative_path == "Main.exe":
+            return "Gantrithor.exe"
+        if parts[0] == "_internal" and len(parts) == 2 and parts[1] in self.dll_paths:
+            return os.path.join("excluded", "ToMain", parts[1])
+        if parts[0] == "_internal" and len(parts) > 1 and parts[1] == "torch":
+            return os.path.join("excluded", *parts[1:])
+        return relative_path
+
+    @staticmethod
+    def walk_files(root_path):
+        for root, _, files in os.walk(root_path):
+            for file_name in files:
+                path = os.path.join(root, file_name)
+                yield path, os.path.relpath(path, root_path)
+
+    def build_plan(self):
+        """
+        :return: A dict mapping each destination (relative to 'Gantrithor') to its source file.
+        """
+        if not os.path.exists(os.path.join(self.dist_path, "Main.exe")):
+            raise FileNotFoundError("No PyInstaller build found in " + self.dist_path)
+        plan = {}
+        for source_path, relative_path in self.walk_files(self.dist_path):
+            plan[self.destination_of(relative_path)] = source_path
+        if os.path.isdir(self.data_template_path):
+            for source_path, relative_path in self.walk_files(self.data_template_path):
+                plan[os.path.join("data", relative_path)] = source_path
         for dll in self.dll_paths:
-            src_path = os.path.join(self.internal_path, dll)
-            dest_path = os.path.join(self.excluded_path, "ToMain", dll)
-            shutil.move(src_path, dest_path)
+            if os.path.join("excluded", "ToMain", dll) not in plan:
+                # The cpu build profile does not bundle the CUDA libraries
+                print("Skipping " + dll + ", it is not part of this build")
+        return plan
+
+    # Manifest
+
+    def load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as manifest_file:
+                return json.load(manifest_file)
+        except (OSError, ValueError):
+            return {}  # A damaged manifest only costs one full staging run
+
+    def save_manifest(self, manifest):
+        temporary_path = self.manifest_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file, indent=0, sort_keys=True)
+        os.replace(temporary_path, self.manifest_path)
+
+    @staticmethod
+    def file_hash(path):
+        digest = hashlib.blake2b(digest_size=20)
+        with open(path, "rb") as hashed_file:
+            for block in iter(lambda: hashed_file.read(4 * 1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    # Staging
 
-    def move_torch_folder(self):
-        src_path = os.path.join(self.internal_path, "torch")
-        dest_path = os.path.join(self.excluded_path, "torch")
-        shutil.move(src_path, dest_path)
+    def stage_file(self, destination, source_path, entry):
+        """
+        Brings one file up to date and returns its new manifest entry.
+        """
+        target_path = os.path.join(self.gantrithor_path, destination)
+        source_stat = os.stat(source_path)
+        if os.path.exists(target_path) and entry is not None and entry["size"] == source_stat.st_size:
+            if entry["mtime_ns"] == source_stat.st_mtime_ns or os.path.samefile(source_path, target_path):
+                self._count("unchanged")
+                return entry
+            # PyInstaller rewrites every file on a rebuild, so unchanged content is recognised by its hash
+            source_hash = self.file_hash(source_path)
+            if source_hash == entry.get("hash"):
+                self._count("unchanged")
+                return dict(entry, mtime_ns=source_stat.st_mtime_ns)
+        else:
+            source_hash = None
+
+        if os.path.lexists(target_path):
+            os.remove(target_path)
+        mode = "copied"
+        if self.use_links:
+            try:
+                os.link(source_path, target_path)
+                mode = "linked"
+            except OSError:
+                pass  # Different drive or a file system without hard links
+        if mode == "copied":
+            shutil.copy2(source_path, target_path)
+        self._count(mode)
+        return {"size": source_stat.st_size, "mtime_ns": source_stat.st_mtime_ns,
+                "hash": source_hash or self.file_hash(source_path)}
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.counts[key] += amount
+
+    def stage_files(self, plan, manifest):
+        for directory in {os.path.dirname(destination) for destination in plan}:
+            os.makedirs(os.path.join(self.gantrithor_path, directory), exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {destination: executor.submit(self.stage_file, destination, source_path,
+                                                    manifest.get(destination))
+                       for destination, source_path in plan.items()}
+            return {destination: future.result() for destination, future in futures.items()}
+
+    def remove_stale_files(self, old_manifest, new_manifest):
+        # Only files staged by an earlier run are removed, never anything else in the folder
+        for destination in set(old_manifest) - set(new_manifest):
+            target_path = os.path.join(self.gantrithor_path, destination)
+            if os.path.lexists(target_path):
+                os.remove(target_path)
+                self._count("removed")
+
+    # Release manifest and delta patches
+
+    def read_nsis_version(self):
+        nsis_path = os.path.join(self.base_path, "exe_coded.nsi")
+        if os.path.exists(nsis_path):
+            with open(nsis_path, "r", encoding="utf-8", errors="replace") as nsis_file:
+                match = re.search(r'!define\s+GantrithorVersion\s+"([^"]+)"', nsis_file.read())
+            if match:
+                return match.group(1)
+        return "0.0.0"
+
+    @staticmethod
+    def installed_path(staged_path):
+        """
+        Maps a path in the 'Gantrithor' folder ('/' separated) to where the installer puts it, relative to
+        $INSTDIR. The data template goes to $APPDATA and is left out.
+        """
+        parts = staged_path.split("/")
+        if parts[0] == "data" or staged_path == GantrithorInstallerPrep.MANIFEST_NAME:
+            return None
+        if parts[:2] == ["excluded", "ToMain"]:
+            return "/".join(["_internal"] + parts[2:])
+        if parts[:2] == ["excluded", "torch"]:
+            return "/".join(["_internal", "torch"] + parts[2:])
+        return staged_path
+
+    def known_release_files(self, staging_manifest):
+        """
+        Returns {installed path: {"size", "chunks"}} for the staged files whose chunk hashes were recorded by
+        an earlier release. Staging only keeps an entry (chunks included) when the content is unchanged.
+        """
+        known = {}
+        for destination, entry in staging_manifest.items():
+            installed_path = self.installed_path(destination.replace(os.sep, "/"))
+            if installed_path is not None and "chunks" in entry and entry.get("chunk_size") == DeltaUpdate.CHUNK_SIZE:
+                known[installed_path] = {"size": entry["size"], "chunks": entry["chunks"]}
+        return known
+
+    def write_release(self, staging_manifest=None):
+        start_time = time.perf_counter()
+        staging_manifest = staging_manifest if staging_manifest is not None else self.load_manifest()
+        known_files = self.known_release_files(staging_manifest)
+        release = DeltaUpdate.build_manifest(self.gantrithor_path, self.version, self.installed_path, self.workers,
+                                             known_files=known_files)
+        # Recorded for the next run, which then only chunks the files staging replaced
+        for destination, entry in staging_manifest.items():
+            release_entry = release["files"].get(self.installed_path(destination.replace(os.sep, "/")))
+            if release_entry is not None:
+                entry.update(chunks=release_entry["chunks"], chunk_size=release["chunk_size"])
+        self.save_manifest(staging_manifest)
+        written = DeltaUpdate.write_chunk_store(self.gantrithor_path, release, self.chunk_store_path,
+                                                self.installed_path)
+        os.makedirs(self.releases_path, exist_ok=True)
+        DeltaUpdate.write_json(os.path.join(self.releases_path, self.version + ".json"), release)
+        DeltaUpdate.write_json(os.path.join(self.gantrithor_path, DeltaUpdate.MANIFEST_NAME), release)
+        print("Release %s: %d files (%d chunked), %d new chunks in %.1f s" % (
+            self.version, len(release["files"]), len(release["files"]) - len(known_files), written,
+            time.perf_counter() - start_time))
+        for old_version in self.patch_from:
+            old_release = DeltaUpdate.load_json(os.path.join(self.releases_path, old_version + ".json"))
+            patch_path = os.path.join(self.patches_path, "%s_to_%s" % (old_version, self.version))
+            diff = DeltaUpdate.make_patch(old_release, release, self.chunk_store_path, patch_path)
+            print("Patch %s -> %s: %d changed files, %.1f MB of chunks in %s" % (
+                old_version, self.version, len(diff["added"]) + len(diff["changed"]),
+                diff["chunk_bytes"] / 1024 ** 2, patch_path))
 
     def print_nsis_message(self):
         print("Please now use the exe_coded file and load it into the NSIS software. Here it is: " + os.path.join(self.base_path, "exe_coded.nsi"))
 
-# Usage
-installer_prep = GantrithorInstallerPrep()
-installer_prep.setup()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stage the PyInstaller build for NSIS packaging")
+    parser.add_argument("--base", default=None, help="GantrithorInstaller folder")
+    parser.add_argument("--dist", default=None, help="PyInstaller dist/Main folder (default: <base>/dist/Main)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--copy", action="store_true", help="Always copy instead of hard-linking")
+    parser.add_argument("--version", default=None, help="Release version (default: GantrithorVersion in exe_coded.nsi)")
+    parser.add_argument("--patch-from", nargs="*", default=[], help="Earlier versions to write delta patches from")
+    arguments = parser.parse_args()
+
+    # Usage
+    installer_prep = GantrithorInstallerPrep(arguments.base, arguments.dist, arguments.workers, not arguments.copy,
+                                             arguments.version, arguments.patch_from)
+    installer_prep.setup()
@@ -0,0 +1,178 @@
+import os
+import sys
+import random
+import shutil
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import DeltaUpdate  # noqa: E402
+from DeltaUpdate import DeltaUpdater, UpdateError, build_manifest, diff_manifests, make_patch  # noqa: E402
+
+CHUNK_SIZE = 1024
+BIG = random.Random(0).randbytes(5 * CHUNK_SIZE)
+
+OLD_FILES = {
+    "Gantrithor.exe": b"exe 1.0",
+    "_internal/torch/lib/big.dll": BIG,
+    "_internal/app.pyc": b"a" * 100,
+    "_internal/old.pyc": b"old",
+}
+NEW_FILES = {
+    "Gantrithor.exe": b"exe 1.1",
+    "_internal/torch/lib/big.dll": BIG[:2 * CHUNK_SIZE] + b"X" + BIG[2 * CHUNK_SIZE + 1:],
+    "_internal/app.pyc": b"a" * 100,
+    "_internal/new.pyc": b"new",
+}
+
+
+def write_tree(root, files):
+    for path, data in files.items():
+        full_path = os.path.join(root, *path.split("/"))
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "wb") as tree_file:
+            tree_file.write(data)
+
+
+def read_tree(root):
+    files = {}
+    for folder, directories, file_names in os.walk(root):
+        directories[:] = [name for name in directories if name not in DeltaUpdate.RESERVED_NAMES]
+        for file_name in file_names:
+            if file_name in DeltaUpdate.RESERVED_NAMES:
+                continue
+            with open(os.path.join(folder, file_name), "rb") as tree_file:
+                files[os.path.relpath(os.path.join(folder, file_name), root).replace(os.sep, "/")] = tree_file.read()
+    return files
+
+
+@pytest.fixture
+def release(tmp_path):
+    """Builds 1.0 and 1.1, a chunk store with both, an installation of 1.0 and the 1.0 -> 1.1 patch."""
+    write_tree(tmp_path / "build_old", OLD_FILES)
+    write_tree(tmp_path / "build_new", NEW_FILES)
+    old = build_manifest(str(tmp_path / "build_old"), "1.0", chunk_size=CHUNK_SIZE)
+    new = build_manifest(str(tmp_path / "build_new"), "1.1", chunk_size=CHUNK_SIZE)
+    store = str(tmp_path / "store")
+    DeltaUpdate.write_chunk_store(str(tmp_path / "build_old"), old, store)
+    DeltaUpdate.write_chunk_store(str(tmp_path / "build_new"), new, store)
+    shutil.copytree(tmp_path / "build_old", tmp_path / "install")
+    DeltaUpdate.write_json(str(tmp_path / "install" / DeltaUpdate.MANIFEST_NAME), old)
+    diff = make_patch(old, new, store, str(tmp_path / "patch"))
+    return {"old": old, "new": new, "diff": diff, "install": str(tmp_path / "install"),
+            "patch": str(tmp_path / "patch"), "store": store}
+
+
+def test_diff_manifests(release):
+    diff = diff_manifests(release["old"], release["new"])
+    assert diff["added"] == ["_internal/new.pyc"]
+    assert diff["changed"] == ["Gantrithor.exe", "_internal/torch/lib/big.dll"]
+    assert diff["removed"] == ["_internal/old.pyc"]
+    assert diff["unchanged"] == 1
+    # Only the edited chunk of big.dll, the new exe and the new file have to be shipped
+    assert len(diff["chunks"]) == 3
+    assert diff["chunk_bytes"] == CHUNK_SIZE + len(NEW_FILES["Gantrithor.exe"]) + len(NEW_FILES["_internal/new.pyc"])
+
+
+def test_diff_manifests_without_old_release_ships_everything(release):
+    diff = diff_manifests(None, release["new"])
+    assert diff["from_version"] is None
+    assert diff["added"] == sorted(NEW_FILES)
+    assert diff["chunk_bytes"] == sum(len(data) for data in NEW_FILES.values())
+
+
+def test_make_patch_holds_only_missing_chunks(release):
+    shipped = {name for _, _, names in os.walk(os.path.join(release["patch"], "chunks")) for name in names}
+    assert shipped == set(release["diff"]["chunks"])
+    assert DeltaUpdate.load_json(os.path.join(release["patch"], DeltaUpdate.MANIFEST_NAME)) == release["new"]
+
+
+def test_build_manifest_reuses_known_files(tmp_path, monkeypatch, release):
+    write_tree(tmp_path / "tree", NEW_FILES)
+    known = {path: release["new"]["files"][path] for path in ("_internal/torch/lib/big.dll", "_internal/app.pyc")}
+    chunked = []
+    original_file_chunks = DeltaUpdate.file_chunks
+    monkeypatch.setattr(DeltaUpdate, "file_chunks",
+                        lambda path, chunk_size: chunked.append(path) or original_file_chunks(path, chunk_size))
+    manifest = build_manifest(str(tmp_path / "tree"), "1.1", chunk_size=CHUNK_SIZE, known_files=known)
+    assert manifest["files"] == release["new"]["files"]
+    assert sorted(os.path.basename(path) for path in chunked) == ["Gantrithor.exe", "new.pyc"]
+
+
+def test_apply(release):
+    diff = DeltaUpdater(release["install"], release["patch"]).apply()
+    assert diff["to_version"] == "1.1"
+    assert read_tree(release["install"]) == NEW_FILES
+    assert DeltaUpdater(release["install"]).installed_manifest() == release["new"]
+    leftovers = set(os.listdir(release["install"])) & set(DeltaUpdate.RESERVED_NAMES[1:])
+    assert not leftovers
+
+
+def test_apply_rejects_corrupt_chunk(release):
+    corrupt_chunk = DeltaUpdate.store_path(os.path.join(release["patch"], "chunks"), release["diff"]["chunks"][0])
+    with open(corrupt_chunk, "wb") as chunk_file:
+        chunk_file.write(b"corrupt")
+    with pytest.raises(UpdateError, match="failed verification"):
+        DeltaUpdater(release["install"], release["patch"]).apply()
+    assert read_tree(release["install"]) == OLD_FILES
+    assert DeltaUpdater(release["install"]).installed_manifest() == release["old"]
+
+
+def test_apply_rejects_modified_installation(release):
+    with open(os.path.join(release["install"], "_internal", "app.pyc"), "ab") as installed_file:
+        installed_file.write(b"local edit")
+    with pytest.raises(UpdateError, match="differs from its manifest"):
+        DeltaUpdater(release["install"], release["patch"]).apply()
+
+
+def count_replaces(release, monkeypatch):
+    calls = []
+    original_replace = os.replace
+    monkeypatch.setattr(DeltaUpdate.os, "replace", lambda *args: calls.append(args) or original_replace(*args))
+    updater = DeltaUpdater(release["install"], release["patch"])
+    updater.stage(release["old"], release["new"], release["diff"])
+    updater._swap(release["diff"])
+    monkeypatch.undo()
+    return len(calls)
+
+
+def interrupt_swap_at(release, monkeypatch, step):
+    """Stages the patch and runs the swap until its step-th rename fails, as a crash or power loss would."""
+    calls = []
+    original_replace = os.replace
+
+    def failing_replace(*args):
+        calls.append(args)
+        if len(calls) == step:
+            raise OSError("interrupted")
+        return original_replace(*args)
+
+    updater = DeltaUpdater(release["install"], release["patch"])
+    updater.stage(release["old"], release["new"], release["diff"])
+    monkeypatch.setattr(DeltaUpdate.os, "replace", failing_replace)
+    with pytest.raises(OSError, match="interrupted"):
+        updater._swap(release["diff"])
+    monkeypatch.undo()
+
+
+def test_recover_after_interrupted_swap(tmp_path, release, monkeypatch):
+    # Interrupt the swap at every rename in turn; recover() must always bring back the old version
+    steps = count_replaces(release, monkeypatch)
+    assert steps > 5
+    for step in range(1, steps + 1):
+        shutil.rmtree(release["install"])
+        shutil.copytree(tmp_path / "build_old", release["install"])
+        DeltaUpdate.write_json(os.path.join(release["install"], DeltaUpdate.MANIFEST_NAME), release["old"])
+        interrupt_swap_at(release, monkeypatch, step)
+        DeltaUpdater(release["install"]).recover()
+        assert read_tree(release["install"]) == OLD_FILES, f"interrupted at rename {step}"
+        assert DeltaUpdater(release["install"]).installed_manifest() == release["old"]
+        assert not os.path.exists(os.path.join(release["install"], DeltaUpdate.JOURNAL_NAME))
+
+
+def test_apply_after_interrupted_swap(release, monkeypatch):
+    # The next apply() rolls the interrupted update back first, then installs the patch
+    interrupt_swap_at(release, monkeypatch, 4)
+    DeltaUpdater(release["install"], release["patch"]).apply()
+    assert read_tree(release["install"]) == NEW_FILES
@@ -0,0 +1,82 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Id2LabelNotifier import Id2LabelNotifier  # noqa: E402
+
+
+class Observer:
+    """The part of the GANTRITHOR id2label observers the notifier relies on."""
+
+    def __init__(self):
+        self.observers = []
+
+    def add_observer(self, observer):
+        if observer not in self.observers:
+            self.observers.append(observer)
+
+    def set_id2label(self, id2label):
+        for observer in self.observers:
+            observer.update(id2label)
+
+
+class Component:
+    def __init__(self):
+        self.updates = []
+
+    def update(self, id2label):
+        self.updates.append(dict(id2label))
+
+
+@pytest.fixture
+def wired():
+    notifier, observer, component = Id2LabelNotifier("ner"), Observer(), Component()
+    notifier.subscribe(observer, component)
+    return notifier, observer, component
+
+
+def test_updates_are_delivered_synchronously_by_default(wired):
+    notifier, observer, component = wired
+    observer.set_id2label({0: "O", 1: "PER"})
+    assert component.updates == [{0: "O", 1: "PER"}]
+    assert notifier.id2label == {0: "O", 1: "PER"}
+
+
+def test_batch_delivers_the_latest_map_once(wired):
+    notifier, observer, component = wired
+    with notifier.batch():
+        for count in range(1, 50):
+            observer.set_id2label({index: f"label {index}" for index in range(count)})
+        assert component.updates == []
+    assert len(component.updates) == 1
+    assert len(component.updates[0]) == 49
+
+    with notifier.batch():
+        observer.set_id2label({index: f"label {index}" for index in range(49)})
+    assert len(component.updates) == 1  # Unchanged map, skipped
+
+
+def test_subscriber_errors_propagate(wired):
+    notifier, observer, component = wired
+
+    class Failing:
+        def update(self, id2label):
+            raise ValueError("rebuild failed")
+
+    notifier.subscribe(observer, Failing())
+    with pytest.raises(ValueError):
+        observer.set_id2label({0: "O"})
+    with pytest.raises(ValueError):
+        with notifier.batch():
+            observer.set_id2label({0: "O", 1: "LOC"})
+
+
+def test_publish_replays_the_observer_call(wired):
+    notifier, observer, component = wired
+    observer.set_id2label({0: "O"})
+    assert notifier.id2label_call == ("update", None)
+    notifier.publish({"0": "O", "1": "ORG"}, *notifier.id2label_call)
+    assert component.updates[-1] == {0: "O", 1: "ORG"}
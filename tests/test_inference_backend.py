@@ -0,0 +1,93 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+torch = pytest.importorskip("torch")
+
+import InferenceBackend  # noqa: E402
+from HeadlessInference import TaskRunner  # noqa: E402
+
+
+class LinearRunner(TaskRunner):
+    """A classifier small enough to quantize in a test: records are feature vectors, labels are argmax ids."""
+
+    task_name = "text"
+
+    def __init__(self, model_path):
+        super().__init__(model_path, resource_cache=None, options=None, load=False)
+        torch.manual_seed(0)
+        self.model = torch.nn.Sequential(torch.nn.Linear(32, 64), torch.nn.ReLU(), torch.nn.Linear(64, 4)).eval()
+
+    def cost(self, record):
+        return len(record)
+
+    def prepare(self, records):
+        return torch.tensor(records, dtype=torch.float32)
+
+    def predict(self, prepared):
+        with torch.no_grad():
+            return [{"label": int(label)} for label in self.model(prepared).argmax(dim=1)]
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    folder = tmp_path / "checkpoint"
+    folder.mkdir()
+    (folder / "config.json").write_text("{}")
+    (folder / "model.safetensors").write_bytes(b"weights")
+    return str(folder)
+
+
+@pytest.fixture
+def records():
+    generator = torch.Generator().manual_seed(1)
+    return torch.randn(64, 32, generator=generator).tolist()
+
+
+def test_int8_backend_is_checked_and_cached_outside_the_checkpoint(tmp_path, checkpoint, records):
+    checkpoint_mtime = os.stat(checkpoint).st_mtime_ns
+    cache_root = str(tmp_path / "optimized_models")
+    runner = LinearRunner(checkpoint)
+    report = InferenceBackend.apply_backend(runner, "int8", records, min_agreement=0.9, min_speedup=0.0,
+                                            cache_root=cache_root)
+
+    assert report["accepted"], report
+    assert report["samples"] == len(records)
+    assert isinstance(runner.model[0], torch.ao.nn.quantized.dynamic.Linear)
+    assert sorted(os.listdir(checkpoint)) == ["config.json", "model.safetensors"]
+    assert os.stat(checkpoint).st_mtime_ns == checkpoint_mtime
+    cache_dir = InferenceBackend.backend_cache_dir(checkpoint, "int8", report["fingerprint"], cache_root)
+    assert InferenceBackend.read_report(cache_dir) == report
+
+    # A second run (an inference worker, the next launch) reuses the decision without check records
+    reused = LinearRunner(checkpoint)
+    assert InferenceBackend.apply_backend(reused, "int8", cache_root=cache_root) == report
+    assert isinstance(reused.model[0], torch.ao.nn.quantized.dynamic.Linear)
+
+
+def test_new_weights_get_a_new_cache_folder(tmp_path, checkpoint, records):
+    cache_root = str(tmp_path / "optimized_models")
+    first = InferenceBackend.apply_backend(LinearRunner(checkpoint), "int8", records, min_speedup=0.0,
+                                           cache_root=cache_root)
+    with open(os.path.join(checkpoint, "model.safetensors"), "ab") as weights_file:
+        weights_file.write(b" retrained")
+
+    runner = LinearRunner(checkpoint)
+    assert InferenceBackend.apply_backend(runner, "int8", cache_root=cache_root)["reason"] == "not checked"
+    second_fingerprint = InferenceBackend.checkpoint_fingerprint(checkpoint)
+    assert second_fingerprint != first["fingerprint"]
+    model_root = os.path.dirname(os.path.dirname(
+        InferenceBackend.backend_cache_dir(checkpoint, "int8", second_fingerprint, cache_root)))
+    assert os.listdir(model_root) == [second_fingerprint]
+
+
+def test_rejected_backend_restores_fp32(tmp_path, checkpoint, records):
+    runner = LinearRunner(checkpoint)
+    reference_model = runner.model
+    report = InferenceBackend.apply_backend(runner, "int8", records, min_speedup=1000.0,
+                                            cache_root=str(tmp_path / "optimized_models"))
+    assert not report["accepted"]
+    assert runner.model is reference_model
@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+torch = pytest.importorskip("torch")
+safetensors_torch = pytest.importorskip("safetensors.torch")
+
+from ResourceCache import ResourceCache, mmap_safetensors  # noqa: E402
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    folder = tmp_path / "checkpoint"
+    folder.mkdir()
+    (folder / "config.json").write_text("{}")
+    generator = torch.Generator().manual_seed(0)
+    safetensors_torch.save_file({"weight": torch.randn(8, 4, generator=generator).to(torch.bfloat16),
+                                 "bias": torch.randn(8, generator=generator),
+                                 "steps": torch.arange(3)}, str(folder / "model.safetensors"))
+    return str(folder)
+
+
+def test_mmap_matches_load_file_including_bfloat16(checkpoint):
+    path = os.path.join(checkpoint, "model.safetensors")
+    mapped, loaded = mmap_safetensors(path), safetensors_torch.load_file(path)
+    assert mapped.keys() == loaded.keys()
+    for name, tensor in loaded.items():
+        assert mapped[name].dtype == tensor.dtype
+        assert torch.equal(mapped[name], tensor)
+
+
+def test_concurrent_callers_load_a_key_once(checkpoint):
+    calls = []
+
+    def loader(path):
+        calls.append(path)
+        time.sleep(0.2)
+        return {"value": torch.zeros(1)}
+
+    cache = ResourceCache()
+    threads = [threading.Thread(target=cache.get_or_load, args=("model", checkpoint, loader)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 2
+
+
+def test_variants_of_one_path_are_cached_separately(checkpoint):
+    cache = ResourceCache()
+    first = cache.get_or_load("model", checkpoint, lambda path: "classifier", variant="AutoModelForImageClassification")
+    second = cache.get_or_load("model", checkpoint, lambda path: "detector", variant="AutoModelForObjectDetection")
+    assert (first, second) == ("classifier", "detector")
+
+
+def test_only_changed_weights_drop_an_entry(checkpoint):
+    cache = ResourceCache()
+    cache.put("model", checkpoint, "model")
+    with open(os.path.join(checkpoint, "notes.txt"), "w") as notes:
+        notes.write("written next to the weights")
+    assert cache.get("model", checkpoint) == "model"
+
+    stat = os.stat(os.path.join(checkpoint, "model.safetensors"))
+    os.utime(os.path.join(checkpoint, "model.safetensors"), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert cache.get("model", checkpoint) is None